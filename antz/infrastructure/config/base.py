@@ -9,9 +9,17 @@ import logging
 import uuid
 from typing import Any, Callable, Literal, Mapping, TypeAlias, Union
 
-from pydantic import BaseModel, BeforeValidator, Field, field_serializer
-from typing_extensions import Annotated, Unpack
+from pydantic import (
+    BaseModel,
+    BeforeValidator,
+    Field,
+    PositiveFloat,
+    PositiveInt,
+    field_serializer,
+)
+from typing_extensions import Annotated, TypeAliasType, Unpack
 
+from antz.infrastructure.core.scope import VariableScope
 from antz.infrastructure.core.status import Status
 
 from .local_submitter import LocalSubmitterConfig
@@ -20,9 +28,20 @@ VALID_DECORATORS: set[str] = {"mutable_job", "submitter_job", "simple_job"}
 
 PrimitiveType: TypeAlias = str | int | float | bool
 AntzConfig: TypeAlias = Union["Config", "PipelineConfig", "JobConfig"]
-ParametersType: TypeAlias = (
-    Mapping[str, PrimitiveType | list[PrimitiveType] | AntzConfig] | None
+# configs are tried first so pipeline templates never degrade into plain mappings
+ParameterValueType = TypeAliasType(
+    "ParameterValueType",
+    Annotated[
+        Union[
+            AntzConfig,
+            Annotated[PrimitiveType, Field(union_mode="smart")],
+            list["ParameterValueType"],
+            Mapping[str, "ParameterValueType"],
+        ],
+        Field(union_mode="left_to_right"),
+    ],
 )
+ParametersType: TypeAlias = Mapping[str, ParameterValueType] | None
 SubmitFunctionType: TypeAlias = Callable[["Config"], None]
 JobFunctionType: TypeAlias = Callable[
     ["ParametersType", logging.Logger, Unpack[Any]],
@@ -192,6 +211,8 @@ class JobConfig(BaseModel, frozen=True):
         BeforeValidator(get_function_by_name_strongly_typed("simple_job")),
     ]
     parameters: ParametersType
+    resources: list[str] = []
+    stage_inputs: list[str] = []
 
     @field_serializer("function")
     def serialize_function(self, func: JobFunctionType, _info):
@@ -215,25 +236,57 @@ class PipelineConfig(BaseModel, frozen=True):
 
 
 class LoggingConfig(BaseModel, frozen=True):
-    """The configuration of logging"""
+    """The configuration of logging
+
+    Workers send their records to the submitter in batches of up to batch_size,
+        at least every flush_interval seconds; errors are sent at once
+
+    With type "sharded", each worker instead writes JSON lines to a file of its own
+        in directory, which are merged with `antz logs merge`
+    """
 
-    type: Literal["off", "file", "console", "remote"] = (
+    type: Literal["off", "file", "console", "remote", "sharded"] = (
         "console"  # default to logging to screen
     )
     level: int = logging.CRITICAL  # default to only logging on crashes
     directory: str | None = "./log"
+    batch_size: PositiveInt = 256
+    flush_interval: PositiveFloat = 1.0
+    max_file_size_mb: PositiveInt = 100
+    backup_count: PositiveInt = 10
 
 
 class Config(BaseModel, frozen=True):
     """The global configuration to submit to runner"""
 
-    variables: Mapping[str, PrimitiveType]
+    variables: VariableScope
     config: PipelineConfig
 
 
+class ResourceConfig(BaseModel, frozen=True):
+    """Configuration of a resource shared by the jobs a worker runs
+
+    function is called with parameters as keyword arguments the first time a job
+        of the worker requests the resource. It returns the resource, a context
+        manager of it, or is a generator which yields it once; context managers are
+        exited and generators resumed when the worker exits
+    """
+
+    function: Annotated[Callable[..., Any], BeforeValidator(get_function_by_name)]
+    parameters: ParametersType = None
+
+    @field_serializer("function")
+    def serialize_function(self, func: Callable[..., Any], _info):
+        """To serialize function, store the import path to the func
+        instead of its handle as a str
+        """
+        return func.__module__ + "." + func.__name__
+
+
 class InitialConfig(BaseModel, frozen=True):
     """The configuration of both the jobs and the submitters"""
 
     analysis_config: Config
     submitter_config: LocalSubmitterConfig = Field(discriminator="type")
     logging_config: LoggingConfig = LoggingConfig()
+    resources: dict[str, ResourceConfig] = {}
@@ -8,7 +8,7 @@ For example, passing a mutable function to a mutable job will result in a valida
 """
 
 import logging
-from typing import Callable, Mapping
+from typing import Any, Callable, Mapping
 
 # avoid circular imports
 from antz.infrastructure.config.base import (
@@ -70,15 +70,24 @@ def submitter_job(fn: SubmitterJobFunctionType) -> SubmitterJobFunctionType:
 
 
 def simple_job(
-    fn: Callable[[ParametersType, logging.Logger], Status],
+    fn: Callable[..., Status],
 ) -> JobFunctionType:
     """Wrap a simple job to
     1. Allow it to accept variable args if a user incorrectly marks job
     2. Allow for type checking in the pydantic model
+    3. Pass on the resources, for jobs which request them
     """
 
-    def _simple_job(parameters: ParametersType, logger: logging.Logger, *_, **__):
-        return fn(parameters, logger)
+    def _simple_job(
+        parameters: ParametersType,
+        logger: logging.Logger,
+        *_,
+        resources: Mapping[str, Any] | None = None,
+        **__,
+    ):
+        if resources is None:
+            return fn(parameters, logger)
+        return fn(parameters, logger, resources=resources)
 
     _simple_job.__module__ = fn.__module__
     _simple_job.__name__ = fn.__name__
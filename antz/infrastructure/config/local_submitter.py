@@ -1,11 +1,15 @@
 """Configuration for the Local Submitter
 
 num_concurrent_jobs controls how many processes to spawn for the manager
+deduplicate_submissions drops submissions identical to a recent one,
+    see antz.infrastructure.core.dedup
+staging_directory enables staging the inputs of jobs to node local scratch,
+    see antz.infrastructure.core.staging
 """
 
 from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PositiveFloat, PositiveInt
 
 
 class LocalSubmitterConfig(BaseModel, frozen=True):
@@ -13,8 +17,16 @@ class LocalSubmitterConfig(BaseModel, frozen=True):
     The configuration of the local submitter
 
     num_concurrent_jobs (int): number of processes to run jobs
+    deduplicate_submissions (bool): if True, drop submissions identical to a recent one
+    dedup_index_size (int): number of recent submissions each process remembers
+    staging_directory (str | None): node local directory to stage inputs to
+    staging_max_size_gb (float): GB of staged inputs each process keeps
     """
 
     type: Literal["local"]
     name: str = "local submitter"
     num_concurrent_jobs: int = 1
+    deduplicate_submissions: bool = False
+    dedup_index_size: PositiveInt = 100_000
+    staging_directory: str | None = None
+    staging_max_size_gb: PositiveFloat = 10.0
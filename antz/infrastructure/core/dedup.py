@@ -0,0 +1,102 @@
+"""Deduplication drops submissions that are identical to a recent submission
+
+Case matrices with repeated rows and branches looping back through restart_pipeline
+    can submit the same work many times. Two submissions are the same work if they
+    run the same stages, from the same stage, with the same variables; names and ids
+    of the pipelines and jobs are ignored as they are generated or cosmetic
+
+The fingerprint is taken of the unresolved stages and the variables, rather than of
+    the resolved parameters, as the variables are also passed on to every pipeline
+    submitted by the stages
+
+Fingerprints are kept in a bounded index of the most recent submissions, whether
+    they are still queued, running or complete. Each worker has its own index, so a
+    duplicate is only caught if the same worker submitted the original
+"""
+
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any
+
+from antz.infrastructure.config.base import Config, SubmitFunctionType
+
+# keys of pipelines and jobs which do not change the work done
+_IDENTITY_KEYS: frozenset[str] = frozenset({"id", "name"})
+_CONFIG_TYPES: frozenset[str] = frozenset(
+    {"pipeline", "job", "submitter_job", "mutable_job"}
+)
+
+
+class SubmissionDeduplicator:
+    """Wraps a submit function to drop submissions seen in the last max_size"""
+
+    def __init__(self, max_size: int) -> None:
+        """Create an empty index
+
+        Args:
+            max_size (int): number of fingerprints to keep; the least recently
+                submitted are forgotten first
+        """
+        self.max_size = max_size
+        self.num_submitted: int = 0
+        self.num_duplicates: int = 0
+        self._index: OrderedDict[bytes, None] = OrderedDict()
+
+    def wrap(self, submit_fn: SubmitFunctionType) -> SubmitFunctionType:
+        """Return a submit function which only calls submit_fn for new work"""
+
+        def deduplicated_submit_fn(config: Config) -> None:
+            if not self.is_duplicate(config):
+                submit_fn(config)
+
+        return deduplicated_submit_fn
+
+    def is_duplicate(self, config: Config) -> bool:
+        """Record the submission of config and return if it was seen recently"""
+        self.num_submitted += 1
+        key = fingerprint(config)
+        if key in self._index:
+            self._index.move_to_end(key)
+            self.num_duplicates += 1
+            return True
+
+        self._index[key] = None
+        if len(self._index) > self.max_size:
+            self._index.popitem(last=False)
+        return False
+
+    def report(self, logger: logging.Logger) -> None:
+        """Log how much work was deduplicated"""
+        logger.info(
+            "Deduplicated %d of %d submissions", self.num_duplicates, self.num_submitted
+        )
+
+
+def fingerprint(config: Config) -> bytes:
+    """Return a digest of the work config does, ignoring names and ids
+
+    Args:
+        config (Config): the submitted configuration
+
+    Returns:
+        bytes: equal for configs which run the same stages with the same variables
+    """
+    work = _strip_identity(config.model_dump(mode="json"))
+    encoded = json.dumps(work, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).digest()
+
+
+def _strip_identity(value: Any) -> Any:
+    """Remove the names and ids of all (nested) pipelines and jobs"""
+    if isinstance(value, dict):
+        is_config = value.get("type") in _CONFIG_TYPES
+        return {
+            key: _strip_identity(item)
+            for key, item in value.items()
+            if not (is_config and key in _IDENTITY_KEYS)
+        }
+    if isinstance(value, list):
+        return [_strip_identity(item) for item in value]
+    return value
@@ -0,0 +1,215 @@
+"""Deleting directory trees quickly, on many threads or in the background
+
+Large trees on parallel filesystems are dominated by the latency of metadata calls,
+    so parallel_rmtree scans directories and unlinks their entries on a pool of
+    threads, removing each directory once everything under it is gone
+
+delete_in_background first renames the directory next to itself (an atomic, O(1)
+    operation) so the caller can continue at once, even reusing the same path, and
+    then deletes the renamed tree in a process of its own, started from this
+    module's main, which outlives the worker. The worker logs the pid of that
+    process and, while it is still running, the outcome. If the deletion fails,
+    the process also writes the error next to the tree, to <renamed path>.failed,
+    so failures are found even when the worker has exited
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import subprocess  # nosec
+import sys
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final
+
+# files unlinked per task, so huge directories are spread over the threads
+_UNLINK_BATCH_SIZE: Final[int] = 256
+# suffix of the file the background process writes its error to
+FAILED_SUFFIX: Final[str] = ".failed"
+
+
+def delete_in_background(path: str, max_workers: int, logger: logging.Logger) -> str:
+    """Rename path next to itself and start a detached process to delete it
+
+    Args:
+        path (str): directory to delete
+        max_workers (int): threads the background process deletes with
+        logger (logging.Logger): logger to report the process and its outcome to
+
+    Returns:
+        str: the path the directory was renamed to
+    """
+    path = os.path.abspath(path)
+    trash_path = os.path.join(
+        os.path.dirname(path),
+        f".{os.path.basename(path)}.deleting-{uuid.uuid4().hex}",
+    )
+    os.rename(path, trash_path)
+    # a new session so the deletion outlives this worker
+    proc = subprocess.Popen(  # pylint: disable=consider-using-with  # nosec
+        [
+            sys.executable,
+            "-m",
+            __name__,
+            trash_path,
+            "--max-workers",
+            str(max_workers),
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    logger.info("Deleting %s in the background, process %d", trash_path, proc.pid)
+    threading.Thread(
+        target=_wait_for_deletion,
+        args=(proc, trash_path, logger),
+        name="antz-background-delete",
+        daemon=True,
+    ).start()
+    return trash_path
+
+
+def _wait_for_deletion(
+    proc: subprocess.Popen, trash_path: str, logger: logging.Logger
+) -> None:
+    """Reap the background process and log its outcome"""
+    if proc.wait() == 0:
+        logger.info("Deleted %s in the background", trash_path)
+    else:
+        logger.error(
+            "Unable to delete %s in the background (exit status %d), see %s",
+            trash_path,
+            proc.returncode,
+            trash_path + FAILED_SUFFIX,
+        )
+
+
+def parallel_rmtree(path: str, max_workers: int) -> None:
+    """Delete the directory path on max_workers threads
+
+    Each directory is a task which unlinks its files in batches and submits its
+        subdirectories as tasks. A directory is removed once its scan and all its
+        child tasks are done, which then completes a child task of its parent.
+        Symlinks are removed, never followed
+
+    Args:
+        path (str): directory to delete
+        max_workers (int): number of threads
+
+    Raises:
+        OSError: the first error deleting anything; deletion stops early
+    """
+    remover = _ParallelRemover(max_workers)
+    remover.run(path)
+
+
+class _ParallelRemover:  # pylint: disable=too-few-public-methods
+    """State of one parallel_rmtree"""
+
+    def __init__(self, max_workers: int) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._errors: list[Exception] = []
+        # directory -> [parent, number of unfinished tasks of the directory]
+        self._pending: dict[str, list] = {}
+
+    def run(self, path: str) -> None:
+        """Delete path and wait until it is gone"""
+        self._start_dir(path, None)
+        self._done.wait()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if self._errors:
+            raise self._errors[0]
+
+    def _start_dir(self, dir_path: str, parent: str | None) -> None:
+        with self._lock:
+            self._pending[dir_path] = [parent, 1]  # 1 for the scan itself
+        self._submit(self._scan_dir, dir_path)
+
+    def _submit(self, fn, *args) -> None:
+        if not self._done.is_set():
+            self._executor.submit(self._guarded, fn, *args)
+
+    def _guarded(self, fn, *args) -> None:
+        """Run fn; stop everything on its first error"""
+        if self._done.is_set():
+            return
+        try:
+            fn(*args)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            with self._lock:
+                self._errors.append(exc)
+            self._done.set()
+
+    def _scan_dir(self, dir_path: str) -> None:
+        batch: list[str] = []
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    self._add_task(dir_path)
+                    self._start_dir(entry.path, dir_path)
+                    continue
+                batch.append(entry.path)
+                if len(batch) >= _UNLINK_BATCH_SIZE:
+                    self._add_task(dir_path)
+                    self._submit(self._unlink_batch, dir_path, batch)
+                    batch = []
+        for file_path in batch:
+            os.unlink(file_path)
+        self._finish_task(dir_path)
+
+    def _unlink_batch(self, dir_path: str, batch: list[str]) -> None:
+        for file_path in batch:
+            os.unlink(file_path)
+        self._finish_task(dir_path)
+
+    def _add_task(self, dir_path: str) -> None:
+        with self._lock:
+            self._pending[dir_path][1] += 1
+
+    def _finish_task(self, dir_path: str | None) -> None:
+        """Mark a task of dir_path done, removing it (and maybe its parents) if last"""
+        while dir_path is not None:
+            with self._lock:
+                state = self._pending[dir_path]
+                state[1] -= 1
+                if state[1] > 0:
+                    return
+                del self._pending[dir_path]
+            os.rmdir(dir_path)
+            dir_path = state[0]  # the directory was a task of its parent
+        self._done.set()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Delete a directory, writing the error to <path>.failed if it fails
+
+    Run by delete_in_background in a process of its own
+
+    Returns:
+        int: the exit status; 0 if the directory was deleted
+    """
+    parser = argparse.ArgumentParser(prog=__name__)
+    parser.add_argument("path", help="Directory to delete")
+    parser.add_argument("--max-workers", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.max_workers > 1:
+            parallel_rmtree(args.path, args.max_workers)
+        else:
+            shutil.rmtree(args.path)
+    except OSError:
+        with open(args.path + FAILED_SUFFIX, "w", encoding="utf-8") as fh:
+            fh.write(traceback.format_exc())
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""Copying files and trees of files as fast as the filesystems allow
+
+Directories are walked with os.scandir and their files are copied on a pool of
+    threads, so many small files are not copied one at a time. Each file is
+    cloned (reflinked) where the filesystem supports it, else copied in the kernel
+    with copy_file_range or sendfile, falling back to a plain buffered copy
+
+A CopySync only copies the files which changed since the last sync, see
+    antz.jobs.copy
+"""
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Final, Iterator
+
+# ioctl to clone a file on linux (btrfs, xfs, ...), from linux/fs.h
+_FICLONE: Final[int] = 0x40049409
+# errors meaning a fast copy method is not supported between two filesystems
+_UNSUPPORTED_ERRNOS: Final[frozenset[int]] = frozenset(
+    {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS}
+)
+# most bytes to ask copy_file_range or sendfile to copy in one call
+_COPY_CHUNK: Final[int] = 2**30
+# files are hashed this many bytes at a time
+_HASH_CHUNK: Final[int] = 2**20
+# (method, source device, destination device) found not to support a fast method
+_unsupported: set[tuple[str, int, int]] = set()
+
+
+def copy_tree(
+    src: str,
+    dst: str,
+    max_workers: int = 8,
+    reflink: bool = True,
+    syncer: "CopySync | None" = None,
+) -> None:
+    """Copy the directory src to dst, copying files on max_workers threads
+
+    Like shutil.copytree, symlinks are followed, the metadata of files and
+        directories is copied, and special files (eg., FIFOs, sockets and devices)
+        are errors, as reading them may block forever. Directories are created
+        while walking, so the number of files in flight is bounded instead of
+        listing the whole tree first
+
+    Args:
+        src (str): directory to copy
+        dst (str): directory to create; its parent is created if needed
+        max_workers (int): number of threads copying files
+        reflink (bool): if True, try to clone files before copying them
+        syncer (CopySync | None): if set, only copy the files which changed;
+            dst may then already exist
+
+    Raises:
+        shutil.SpecialFileError: if src has a special file
+        OSError: the first error raised copying any file or directory
+    """
+    in_flight: deque[Future] = deque()
+    copied_dirs: list[tuple[str, str]] = []
+    copy_fn = _copy_file_with_stat if syncer is None else syncer.sync_file
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for src_path, dst_path in _walk_tree(src, dst, copied_dirs):
+            in_flight.append(executor.submit(copy_fn, src_path, dst_path, reflink))
+            if len(in_flight) >= max_workers * 4:
+                in_flight.popleft().result()  # raises the first error
+        while in_flight:
+            in_flight.popleft().result()
+
+    # after the files, as copying into a directory changes its mtime
+    for src_dir, dst_dir in reversed(copied_dirs):
+        shutil.copystat(src_dir, dst_dir)
+
+
+def _walk_tree(
+    src: str, dst: str, copied_dirs: list[tuple[str, str]]
+) -> Iterator[tuple[str, str]]:
+    """Yield the (source, destination) path of every file under src
+
+    Destination directories are created as they are reached and appended to
+        copied_dirs along with their source
+    """
+    stack = [(src, dst)]
+    while stack:
+        src_dir, dst_dir = stack.pop()
+        os.makedirs(dst_dir, exist_ok=True)
+        copied_dirs.append((src_dir, dst_dir))
+        with os.scandir(src_dir) as entries:
+            for entry in entries:
+                dst_path = os.path.join(dst_dir, entry.name)
+                if entry.is_dir():
+                    stack.append((entry.path, dst_path))
+                elif stat.S_ISREG(entry.stat().st_mode):
+                    yield entry.path, dst_path
+                else:
+                    raise shutil.SpecialFileError(
+                        f"{entry.path} is not a regular file or directory"
+                    )
+
+
+class CopySync:
+    """Decides which files changed and keeps the manifest of a sync
+
+    Methods may be called from many threads at once
+    """
+
+    def __init__(self, checksum: bool, manifest_path: str | None) -> None:
+        """Load the manifest, if any
+
+        Args:
+            checksum (bool): if True, compare the contents instead of the mtime
+            manifest_path (str | None): path to the manifest of the last sync
+        """
+        self.checksum = checksum
+        self.manifest_path = manifest_path
+        self.num_copied: int = 0
+        self.num_skipped: int = 0
+        self._lock = threading.Lock()
+        # destination path -> [source path, size, mtime_ns, digest]
+        self._manifest: dict[str, list[Any]] = {}
+        if manifest_path is not None and os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as fh:
+                    self._manifest = json.load(fh)["files"]
+            except (ValueError, KeyError, TypeError):
+                pass  # rebuilt by this sync
+
+    def sync_file(self, src: str, dst: str, reflink: bool) -> None:
+        """Copy src to dst, with its metadata, only if it changed since the last sync"""
+        src_stat = os.stat(src)
+        key = os.path.abspath(dst)
+        unchanged, digest = self._compare(src, src_stat, dst, self._manifest.get(key))
+        if unchanged:
+            with self._lock:
+                self.num_skipped += 1
+        else:
+            _copy_file_with_stat(src, dst, reflink)
+            if self.checksum and digest is None:
+                digest = file_digest(src)
+            with self._lock:
+                self.num_copied += 1
+
+        self._manifest[key] = [
+            os.path.abspath(src),
+            src_stat.st_size,
+            src_stat.st_mtime_ns,
+            digest,
+        ]
+
+    def _compare(
+        self,
+        src: str,
+        src_stat: os.stat_result,
+        dst: str,
+        record: list[Any] | None,
+    ) -> tuple[bool, str | None]:
+        """Return if dst is unchanged from src, and the digest of src if it was read
+
+        The manifest record is trusted first; the destination is only read without one
+        """
+        if record is not None and record[0] == os.path.abspath(src):
+            _, size, mtime_ns, digest = record
+            if size == src_stat.st_size and mtime_ns == src_stat.st_mtime_ns:
+                return True, digest
+            if self.checksum and digest is not None and size == src_stat.st_size:
+                src_digest = file_digest(src)
+                return src_digest == digest, src_digest
+
+        try:
+            dst_stat = os.stat(dst)
+        except FileNotFoundError:
+            return False, None
+        if dst_stat.st_size != src_stat.st_size:
+            return False, None
+        if not self.checksum:
+            return dst_stat.st_mtime_ns == src_stat.st_mtime_ns, None
+        digest = file_digest(src)
+        return digest == file_digest(dst), digest
+
+    def save(self) -> None:
+        """Write the manifest atomically, if there is one"""
+        if self.manifest_path is None:
+            return
+        manifest_dir = os.path.dirname(os.path.abspath(self.manifest_path))
+        os.makedirs(manifest_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"version": 1, "files": self._manifest}, fh)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def file_digest(path: str) -> str:
+    """Return the blake2b hex digest of the contents of path, read in chunks"""
+    digest = hashlib.blake2b()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(_HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_file_with_stat(src: str, dst: str, reflink: bool) -> None:
+    """Copy the contents and metadata of a file, like shutil.copy2"""
+    copy_file_contents(src, dst, reflink=reflink)
+    shutil.copystat(src, dst)
+
+
+def copy_file_contents(src: str, dst: str, reflink: bool = True) -> None:
+    """Copy the contents of file src to dst with the fastest method available
+
+    Tries in order: a reflink clone, copy_file_range, sendfile and a buffered copy.
+        A method found unsupported between two devices is not tried again
+
+    Args:
+        src (str): file to copy
+        dst (str): file to create or overwrite
+        reflink (bool): if True, try to clone the file first
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        src_stat = os.fstat(src_fd)
+        devices = (src_stat.st_dev, os.fstat(dst_fd).st_dev)
+
+        fast_copies: list[tuple[str, Callable[[], None]]] = []
+        if reflink and sys.platform.startswith("linux"):
+            fast_copies.append(("reflink", lambda: _reflink(src_fd, dst_fd)))
+        if hasattr(os, "copy_file_range"):
+            fast_copies.append(
+                (
+                    "copy_file_range",
+                    lambda: _copy_range(
+                        os.copy_file_range, src_fd, dst_fd, src_stat.st_size
+                    ),
+                )
+            )
+        if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+            fast_copies.append(
+                (
+                    "sendfile",
+                    lambda: _copy_range(_sendfile, src_fd, dst_fd, src_stat.st_size),
+                )
+            )
+
+        for method, copy_fn in fast_copies:
+            key = (method, *devices)
+            if key in _unsupported:
+                continue
+            try:
+                copy_fn()
+                return
+            except OSError as exc:
+                if exc.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                _unsupported.add(key)
+                # start again from scratch in case some bytes were copied
+                os.lseek(src_fd, 0, os.SEEK_SET)
+                os.lseek(dst_fd, 0, os.SEEK_SET)
+                os.ftruncate(dst_fd, 0)
+        shutil.copyfileobj(fsrc, fdst)
+
+
+def _reflink(src_fd: int, dst_fd: int) -> None:
+    """Clone src into dst so they share extents until either is modified"""
+    import fcntl  # pylint: disable=import-outside-toplevel
+
+    fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+
+
+def _sendfile(src_fd: int, dst_fd: int, count: int) -> int:
+    """sendfile with the same argument order as copy_file_range"""
+    return os.sendfile(dst_fd, src_fd, None, count)
+
+
+def _copy_range(
+    copy_fn: Callable[[int, int, int], int], src_fd: int, dst_fd: int, size: int
+) -> None:
+    """Call copy_fn(src_fd, dst_fd, count) until size bytes are copied
+
+    Files may grow while copying, so copy until copy_fn copies nothing
+    """
+    copied = 0
+    while True:
+        sent = copy_fn(src_fd, dst_fd, _COPY_CHUNK)
+        if sent == 0:
+            if copied == 0 and size > 0:
+                # some filesystems (eg., procfs) report nothing copied
+                raise OSError(errno.ENOSYS, "nothing copied")
+            return
+        copied += sent
@@ -9,6 +9,8 @@ import logging
 from typing import Mapping
 
 from antz.infrastructure.config.base import JobConfig, PrimitiveType
+from antz.infrastructure.core.resources import get_resources
+from antz.infrastructure.core.staging import staged_parameters
 from antz.infrastructure.core.status import Status
 from antz.infrastructure.core.variables import resolve_variables
 
@@ -18,16 +20,27 @@ def run_job(
     variables: Mapping[str, PrimitiveType],
     logger: logging.Logger,
 ) -> Status:
-    """Run a job, which is the smallest atomic task of antz"""
+    """Run a job, which is the smallest atomic task of antz
+
+    If the job requests resources, they are passed to its function as the keyword
+        argument resources. The paths of its stage_inputs are replaced by local
+        copies while it runs, see antz.infrastructure.core.staging
+    """
     status: Status
     func_handle = config.function
-    logger.debug("Running job %s, with func handle: %s", config.id, str(func_handle))
+    logger.debug("Running job %s, with func handle: %s", config.id, func_handle)
 
-    params = resolve_variables(config.parameters, variables)
-    logger.debug("Running function with parameters %s", str(params))
+    params = resolve_variables(config.parameters, variables, cache_key=config.id)
+    logger.debug("Running function with parameters %s", params)
 
     try:
-        ret = func_handle(params, logger)
+        with staged_parameters(params, config.stage_inputs, logger) as staged:
+            if config.resources:
+                ret = func_handle(
+                    staged, logger, resources=get_resources(config.resources)
+                )
+            else:
+                ret = func_handle(staged, logger)
         if isinstance(ret, Status):
             status = ret
         else:
@@ -38,5 +51,5 @@ def run_job(
     except Exception as exc:  # pylint: disable=broad-exception-caught
         logger.warning("Unexpected error", exc_info=exc)
         status = Status.ERROR
-    logger.debug("Finished job %s with status %s", config.id, str(status))
+    logger.debug("Finished job %s with status %s", config.id, status)
     return status
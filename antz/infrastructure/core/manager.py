@@ -5,16 +5,24 @@ from typing import Callable
 
 from antz.infrastructure.config.base import Config
 from antz.infrastructure.core.pipeline import run_pipeline
+from antz.infrastructure.log.multiproc_logging import log_context
 
 
 def run_manager(
     config: Config, submit_fn: Callable[[Config], None], logger: logging.Logger
 ) -> None:
     """Run the configuration"""
-    logger.debug("Manager starting up pipeline with id %d", config.config.id)
-    run_pipeline(
-        config=config.config,
-        variables=config.variables,
-        submit_fn=submit_fn,
-        logger=logger,
+    pipeline = config.config
+    job_id = (
+        pipeline.stages[pipeline.curr_stage].id
+        if pipeline.curr_stage < len(pipeline.stages)
+        else None
     )
+    with log_context(pipeline_id=pipeline.id, job_id=job_id):
+        logger.debug("Manager starting up pipeline with id %s", pipeline.id)
+        run_pipeline(
+            config=pipeline,
+            variables=config.variables,
+            submit_fn=submit_fn,
+            logger=logger,
+        )
@@ -0,0 +1,239 @@
+"""Memoization of the user functions called by jobs such as if_then
+
+Jobs which call a user function (eg., to check that a reference dataset exists or to
+    compute a constant) are run once per pipeline, often with the same arguments.
+    With memoize, the result of a function is kept by the function's path and its
+    arguments and returned instead of calling the function again
+
+Results are kept in a cache per worker process, bounded to memo_max_size results
+    (the least recently used are evicted first). With memo_directory, results are
+    also written there, one small JSON file each, so every worker sharing the
+    directory (and later runs) reuses them. Results expire memo_ttl seconds after
+    they were computed, in memory and on disk. The directory is pruned as results
+    are written: expired files are removed, then the oldest beyond memo_max_files
+
+Only results which are JSON (eg., the primitive types of variables) are written to
+    disk; others are kept in memory only
+
+Jobs which support memoization have Parameters which subclass MemoParameters and call
+    call_memoized instead of the function
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from pydantic import BaseModel, PositiveFloat, PositiveInt
+
+from antz.infrastructure.config.base import PrimitiveType
+
+# caches of this process by (max_size, ttl, directory, max_files)
+_caches: dict[tuple[int, float | None, str | None, int], "MemoCache"] = {}
+_caches_lock = threading.Lock()
+
+
+class MemoParameters(BaseModel, frozen=True):
+    """Parameters shared by all jobs that can memoize their function
+
+    memoize (bool): if True, reuse the result of earlier calls with the same args
+    memo_ttl (float | None): seconds a result is reused for; forever if None
+    memo_max_size (int): results kept in memory by each worker
+    memo_directory (str | None): path/to/directory to share results between workers
+    memo_max_files (int): results kept in memo_directory
+    """
+
+    memoize: bool = False
+    memo_ttl: PositiveFloat | None = None
+    memo_max_size: PositiveInt = 1024
+    memo_directory: str | None = None
+    memo_max_files: PositiveInt = 10_000
+
+
+def call_memoized(
+    function: Callable[..., Any],
+    args: list[PrimitiveType] | None,
+    memo_parameters: MemoParameters,
+) -> Any:
+    """Return function(*args), reusing an earlier result if memoize is set
+
+    Args:
+        function (Callable[..., Any]): the user function
+        args (list[PrimitiveType] | None): arguments of the function
+        memo_parameters (MemoParameters): the parsed parameters of the job
+
+    Returns:
+        Any: the result of the function
+    """
+    args = args if args is not None else []
+    if not memo_parameters.memoize:
+        return function(*args)
+
+    cache = get_cache(
+        memo_parameters.memo_max_size,
+        memo_parameters.memo_ttl,
+        memo_parameters.memo_directory,
+        memo_parameters.memo_max_files,
+    )
+    key = json.dumps(
+        [f"{function.__module__}.{function.__qualname__}", args], sort_keys=True
+    )
+    found, result = cache.get(key)
+    if not found:
+        result = function(*args)
+        cache.put(key, result)
+    return result
+
+
+def get_cache(
+    max_size: int, ttl: float | None, directory: str | None, max_files: int = 10_000
+) -> "MemoCache":
+    """Return the cache of this process with these settings, creating it if needed"""
+    settings = (max_size, ttl, directory, max_files)
+    with _caches_lock:
+        if settings not in _caches:
+            _caches[settings] = MemoCache(max_size, ttl, directory, max_files)
+        return _caches[settings]
+
+
+class MemoCache:  # pylint: disable=too-many-instance-attributes
+    """Results by key, in a bounded LRU in memory and optionally in a directory"""
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float | None,
+        directory: str | None,
+        max_files: int = 10_000,
+    ) -> None:
+        """Create an empty cache
+
+        Args:
+            max_size (int): results kept in memory; least recently used evicted first
+            ttl (float | None): seconds a result is valid for; forever if None
+            directory (str | None): directory to also keep results in, if any
+            max_files (int): results kept in directory; the oldest are removed first
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.directory = directory
+        self.max_files = max_files
+        self.num_hits: int = 0
+        self.num_misses: int = 0
+        # files written since the directory was last pruned
+        self._num_unpruned: int = 0
+        # key -> (time computed in seconds since the epoch, result)
+        self._results: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        """Return if there is a valid result for key, and the result"""
+        now = time.time()
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and self._is_valid(entry[0], now):
+                self._results.move_to_end(key)
+                self.num_hits += 1
+                return True, entry[1]
+
+        entry = self._read(key)
+        if entry is not None and self._is_valid(entry[0], now):
+            self._remember(key, entry, is_hit=True)
+            return True, entry[1]
+
+        with self._lock:
+            self.num_misses += 1
+        return False, None
+
+    def put(self, key: str, result: Any) -> None:
+        """Keep the result of key, computed now"""
+        entry = (time.time(), result)
+        self._remember(key, entry)
+        self._write(key, entry)
+
+    def _is_valid(self, computed: float, now: float) -> bool:
+        return self.ttl is None or now - computed < self.ttl
+
+    def _remember(
+        self, key: str, entry: tuple[float, Any], is_hit: bool = False
+    ) -> None:
+        with self._lock:
+            if is_hit:
+                self.num_hits += 1
+            self._results[key] = entry
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def _get_path(self, key: str) -> str:
+        assert self.directory is not None
+        digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _read(self, key: str) -> tuple[float, Any] | None:
+        """Return the entry of key in the directory, if there is one"""
+        if self.directory is None:
+            return None
+        try:
+            with open(self._get_path(key), "r", encoding="utf-8") as fh:
+                saved = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        # the file name is a hash, so check it is of this key
+        if not isinstance(saved, dict) or saved.get("key") != key:
+            return None
+        return saved["time"], saved["result"]
+
+    def _write(self, key: str, entry: tuple[float, Any]) -> None:
+        """Write the entry of key to the directory atomically, if it is JSON"""
+        if self.directory is None:
+            return
+        try:
+            data = json.dumps({"key": key, "time": entry[0], "result": entry[1]})
+        except (TypeError, ValueError):
+            return  # only kept in memory
+        path = self._get_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # the result is still valid; it is only not shared
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        # pruning lists the directory, so it is done once per max_files / 8 writes
+        with self._lock:
+            self._num_unpruned += 1
+            if self._num_unpruned < max(self.max_files // 8, 1):
+                return
+            self._num_unpruned = 0
+        self._prune()
+
+    def _prune(self) -> None:
+        """Remove the expired files of the directory, then the oldest over max_files
+
+        The files of other workers are pruned too; their mtime is when they were
+            computed, as they are written once
+        """
+        assert self.directory is not None
+        files: list[tuple[float, str]] = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    with contextlib.suppress(OSError):  # removed by another worker
+                        files.append((entry.stat().st_mtime, entry.path))
+        files.sort()
+        now = time.time()
+        num_expired = sum(1 for mtime, _ in files if not self._is_valid(mtime, now))
+        num_removed = max(num_expired, len(files) - self.max_files)
+        for _, path in files[:num_removed]:
+            with contextlib.suppress(OSError):
+                os.remove(path)
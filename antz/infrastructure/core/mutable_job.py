@@ -1,12 +1,17 @@
-"""Mutable jobs allow the function to edit the variables of the outer scope"""
+"""Mutable jobs allow the function to edit the variables of the outer scope
+
+The function is given the variables as a MutableVariables, so it may set or delete
+    variables in place and return them, or return any other mapping; either way the
+    outer scope is not copied or changed
+"""
 
 # pylint: disable=duplicate-code
 
 import logging
-from copy import deepcopy
 from typing import Mapping
 
 from antz.infrastructure.config.base import MutableJobConfig, PrimitiveType
+from antz.infrastructure.core.scope import MutableVariables, VariableScope
 from antz.infrastructure.core.status import Status
 from antz.infrastructure.core.variables import resolve_variables
 
@@ -20,13 +25,17 @@ def run_mutable_job(
 
     status: Status
     func_handle = config.function
-    logger.debug("Running job %s, with func handle: %s", config.id, str(func_handle))
+    logger.debug("Running job %s, with func handle: %s", config.id, func_handle)
 
-    params = resolve_variables(config.parameters, variables)
-    logger.debug("Running function with parameters %s", str(params))
+    params = resolve_variables(config.parameters, variables, cache_key=config.id)
+    logger.debug("Running function with parameters %s", params)
 
     try:
-        ret_status, ret_vars = func_handle(params, deepcopy(variables), logger)
+        # the changes are layered on the outer scope, which is not copied
+        ret_status, ret_vars = func_handle(
+            params, MutableVariables(VariableScope.from_mapping(variables)), logger
+        )
+        ret_vars = VariableScope.from_mapping(ret_vars)
         if isinstance(ret_status, Status):
             status = ret_status
         else:
@@ -37,7 +46,7 @@ def run_mutable_job(
     except Exception as exc:  # pylint: disable=broad-exception-caught
         logger.warning("Unexpected error", exc_info=exc)
         status = Status.ERROR
-    logger.debug("Finished job %s with status %s", config.id, str(status))
+    logger.debug("Finished job %s with status %s", config.id, status)
 
     if status == Status.ERROR:
         return status, variables
@@ -0,0 +1,303 @@
+"""Warm python interpreters to run short python scripts without the startup cost
+
+Starting python and importing numpy/pandas can take far longer than a short script
+    itself. A warm interpreter is a python process which imports the preload modules
+    once and then runs one script after another with runpy, each as if it were run
+    as `python script.py args...`:
+    - sys.argv, the working directory and sys.path[0] are set for the script
+    - stdout and stderr (the file descriptors, so output of C extensions too) are
+        redirected to the requested files and stdin is /dev/null
+    - SystemExit and uncaught exceptions give the same exit code as python would
+    - modules imported from the script's directory are unloaded afterwards, so
+        changes to them are seen by the next run
+
+Scripts share the interpreter, so changes a script makes to global state (other
+    than the above) are seen by the following scripts. An interpreter is replaced
+    after max_runs scripts to bound any such leaks, and whenever a script kills it
+
+The interpreter is controlled over its stdin/stdout with one JSON message per line
+"""
+
+import atexit
+import importlib
+import json
+import os
+import resource
+import runpy
+import subprocess  # nosec
+import sys
+import threading
+import time
+import traceback
+from typing import IO, Any
+
+# pools of this process by (preload, max_runs)
+_pools: dict[tuple[tuple[str, ...], int], "PythonPool"] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(preload: list[str], max_runs: int) -> "PythonPool":
+    """Return the pool of this process with these settings, creating it if needed"""
+    key = (tuple(preload), max_runs)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = PythonPool(preload, max_runs)
+        return _pools[key]
+
+
+@atexit.register
+def _close_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+class PythonPool:
+    """Idle warm interpreters, started as needed and reused
+
+    There are as many interpreters as scripts run at the same time
+    """
+
+    def __init__(self, preload: list[str], max_runs: int) -> None:
+        """Create an empty pool
+
+        Args:
+            preload (list[str]): modules every interpreter imports when it starts
+            max_runs (int): scripts an interpreter runs before it is replaced
+        """
+        self.preload = preload
+        self.max_runs = max_runs
+        self._idle: list[WarmInterpreter] = []
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        script_path: str,
+        args: list[str],
+        cwd: str | None,
+        stdout_path: str,
+        stderr_path: str,
+    ) -> tuple[int, dict[str, Any]]:
+        """Run the script in a warm interpreter
+
+        Args:
+            script_path (str): path/to/script.py
+            args (list[str]): arguments of the script
+            cwd (str | None): directory to run the script in; None for the current
+            stdout_path (str): path/to/file to write stdout to; may be os.devnull
+            stderr_path (str): path/to/file to write stderr to; may be os.devnull
+
+        Returns:
+            tuple[int, dict[str, Any]]: the exit code of the script, and the resources
+                it used: wall_time, user_time, system_time and max_rss_kb, where the
+                max RSS is of the interpreter (or a child) since it started
+
+        Raises:
+            RuntimeError: if an interpreter could not start or import the preloads
+        """
+        with self._lock:
+            interpreter = self._idle.pop() if self._idle else None
+        if interpreter is None:
+            interpreter = WarmInterpreter(self.preload)
+
+        start = time.monotonic()
+        return_code, usage = interpreter.run(
+            {
+                "script_path": os.path.abspath(script_path),
+                "args": args,
+                "cwd": os.path.abspath(cwd if cwd is not None else os.getcwd()),
+                "stdout_path": os.path.abspath(stdout_path),
+                "stderr_path": os.path.abspath(stderr_path),
+            }
+        )
+
+        if interpreter.is_alive() and interpreter.num_runs < self.max_runs:
+            with self._lock:
+                self._idle.append(interpreter)
+        else:
+            interpreter.close()
+        return return_code, {"wall_time": time.monotonic() - start, **usage}
+
+    def close(self) -> None:
+        """Stop all the idle interpreters"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for interpreter in idle:
+            interpreter.close()
+
+
+class WarmInterpreter:
+    """A python process running scripts it is sent, one at a time"""
+
+    def __init__(self, preload: list[str]) -> None:
+        """Start the interpreter and wait until it has imported preload"""
+        self.num_runs: int = 0
+        self._proc = subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "-m", __name__, *preload],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )  # nosec
+        reply = self._receive()
+        if reply is None or "error" in reply:
+            self.close()
+            error = "interpreter exited" if reply is None else reply["error"]
+            raise RuntimeError(f"Unable to start a warm python interpreter: {error}")
+
+    def run(self, request: dict[str, Any]) -> tuple[int, dict[str, Any]]:
+        """Run the script of request; return its exit code and the resources used"""
+        self.num_runs += 1
+        assert self._proc.stdin is not None
+        try:
+            self._proc.stdin.write(json.dumps(request).encode() + b"\n")
+            self._proc.stdin.flush()
+        except BrokenPipeError:
+            pass  # the exit code is collected below
+        reply = self._receive()
+        if reply is None:
+            # the script killed the interpreter, eg., with os._exit or a segfault
+            _, wait_status, rusage = os.wait4(self._proc.pid, 0)
+            self._proc.returncode = os.waitstatus_to_exitcode(wait_status)
+            return self._proc.returncode, {
+                "user_time": rusage.ru_utime,
+                "system_time": rusage.ru_stime,
+                "max_rss_kb": rusage.ru_maxrss,
+            }
+        return reply["return_code"], reply["usage"]
+
+    def is_alive(self) -> bool:
+        """Return if the interpreter can run another script"""
+        return self._proc.poll() is None
+
+    def close(self) -> None:
+        """Stop the interpreter"""
+        if self._proc.stdin is not None:
+            try:
+                self._proc.stdin.close()  # the interpreter exits at end of input
+            except BrokenPipeError:
+                pass
+        try:
+            self._proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+            self._proc.wait()
+        if self._proc.stdout is not None:
+            self._proc.stdout.close()
+
+    def _receive(self) -> dict[str, Any] | None:
+        """Return the next message of the interpreter; None if it exited"""
+        assert self._proc.stdout is not None
+        line = self._proc.stdout.readline()
+        return json.loads(line) if line else None
+
+
+def _serve(preload: list[str]) -> None:
+    """Main loop of a warm interpreter: run each script sent on stdin"""
+    # keep the original stdin/stdout for messages; the scripts get their own
+    requests: IO[bytes] = os.fdopen(os.dup(0), "rb")
+    replies: IO[bytes] = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+
+    def reply(message: dict[str, Any]) -> None:
+        replies.write(json.dumps(message).encode() + b"\n")
+        replies.flush()
+
+    try:
+        for module in preload:
+            importlib.import_module(module)
+    except ImportError as exc:
+        reply({"error": repr(exc)})
+        return
+    reply({"ready": True})
+
+    for line in requests:
+        before = _get_usage()
+        return_code = _run_script(json.loads(line))
+        after = _get_usage()
+        reply(
+            {
+                "return_code": return_code,
+                "usage": {
+                    "user_time": after["user_time"] - before["user_time"],
+                    "system_time": after["system_time"] - before["system_time"],
+                    "max_rss_kb": after["max_rss_kb"],
+                },
+            }
+        )
+
+
+def _get_usage() -> dict[str, Any]:
+    """Return the resources used by this interpreter and the children it waited for"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "user_time": own.ru_utime + children.ru_utime,
+        "system_time": own.ru_stime + children.ru_stime,
+        "max_rss_kb": max(own.ru_maxrss, children.ru_maxrss),
+    }
+
+
+def _run_script(request: dict[str, Any]) -> int:
+    """Run a script as python would, restoring this interpreter afterwards"""
+    script_path = request["script_path"]
+    script_dir = os.path.dirname(script_path)
+    saved_fds = (os.dup(1), os.dup(2))
+    saved_argv, saved_path, saved_cwd = sys.argv, sys.path[:], os.getcwd()
+    modules_before = set(sys.modules)
+
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    stdout_fd = os.open(request["stdout_path"], flags, 0o666)
+    stderr_fd = os.open(request["stderr_path"], flags, 0o666)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    os.close(stdout_fd)
+    os.close(stderr_fd)
+
+    try:
+        os.chdir(request["cwd"])
+        sys.argv = [script_path, *request["args"]]
+        sys.path.insert(0, script_dir)
+        runpy.run_path(script_path, run_name="__main__")
+        return_code = 0
+    except SystemExit as exc:
+        return_code = _exit_code(exc.code)
+    except BaseException:  # pylint: disable=broad-exception-caught
+        traceback.print_exc()
+        return_code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        os.close(saved_fds[0])
+        os.close(saved_fds[1])
+        os.chdir(saved_cwd)
+        sys.argv, sys.path[:] = saved_argv, saved_path
+        _unload_modules(set(sys.modules) - modules_before, script_dir)
+
+    return return_code
+
+
+def _exit_code(code: Any) -> int:
+    """Return the exit code python gives for SystemExit(code)"""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _unload_modules(names: set[str], script_dir: str) -> None:
+    """Unload the modules among names imported from the script's directory"""
+    for name in names:
+        module_file = getattr(sys.modules.get(name), "__file__", None) or ""
+        if os.path.abspath(module_file).startswith(script_dir + os.sep):
+            del sys.modules[name]
+
+
+if __name__ == "__main__":
+    _serve(sys.argv[1:])
@@ -0,0 +1,148 @@
+"""Resources shared by all the jobs a worker runs
+
+Jobs which need an expensive object (eg., a large lookup table, a compiled model or a
+    pool of connections) would otherwise build it on every call. Instead, the object
+    is declared once in the resources of the InitialConfig by name, and each job
+    lists the names of the resources it needs. The function of a resource is called
+    the first time a job of the worker requests it, and the same object is passed
+    to every later job of that worker as the keyword argument resources, a dict of
+    the requested resources by name
+
+Each worker process creates its own resources, so they are never shared between
+    processes; jobs running on threads of the same worker share them and must use
+    them in a thread safe way
+
+A resource function may return a context manager or be a generator which yields
+    the resource once, in which case the resource is torn down (the context exited,
+    or the generator resumed) when the worker exits, in the reverse order of creation
+"""
+
+import contextlib
+import logging
+import threading
+import types
+from typing import Any, Callable, Iterable, Mapping
+
+from antz.infrastructure.config.base import ResourceConfig
+
+# the resources of this process
+_resources: "WorkerResources | None" = None  # pylint: disable=invalid-name
+_resources_lock = threading.Lock()
+
+
+def configure_resources(configs: Mapping[str, ResourceConfig]) -> None:
+    """Declare the resources jobs of this process may request; none are created yet
+
+    Args:
+        configs (Mapping[str, ResourceConfig]): configuration of each resource by name
+    """
+    global _resources  # pylint: disable=global-statement
+    with _resources_lock:
+        _resources = WorkerResources(configs)
+
+
+def get_resources(names: Iterable[str]) -> dict[str, Any]:
+    """Return the named resources of this process, creating any not yet created
+
+    Raises:
+        KeyError: if a resource was not declared
+
+    Returns:
+        dict[str, Any]: each resource by name
+    """
+    with _resources_lock:
+        resources = _resources
+    if resources is None:
+        names = list(names)
+        if not names:
+            return {}
+        raise KeyError(f"No resources are declared, but {names} were requested")
+    return resources.get(names)
+
+
+def close_resources(logger: logging.Logger) -> None:
+    """Tear down the resources of this process created so far
+
+    Args:
+        logger (logging.Logger): logger to report failed teardowns to
+    """
+    global _resources  # pylint: disable=global-statement
+    with _resources_lock:
+        resources, _resources = _resources, None
+    if resources is not None:
+        resources.close(logger)
+
+
+class WorkerResources:
+    """Lazily created resources by name, torn down together"""
+
+    def __init__(self, configs: Mapping[str, ResourceConfig]) -> None:
+        """Declare the resources without creating them
+
+        Args:
+            configs (Mapping[str, ResourceConfig]): configuration of each resource
+        """
+        self._configs = dict(configs)
+        self._created: dict[str, Any] = {}
+        self._exit_stack = contextlib.ExitStack()
+        # one lock per resource, so creating a slow resource blocks only its users
+        self._locks: dict[str, threading.Lock] = {
+            name: threading.Lock() for name in self._configs
+        }
+        self._stack_lock = threading.Lock()
+
+    def get(self, names: Iterable[str]) -> dict[str, Any]:
+        """Return the named resources, creating those not yet created
+
+        Raises:
+            KeyError: if a resource was not declared
+
+        Returns:
+            dict[str, Any]: each resource by name
+        """
+        resources = {}
+        for name in names:
+            if name not in self._configs:
+                raise KeyError(f"Resource {name} is not declared")
+            if name not in self._created:
+                with self._locks[name]:
+                    if name not in self._created:
+                        self._created[name] = self._create(self._configs[name])
+            resources[name] = self._created[name]
+        return resources
+
+    def close(self, logger: logging.Logger) -> None:
+        """Tear down every created resource, most recently created first"""
+        with self._stack_lock:
+            exit_stack, self._exit_stack = self._exit_stack, contextlib.ExitStack()
+            self._created.clear()
+        try:
+            exit_stack.close()
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            logger.error("Unable to tear down the resources", exc_info=exc)
+
+    def _create(self, config: ResourceConfig) -> Any:
+        """Call the function of the resource and register its teardown"""
+        function: Callable[..., Any] = config.function
+        parameters = config.parameters if config.parameters is not None else {}
+        result = function(**parameters)
+
+        if isinstance(result, types.GeneratorType):
+            resource = next(result)
+            with self._stack_lock:
+                self._exit_stack.callback(_finish_generator, result)
+            return resource
+        if isinstance(result, contextlib.AbstractContextManager):
+            with self._stack_lock:
+                return self._exit_stack.enter_context(result)
+        return result
+
+
+def _finish_generator(generator: types.GeneratorType) -> None:
+    """Resume the generator of a resource past its yield to tear it down"""
+    try:
+        next(generator)
+    except StopIteration:
+        return
+    generator.close()
+    raise RuntimeError("Resource generators must only yield once")
@@ -0,0 +1,207 @@
+"""The variables of a pipeline are held in a scope
+
+A scope is an immutable, layered mapping. Changing a variable does not copy the
+    outer scope; instead it returns a new scope with a small layer on top that
+    shares all the layers beneath it. This keeps mutable jobs and fan-out jobs
+    (eg., one pipeline per row of a matrix) at O(1) per new scope, no matter how
+    many variables are in the outer scope
+
+When serialized (pickled or dumped), a scope is flattened into a plain dict
+    so that shadowed values and the layer chain are never sent anywhere
+
+Mutable jobs are handed a MutableVariables, a mutable mapping which records the
+    changes made to it on top of a scope, so jobs may still set and delete
+    variables in place without the outer scope being copied
+"""
+
+# pylint: disable=protected-access
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from collections.abc import Mapping as MappingABC
+from collections.abc import MutableMapping
+from typing import Any, Final, Mapping
+
+from pydantic import GetCoreSchemaHandler
+from pydantic_core import core_schema
+
+# same as antz.infrastructure.config.base.PrimitiveType; repeated to avoid a circular import
+ScopeValueType = str | int | float | bool
+
+# lookups walk the layers, so squash them once the chain is this deep
+MAX_SCOPE_DEPTH: Final[int] = 32
+
+
+class VariableScope(MappingABC):
+    """An immutable mapping of variable names to values, built from layers"""
+
+    __slots__ = ("_layer", "_parent", "_depth", "_len")
+
+    def __init__(
+        self,
+        layer: Mapping[str, ScopeValueType] | None = None,
+        parent: VariableScope | None = None,
+    ) -> None:
+        """Create a scope with layer on top of parent
+
+        Args:
+            layer (Mapping[str, ScopeValueType] | None): variables of this layer;
+                this mapping is owned by the scope and must not be modified afterwards
+            parent (VariableScope | None): the outer scope to share
+        """
+        self._layer: Mapping[str, ScopeValueType] = layer if layer is not None else {}
+        self._parent: VariableScope | None = parent
+        self._depth: int = 0 if parent is None else parent._depth + 1
+        self._len: int | None = None
+
+    @classmethod
+    def from_mapping(
+        cls, variables: Mapping[str, ScopeValueType] | None
+    ) -> VariableScope:
+        """Return variables as a scope, copying only if it is not a scope already"""
+        if isinstance(variables, VariableScope):
+            return variables
+        if isinstance(variables, MutableVariables):
+            return variables.to_scope()
+        if variables is None:
+            return cls()
+        return cls(dict(variables))
+
+    def set(self, name: str, value: ScopeValueType) -> VariableScope:
+        """Return a new scope with the variable name set to value"""
+        return self.update({name: value})
+
+    def update(self, new_variables: Mapping[str, ScopeValueType]) -> VariableScope:
+        """Return a new scope with new_variables layered on top of this one
+
+        Args:
+            new_variables (Mapping[str, ScopeValueType]): variables to add or overwrite
+
+        Returns:
+            VariableScope: the new scope; this scope is unchanged
+        """
+        if not new_variables:
+            return self
+        if self._depth + 1 >= MAX_SCOPE_DEPTH:
+            return VariableScope({**self.to_dict(), **new_variables})
+        return VariableScope(dict(new_variables), parent=self)
+
+    def to_dict(self) -> dict[str, ScopeValueType]:
+        """Flatten the scope into a plain dict"""
+        layers = []
+        scope: VariableScope | None = self
+        while scope is not None:
+            layers.append(scope._layer)
+            scope = scope._parent
+        flattened: dict[str, ScopeValueType] = {}
+        for layer in reversed(layers):
+            flattened.update(layer)
+        return flattened
+
+    def __getitem__(self, name: str) -> ScopeValueType:
+        scope: VariableScope | None = self
+        while scope is not None:
+            if name in scope._layer:
+                return scope._layer[name]
+            scope = scope._parent
+        raise KeyError(name)
+
+    def __contains__(self, name: object) -> bool:
+        scope: VariableScope | None = self
+        while scope is not None:
+            if name in scope._layer:
+                return True
+            scope = scope._parent
+        return False
+
+    def __iter__(self) -> Iterator[str]:
+        if self._parent is None:
+            return iter(self._layer)
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        if self._len is None:
+            self._len = (
+                len(self._layer) if self._parent is None else len(self.to_dict())
+            )
+        return self._len
+
+    def __repr__(self) -> str:
+        return f"VariableScope({self.to_dict()!r})"
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (VariableScope, (self.to_dict(),))
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, _source_type: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        """Scopes are taken as-is (no copy); other mappings are validated and wrapped"""
+        from_mapping_schema = core_schema.no_info_after_validator_function(
+            cls, handler.generate_schema(dict[str, ScopeValueType])
+        )
+        return core_schema.json_or_python_schema(
+            json_schema=from_mapping_schema,
+            python_schema=core_schema.union_schema(
+                [core_schema.is_instance_schema(cls), from_mapping_schema]
+            ),
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda scope: scope.to_dict()
+            ),
+        )
+
+
+class MutableVariables(MutableMapping):
+    """A mutable mapping of the variables of a scope which records its changes
+
+    The scope is never modified; to_scope returns a new scope with the changes
+    """
+
+    __slots__ = ("_scope", "_changes", "_deleted")
+
+    def __init__(self, scope: VariableScope) -> None:
+        """Start with the variables of scope and no changes"""
+        self._scope = scope
+        self._changes: dict[str, ScopeValueType] = {}
+        self._deleted: set[str] = set()
+
+    def to_scope(self) -> VariableScope:
+        """Return the scope with the changes; the scope itself if there are none"""
+        if not self._deleted:
+            return self._scope.update(self._changes)
+        return VariableScope(dict(self.items()))
+
+    def __getitem__(self, name: str) -> ScopeValueType:
+        if name in self._changes:
+            return self._changes[name]
+        if name in self._deleted:
+            raise KeyError(name)
+        return self._scope[name]
+
+    def __setitem__(self, name: str, value: ScopeValueType) -> None:
+        self._changes[name] = value
+
+    def __delitem__(self, name: str) -> None:
+        if name not in self:
+            raise KeyError(name)
+        self._changes.pop(name, None)
+        if name in self._scope:
+            self._deleted.add(name)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._changes or (
+            name not in self._deleted and name in self._scope
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        for name in self._scope:
+            if name not in self._deleted and name not in self._changes:
+                yield name
+        yield from self._changes
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"MutableVariables({dict(self.items())!r})"
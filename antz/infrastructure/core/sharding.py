@@ -0,0 +1,167 @@
+"""Sharding splits a large fan-out (eg., one pipeline per row of a matrix) over workers
+
+Instead of a single submitter job submitting every child pipeline itself, it submits
+    a few shard tasks, each covering a range of the rows. Those shards are picked up by
+    other workers which submit the children of their range, or shard again if the
+    range is still large. Fan-out then scales with the number of workers instead of
+    being bottlenecked on the single worker running the submitter job; with the
+    local submitter, the workers are its num_concurrent_jobs processes
+
+A shard task is a pipeline with one stage: the same submitter job with the same
+    parameters, only restricted to its range
+
+Jobs which support sharding have Parameters which subclass ShardParameters and call
+    shard_or_get_range to either submit the shards or get the range to run themselves
+"""
+
+import uuid
+from typing import Any, Callable, Mapping
+
+from pydantic import BaseModel, NonNegativeInt, PositiveInt
+
+from antz.infrastructure.config.base import (
+    Config,
+    PipelineConfig,
+    PrimitiveType,
+    SubmitFunctionType,
+)
+
+
+class ShardParameters(BaseModel, frozen=True):
+    """Parameters shared by all jobs that can shard
+
+    num_shards (int): split the fan-out into up to this many shard tasks
+    min_shard_size (int): never make shards of fewer rows than this
+    recursive_shards (bool): if True, shards shard again while they are large
+    row_start (int): first row to create; set by sharding
+    row_stop (int | None): one past the last row to create; set by sharding
+    """
+
+    num_shards: PositiveInt = 1
+    min_shard_size: PositiveInt = 10_000
+    recursive_shards: bool = False
+    row_start: NonNegativeInt = 0
+    row_stop: NonNegativeInt | None = None
+
+
+def shard_or_get_range(
+    parameters: Mapping[str, Any],
+    get_num_rows: Callable[[], int],
+    submit_fn: SubmitFunctionType,
+    variables: Mapping[str, PrimitiveType],
+    pipeline_config: PipelineConfig,
+) -> tuple[int, int | None] | None:
+    """Submit shards if the range of rows should be sharded; else return the range
+
+    Args:
+        parameters (Mapping[str, Any]): the resolved parameters of the submitter job,
+            copied into each shard so nested configs stay unresolved for the children
+        get_num_rows (Callable[[], int]): returns the total number of rows; only
+            called when sharding, as it may be expensive
+        submit_fn (SubmitFunctionType): function to submit the shards to
+        variables (Mapping[str, PrimitiveType]): variables from the outer context
+        pipeline_config (PipelineConfig): the pipeline running the submitter job
+
+    Returns:
+        tuple[int, int | None] | None: [start, stop) of the rows the job must create
+            itself, where a stop of None is the last row; None if the rows were sharded
+    """
+    shard_parameters = ShardParameters.model_validate(parameters)
+    row_start = shard_parameters.row_start
+    row_stop = shard_parameters.row_stop
+    if shard_parameters.num_shards == 1:
+        return row_start, row_stop  # no need to know how many rows there are
+
+    num_rows = get_num_rows()
+    row_stop = num_rows if row_stop is None else min(row_stop, num_rows)
+    ranges = shard_ranges(
+        row_start,
+        row_stop,
+        shard_parameters.num_shards,
+        shard_parameters.min_shard_size,
+    )
+    if len(ranges) == 1:
+        return row_start, row_stop
+
+    # not dumped from shard_parameters, which would turn nested configs (eg.,
+    #   templates) into mappings whose variables the shard would then resolve
+    shard_task_parameters = dict(parameters)
+    if not shard_parameters.recursive_shards:
+        shard_task_parameters["num_shards"] = 1
+    submit_shards(shard_task_parameters, ranges, submit_fn, variables, pipeline_config)
+    return None
+
+
+def shard_ranges(
+    start: int, stop: int, num_shards: int, min_shard_size: int
+) -> list[tuple[int, int]]:
+    """Split [start, stop) into at most num_shards contiguous ranges
+
+    Ranges are never smaller than min_shard_size (except the last), so small ranges
+        are not split into many tiny shards
+
+    Examples:
+        shard_ranges(0, 10, 2, 1) -> [(0, 5), (5, 10)]
+        shard_ranges(0, 10, 4, 5) -> [(0, 5), (5, 10)]
+        shard_ranges(0, 3, 4, 5) -> [(0, 3)]
+
+    Args:
+        start (int): first row of the range
+        stop (int): one past the last row of the range
+        num_shards (int): maximum number of ranges to split into
+        min_shard_size (int): minimum number of rows in a range
+
+    Returns:
+        list[tuple[int, int]]: the [start, stop) of each range, in order
+    """
+    num_rows = max(stop - start, 0)
+    num_shards = max(min(num_shards, num_rows // max(min_shard_size, 1)), 1)
+    shard_size, remainder = divmod(num_rows, num_shards)
+
+    ranges = []
+    shard_start = start
+    for shard in range(num_shards):
+        shard_stop = shard_start + shard_size + (1 if shard < remainder else 0)
+        ranges.append((shard_start, shard_stop))
+        shard_start = shard_stop
+    return ranges
+
+
+def submit_shards(
+    parameters: Mapping[str, Any],
+    ranges: list[tuple[int, int]],
+    submit_fn: SubmitFunctionType,
+    variables: Mapping[str, PrimitiveType],
+    pipeline_config: PipelineConfig,
+) -> None:
+    """Submit one shard task per range, re-running the current stage of pipeline_config
+
+    Args:
+        parameters (Mapping[str, Any]): resolved parameters of the submitter job;
+            each shard gets a copy with row_start and row_stop set to its range
+        ranges (list[tuple[int, int]]): [start, stop) of each shard
+        submit_fn (SubmitFunctionType): function to submit the shards to
+        variables (Mapping[str, PrimitiveType]): variables from the outer context
+        pipeline_config (PipelineConfig): the pipeline running the submitter job
+    """
+    stage = pipeline_config.stages[pipeline_config.curr_stage]
+    for shard_num, (row_start, row_stop) in enumerate(ranges):
+        shard_stage = stage.model_copy(
+            update={
+                # new id as the parameters are no longer those of the original stage
+                "id": uuid.uuid4(),
+                "parameters": {
+                    **parameters,
+                    "row_start": row_start,
+                    "row_stop": row_stop,
+                },
+            }
+        )
+        shard_pipeline = PipelineConfig.model_validate(
+            {
+                "type": "pipeline",
+                "name": f"{pipeline_config.name}_shard_{shard_num}",
+                "stages": [shard_stage],
+            }
+        )
+        submit_fn(Config(config=shard_pipeline, variables=variables))
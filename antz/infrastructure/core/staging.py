@@ -0,0 +1,286 @@
+"""Staging copies input data to node local scratch once per worker
+
+Pipelines of a sweep often read the same inputs from slow shared storage. A job
+    lists the parameters which are paths to its inputs in stage_inputs; after the
+    variables of its parameters are resolved, each of those paths is replaced by a
+    local copy in the staging directory of the worker, made the first time any job
+    of the worker stages that path. As the paths are resolved first, templates such
+    as "%{data_dir}/input.csv" are staged like literal paths
+
+A copy is reused while the source has the same mtime and size; for a directory the
+    latest mtime and total size of everything under it. Copies are kept up to a
+    total size, evicting the least recently used first, but never one in use by a
+    running job. An input larger than the cache, or which does not fit beside the
+    copies in use, is read from its source instead
+
+Staging is enabled by the staging_directory of the local submitter; without it, jobs
+    read their inputs from their sources
+"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping as MappingABC
+from typing import Any, Iterable, Iterator
+
+from antz.infrastructure.config.base import ParametersType
+from antz.infrastructure.core.file_copy import copy_file_contents, copy_tree
+
+# (absolute source path, mtime_ns, size)
+StageKey = tuple[str, int, int]
+
+# the staging cache of this process
+_cache: "StagingCache | None" = None  # pylint: disable=invalid-name
+_cache_lock = threading.Lock()
+
+
+def configure_staging(directory: str | None, max_bytes: int) -> None:
+    """Stage the inputs of the jobs of this process to a directory of its own
+
+    Args:
+        directory (str | None): node local scratch directory; None disables staging
+        max_bytes (int): most bytes of copies to keep
+    """
+    global _cache  # pylint: disable=global-statement
+    with _cache_lock:
+        _cache = (
+            StagingCache(os.path.join(directory, f"worker_{os.getpid()}"), max_bytes)
+            if directory is not None
+            else None
+        )
+
+
+def close_staging(logger: logging.Logger) -> None:
+    """Remove the copies of this process
+
+    Args:
+        logger (logging.Logger): logger to report the use of the cache to
+    """
+    global _cache  # pylint: disable=global-statement
+    with _cache_lock:
+        cache, _cache = _cache, None
+    if cache is not None:
+        logger.info("Staged %d inputs and reused %d", cache.num_misses, cache.num_hits)
+        cache.clear()
+
+
+@contextlib.contextmanager
+def staged_parameters(
+    parameters: ParametersType, stage_inputs: list[str], logger: logging.Logger
+) -> Iterator[ParametersType]:
+    """Replace the paths of the stage_inputs parameters by their local copies
+
+    The copies cannot be evicted until the context exits
+
+    Args:
+        parameters (ParametersType): the resolved parameters of a job
+        stage_inputs (list[str]): keys of the parameters which are paths or lists of
+            paths, "." separated for nested keys
+        logger (logging.Logger): logger to assist with debugging
+
+    Raises:
+        OSError: if an input cannot be staged, eg., it does not exist
+
+    Yields:
+        ParametersType: a copy of the parameters with the staged paths
+    """
+    with _cache_lock:
+        cache = _cache
+    if cache is None or parameters is None or not stage_inputs:
+        yield parameters
+        return
+
+    pinned: list[StageKey] = []
+    try:
+        staged: Any = parameters
+        for key in stage_inputs:
+            staged = _replace(staged, key.split("."), cache, pinned)
+        logger.debug("Staged inputs %s", stage_inputs)
+        yield staged
+    finally:
+        cache.release(pinned)
+
+
+def _replace(
+    node: Any, parts: list[str], cache: "StagingCache", pinned: list[StageKey]
+) -> Any:
+    """Return a copy of node with the path(s) at parts replaced by local copies"""
+    if not parts:
+        if isinstance(node, str):
+            return cache.stage(node, pinned)
+        if isinstance(node, list) and all(isinstance(path, str) for path in node):
+            return [cache.stage(path, pinned) for path in node]
+        raise ValueError(f"Only paths can be staged, got {node}")
+
+    if isinstance(node, list):
+        index = int(parts[0])
+        replaced = list(node)
+        replaced[index] = _replace(node[index], parts[1:], cache, pinned)
+        return replaced
+    if isinstance(node, MappingABC):
+        replaced = dict(node)
+        replaced[parts[0]] = _replace(node[parts[0]], parts[1:], cache, pinned)
+        return replaced
+    raise KeyError(f"No parameter {'.'.join(parts)} to stage")
+
+
+class StagingCache:
+    """Local copies of inputs by source path and version, bounded in total size"""
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        """Create an empty cache
+
+        Args:
+            directory (str): directory to keep the copies in; removed by clear
+            max_bytes (int): most bytes of copies to keep
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.num_hits: int = 0
+        self.num_misses: int = 0
+        # key -> [local path (None while copying), size, number of pins];
+        #   least recently used first
+        self._entries: OrderedDict[StageKey, list[Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        # only one thread copies a source at a time
+        self._source_locks: dict[str, threading.Lock] = {}
+
+    def stage(self, path: str, pinned: list[StageKey]) -> str:
+        """Return the path of the local copy of path, copying it if needed
+
+        The copy is pinned (and its key appended to pinned) until it is released
+
+        Args:
+            path (str): file or directory to stage
+            pinned (list[StageKey]): keys pinned by the caller so far
+
+        Raises:
+            OSError: if path does not exist or cannot be copied
+
+        Returns:
+            str: path of the local copy, or path if it could not be kept
+        """
+        key = _get_key(path)
+        local_path = self._pin(key)
+        if local_path is None:
+            with self._lock:
+                source_lock = self._source_locks.setdefault(key[0], threading.Lock())
+            with source_lock:
+                local_path = self._pin(key)
+                if local_path is None:
+                    local_path = self._stage_new(key)
+                    if local_path is None:
+                        return path
+        pinned.append(key)
+        return local_path
+
+    def release(self, keys: Iterable[StageKey]) -> None:
+        """Unpin copies so they may be evicted"""
+        with self._lock:
+            for key in keys:
+                self._entries[key][2] -= 1
+
+    def clear(self) -> None:
+        """Remove every copy"""
+        with self._lock:
+            self._entries.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _pin(self, key: StageKey) -> str | None:
+        """Pin the copy of key and return its path; None if there is none"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is None:
+                return None
+            self._entries.move_to_end(key)
+            entry[2] += 1
+            self.num_hits += 1
+            return entry[0]
+
+    def _stage_new(self, key: StageKey) -> str | None:
+        """Copy the source of key and pin it; None if it does not fit"""
+        size = key[2]
+        evicted: list[tuple[StageKey, str]] = []
+        with self._lock:
+            self.num_misses += 1
+            available = self.max_bytes - sum(
+                entry[1] for entry in self._entries.values()
+            )
+            for old_key, (local_path, old_size, num_pins) in self._entries.items():
+                if available >= size:
+                    break
+                if not num_pins:
+                    evicted.append((old_key, local_path))
+                    available += old_size
+            if available < size:
+                return None
+            for old_key, _ in evicted:
+                del self._entries[old_key]
+            # reserve the space while copying
+            self._entries[key] = [None, size, 1]
+
+        for _, local_path in evicted:
+            shutil.rmtree(os.path.dirname(local_path), ignore_errors=True)
+
+        try:
+            local_path = self._copy(key)
+        except BaseException:
+            with self._lock:
+                del self._entries[key]
+            raise
+        with self._lock:
+            self._entries[key][0] = local_path
+        return local_path
+
+    def _copy(self, key: StageKey) -> str:
+        """Copy the source of key into a new directory of the cache"""
+        source = key[0]
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        entry_dir = os.path.join(self.directory, digest)
+        local_path = os.path.join(entry_dir, os.path.basename(source))
+        tmp_dir = f"{entry_dir}.{threading.get_ident()}.tmp"
+
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            tmp_path = os.path.join(tmp_dir, os.path.basename(source))
+            if os.path.isdir(source):
+                copy_tree(source, tmp_path)
+            else:
+                copy_file_contents(source, tmp_path)
+                shutil.copystat(source, tmp_path)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return local_path
+
+
+def _get_key(path: str) -> StageKey:
+    """Return the source path with the version of its contents
+
+    A file's version is its mtime and size; a directory's the latest mtime and
+        total size of everything under it
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    if not os.path.isdir(path):
+        return path, stat.st_mtime_ns, stat.st_size
+
+    mtime_ns, size = stat.st_mtime_ns, 0
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                entry_stat = entry.stat()
+                mtime_ns = max(mtime_ns, entry_stat.st_mtime_ns)
+                if entry.is_dir():
+                    stack.append(entry.path)
+                else:
+                    size += entry_stat.st_size
+    return path, mtime_ns, size
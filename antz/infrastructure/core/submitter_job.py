@@ -40,10 +40,10 @@ def run_submitter_job(
 
     status: Status
     func_handle = config.function
-    logger.debug("Running job %s, with func handle: %s", config.id, str(func_handle))
+    logger.debug("Running job %s, with func handle: %s", config.id, func_handle)
 
-    params = resolve_variables(config.parameters, variables)
-    logger.debug("Running function with parameters %s", str(params))
+    params = resolve_variables(config.parameters, variables, cache_key=config.id)
+    logger.debug("Running function with parameters %s", params)
 
     try:
         ret = func_handle(params, submit_fn, variables, pipeline_config, logger)
@@ -57,7 +57,7 @@ def run_submitter_job(
     except Exception as exc:  # pylint: disable=broad-exception-caught
         logger.warning("Unexpected error", exc_info=exc)
         status = Status.ERROR
-    logger.debug("Finished job %s with status %s", config.id, str(status))
+    logger.debug("Finished job %s with status %s", config.id, status)
     if status == Status.SUCCESS:
         logger.debug(
             "Submitter success turned into FINAL. ALl Submitter jobs are FINAL"
@@ -1,28 +1,57 @@
 """
 Parameters may contain variables which need resolving. This module
     will handle resolving the variables
+
+Parameters may be nested arbitrarily deep in lists and mappings. Before resolving,
+    the parameters are scanned once for the leaves which contain variable tokens
+    (the "token paths"); resolution then only visits those leaves and shares every
+    untouched subtree with the original parameters. Nested configurations
+    (pipelines, jobs) are a new scope and are left for their own resolution.
 """
 
 import re
+from collections import OrderedDict
 from collections.abc import Mapping as MappingABC
+from functools import lru_cache
 from operator import add, mul, sub, truediv
-from typing import Mapping, overload
+from typing import Any, Callable, Final, Hashable, Mapping, TypeAlias, overload
 
-from pydantic import BaseModel
+import pandas as pd
 
 from antz.infrastructure.config.base import ParametersType, PrimitiveType
 
 VARIABLE_PATTERN = re.compile(r"%{([^}]+)}")
 
+# order matters, see _resolve_variable_expression
+_OPERATIONS: Final[list[tuple[str, Callable[[Any, Any], Any]]]] = [
+    ("-", sub),
+    ("+", add),
+    ("/", truediv),
+    ("*", mul),
+]
+
+# trie of the keys/indices leading to templated leaves; a leaf is marked by None
+TokenPaths: TypeAlias = dict[str | int, "TokenPaths | None"]
+
+_TOKEN_PATHS_CACHE_SIZE: Final[int] = 4096
+# key -> (the parameters scanned, their token paths); the parameters are kept so an
+#   entry is only used for the very object it was built from, as ids may be reused
+_token_paths_cache: OrderedDict[Hashable, tuple[Any, TokenPaths]] = OrderedDict()
+
 
 def resolve_variables(
-    parameters: ParametersType, variables: Mapping[str, PrimitiveType]
+    parameters: ParametersType,
+    variables: Mapping[str, PrimitiveType],
+    cache_key: Hashable | None = None,
 ) -> ParametersType:
     """Provided paramters, return the parameters with any variables interpolated
 
     Args:
         parameters (ParametersType): ParametersType to a job
         variables (Mapping[str, PrimitiveType]): variables in scope for that job
+        cache_key (Hashable | None): if provided, the token paths of the parameters
+            are cached under this key (eg. the id of the job) so repeated runs of
+            the same parameters object skip scanning them
 
     Returns:
         ParametersType: the job with variables interpolated
@@ -31,15 +60,255 @@ def resolve_variables(
         return None
     if variables is None:
         return parameters
-    params = parameters
-    return {
-        k: (
-            _resolve_value(val, variables)
-            if not isinstance(val, (MappingABC, BaseModel))
-            else val
+
+    token_paths = get_token_paths(parameters, cache_key=cache_key)
+    if not token_paths:
+        return parameters
+    return _rebuild_token_paths(
+        parameters,
+        token_paths,
+        lambda val, _path: _resolve_value(val, variables=variables),
+    )
+
+
+def resolve_variables_batch(
+    parameters: ParametersType,
+    table: pd.DataFrame,
+    variables: Mapping[str, PrimitiveType] | None = None,
+) -> list[ParametersType]:
+    """Resolve the parameters once for every row of a table of variables
+
+    Each templated leaf of the parameters is evaluated against whole columns at once,
+        so the expressions and string interpolation are vectorized instead of
+        being done row by row. Columns of the table shadow the outer variables,
+        just like the variables of a row of a case matrix shadow the outer scope
+
+    Args:
+        parameters (ParametersType): ParametersType to a job
+        table (pd.DataFrame): one row of variables per set of parameters to resolve
+        variables (Mapping[str, PrimitiveType] | None): outer variables shared by all rows
+
+    Returns:
+        list[ParametersType]: the resolved parameters of each row of the table, in order
+    """
+    if parameters is None:
+        return [None] * len(table)
+
+    token_paths = find_token_paths(parameters)
+    if not token_paths:
+        return [parameters] * len(table)
+
+    resolved_leaves = _resolve_leaves_batch(parameters, token_paths, table, variables)
+
+    return [
+        _rebuild_token_paths(
+            parameters,
+            token_paths,
+            lambda _val, path, row=row: resolved_leaves[path][row],
+        )
+        for row in range(len(table))
+    ]
+
+
+def get_token_paths(
+    parameters: ParametersType, cache_key: Hashable | None = None
+) -> TokenPaths:
+    """Return the token paths of the parameters, using the cache if a key is provided
+
+    A cached entry is only used for the same parameters object it was built from;
+        other parameters under the same key (eg., a reused job id) are scanned and
+        replace it
+
+    Args:
+        parameters (ParametersType): ParametersType to a job
+        cache_key (Hashable | None): key to cache the token paths under
+
+    Returns:
+        TokenPaths: trie of the keys leading to leaves with variable tokens
+    """
+    if parameters is None:
+        return {}
+    if cache_key is None:
+        return find_token_paths(parameters)
+
+    cached = _token_paths_cache.get(cache_key)
+    if cached is not None and cached[0] is parameters:
+        _token_paths_cache.move_to_end(cache_key)
+        return cached[1]
+
+    token_paths = find_token_paths(parameters)
+    _token_paths_cache[cache_key] = (parameters, token_paths)
+    _token_paths_cache.move_to_end(cache_key)
+    if len(_token_paths_cache) > _TOKEN_PATHS_CACHE_SIZE:
+        _token_paths_cache.popitem(last=False)
+    return token_paths
+
+
+def find_token_paths(parameters: Mapping[str, Any] | list[Any]) -> TokenPaths:
+    """Scan (nested) parameters for the leaves that contain variable tokens
+
+    Examples:
+        find_token_paths({"a": "%{x}", "b": 1}) -> {"a": None}
+        find_token_paths({"a": {"b": ["c", "%{x}"]}}) -> {"a": {"b": {1: None}}}
+
+    Args:
+        parameters (Mapping[str, Any] | list[Any]): parameters to scan
+
+    Returns:
+        TokenPaths: trie of the keys leading to leaves with variable tokens
+    """
+    items = (
+        parameters.items()
+        if isinstance(parameters, MappingABC)
+        else enumerate(parameters)
+    )
+    token_paths: TokenPaths = {}
+    for key, val in items:
+        if isinstance(val, str):
+            if VARIABLE_PATTERN.search(val) is not None:
+                token_paths[key] = None
+        elif isinstance(val, (MappingABC, list)):
+            child_paths = find_token_paths(val)
+            if child_paths:
+                token_paths[key] = child_paths
+        # BaseModels (nested configs) are their own scope and are not resolved here
+    return token_paths
+
+
+def _rebuild_token_paths(
+    node: Any,
+    token_paths: TokenPaths,
+    resolve_leaf: Callable[[Any, tuple[str | int, ...]], Any],
+    path: tuple[str | int, ...] = (),
+) -> Any:
+    """Return a copy of node with the leaves in token_paths replaced by resolve_leaf
+
+    Only the containers along the token paths are copied; all other values
+        are shared with the original node
+    """
+    resolved: Any = dict(node) if isinstance(node, MappingABC) else list(node)
+    for key, child_paths in token_paths.items():
+        if child_paths is None:
+            resolved[key] = resolve_leaf(node[key], (*path, key))
+        else:
+            resolved[key] = _rebuild_token_paths(
+                node[key], child_paths, resolve_leaf, (*path, key)
+            )
+    return resolved
+
+
+def _resolve_leaves_batch(
+    node: Any,
+    token_paths: TokenPaths,
+    table: pd.DataFrame,
+    variables: Mapping[str, PrimitiveType] | None,
+    path: tuple[str | int, ...] = (),
+) -> dict[tuple[str | int, ...], list[Any]]:
+    """Resolve every templated leaf against the table
+
+    Returns:
+        dict[tuple[str | int, ...], list[Any]]: path of the leaf -> value for each row
+    """
+    resolved_leaves: dict[tuple[str | int, ...], list[Any]] = {}
+    for key, child_paths in token_paths.items():
+        if child_paths is None:
+            resolved_leaves[(*path, key)] = _resolve_value_batch(
+                node[key], table, variables
+            )
+        else:
+            resolved_leaves.update(
+                _resolve_leaves_batch(
+                    node[key], child_paths, table, variables, (*path, key)
+                )
+            )
+    return resolved_leaves
+
+
+def _resolve_value_batch(
+    val: str, table: pd.DataFrame, variables: Mapping[str, PrimitiveType] | None
+) -> list[PrimitiveType]:
+    """Vectorized _resolve_value; returns the resolved value for each row of table"""
+
+    split_vars: list[Any] = list(_split_template(val))
+    for i in range(1, len(split_vars), 2):
+        split_vars[i] = _resolve_variable_expression_batch(
+            split_vars[i].strip(), table, variables
         )
-        for k, val in params.items()
+
+    if not any(isinstance(piece, pd.Series) for piece in split_vars):
+        # no columns are used, so every row resolves to the same value
+        return [_resolve_value(val, variables=variables or {})] * len(table)
+
+    if _is_whole_expression(_split_template(val)):
+        resolved: pd.Series = split_vars[1]
+        if pd.api.types.is_numeric_dtype(resolved.dtype):
+            return resolved.tolist()  # keep the native type, like _resolve_value
+        return _infer_type_batch(resolved)
+
+    joined = pd.Series("", index=table.index, dtype=object)
+    for piece in split_vars:
+        if isinstance(piece, pd.Series):
+            joined = joined + piece.astype(str)
+        elif piece != "":
+            joined = joined + str(piece)
+
+    return _infer_type_batch(joined)
+
+
+def _infer_type_batch(column: pd.Series) -> list[PrimitiveType]:
+    """Infer the type of the strings of a column, once per distinct value"""
+    inferred = {
+        unique: _infer_type(unique) if isinstance(unique, str) else unique
+        for unique in column.unique()
     }
+    return [inferred[val] for val in column]
+
+
+def _resolve_variable_expression_batch(
+    variable_expression: str,
+    table: pd.DataFrame,
+    variables: Mapping[str, PrimitiveType] | None,
+) -> pd.Series | PrimitiveType:
+    """Vectorized _resolve_variable_expression_recursive
+
+    Returns a column if the expression uses a column of table; else a single value
+    """
+    if variable_expression in table.columns:
+        return table[variable_expression]
+    if variables is not None and variable_expression in variables:
+        return variables[variable_expression]
+
+    for op_char, op_fn in _OPERATIONS:
+        if op_char in variable_expression:
+            i = variable_expression.find(op_char)
+            lval = _resolve_variable_expression_batch(
+                variable_expression[:i].rstrip(), table, variables
+            )
+            rval = _resolve_variable_expression_batch(
+                variable_expression[i + 1 :].lstrip(), table, variables
+            )
+            return op_fn(_as_numeric_batch(lval), _as_numeric_batch(rval))
+
+    return _resolve_token(variable_expression, variables=variables)
+
+
+def _as_numeric_batch(val: pd.Series | PrimitiveType) -> pd.Series | int | float:
+    """Convert an operand of an expression to a number (or a column of numbers)"""
+    if not isinstance(val, pd.Series):
+        if not isinstance(val, (int, float)):
+            val = _infer_type(str(val))
+        if not isinstance(val, (int, float)):
+            raise RuntimeError(f'Unable to perform arithmetic with "{val}"')
+        return val
+
+    if pd.api.types.is_numeric_dtype(val.dtype):
+        return val
+    converted = val.map(
+        lambda elem: elem if isinstance(elem, (int, float)) else _infer_type(str(elem))
+    )
+    if not all(isinstance(elem, (int, float)) for elem in converted):
+        raise RuntimeError(f'Unable to perform arithmetic with column "{val.name}"')
+    return pd.to_numeric(converted)
 
 
 def is_variable(token: PrimitiveType) -> bool:
@@ -81,21 +350,38 @@ def _resolve_value(
     if not isinstance(val, str):
         return val  # only strings have variable tokens
 
-    split_vars = VARIABLE_PATTERN.split(val)
-    if len(split_vars) == 1:
+    split_template = _split_template(val)
+    if len(split_template) == 1:
         return val  # only unmatched will return a list of one
+
+    if _is_whole_expression(split_template):
+        # keep the native type of the variable instead of a round trip through str
+        resolved = _resolve_variable_expression(split_template[1], variables=variables)
+        return _infer_type(resolved) if isinstance(resolved, str) else resolved
+
+    split_vars = list(split_template)
     for i in range(1, len(split_vars), 2):
         split_vars[i] = str(
             _resolve_variable_expression(split_vars[i], variables=variables)
         )
 
-    val = "".join(split_vars)
+    return _infer_type("".join(split_vars))
 
-    val = _infer_type(val)
 
-    return val
+@lru_cache(maxsize=4096)
+def _split_template(val: str) -> tuple[str, ...]:
+    """Split a template into literals (even indices) and expressions (odd indices)"""
+    return tuple(VARIABLE_PATTERN.split(val))
 
 
+def _is_whole_expression(split_template: tuple[str, ...]) -> bool:
+    """Return True if the template is exactly one expression, eg. '%{a}'"""
+    return (
+        len(split_template) == 3 and split_template[0] == "" and split_template[2] == ""
+    )
+
+
+@lru_cache(maxsize=4096)
 def _infer_type(val: str) -> PrimitiveType:
     """Change type to best fitting primitive type
 
@@ -125,9 +411,9 @@ def _infer_type(val: str) -> PrimitiveType:
     except ValueError:
         pass
 
-    if val.lower() in "true":
+    if val.lower() == "true":
         return True
-    if val.lower() in "false":
+    if val.lower() == "false":
         return False
 
     return val
@@ -159,7 +445,6 @@ def _resolve_variable_expression(
     Returns:
         PrimitiveType: the variable expression as simplified as possible
     """
-    print("parent call: ", variable_expression)
     return _resolve_variable_expression_recursive(
         variable_expression=variable_expression.strip(), variables=variables
     )
@@ -196,14 +481,7 @@ def _resolve_variable_expression_recursive(
     if variables is not None and variable_expression in variables:
         return variables[variable_expression]
 
-    operations = [
-        ("-", sub),
-        ("+", add),
-        ("/", truediv),
-        ("*", mul),
-    ]
-
-    for op_char, op_fn in operations:
+    for op_char, op_fn in _OPERATIONS:
         if op_char in variable_expression:
             i = variable_expression.find(op_char)
             lval: PrimitiveType = variable_expression[:i].rstrip()
@@ -249,10 +527,11 @@ def _resolve_token(
         variables (Mapping[str, PrimitiveType]): variables in scope to resolve
 
     Returns:
-        str: if it exists, the value of the variable of the token provided
+        PrimitiveType: if it exists, the value of the variable of the token provided;
+            else the token itself
     """
 
     token: str = var_token.strip()
     if variables is None:
         return token
-    return str(variables.get(token, token))
+    return variables.get(token, token)
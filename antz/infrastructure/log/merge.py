@@ -0,0 +1,109 @@
+"""Merge the log shards written by the workers with logging type "sharded"
+
+Each shard is already in order, so the shards are merged k ways by their monotonic
+    timestamps with a heap, reading one line of each at a time; any number of
+    shards of any size are merged in constant memory. A shard which was rotated is
+    read from its oldest backup (the highest suffix) to the current file
+
+The merged records are written as they were, one JSON object per line, optionally
+    only those of one pipeline
+"""
+
+import errno
+import heapq
+import json
+import os
+import re
+from typing import Iterable, Iterator, TextIO
+
+from antz.infrastructure.log.multiproc_logging import SHARD_PREFIX, SHARD_SUFFIX
+
+# antz_<pid>.jsonl and its backups antz_<pid>.jsonl.<n>
+_SHARD_PATTERN = re.compile(
+    rf"^(?P<base>{re.escape(SHARD_PREFIX)}.*{re.escape(SHARD_SUFFIX)})"
+    r"(?:\.(?P<backup>\d+))?$"
+)
+
+
+def merge_shards(
+    paths: Iterable[str], output: TextIO, pipeline_id: str | None = None
+) -> int:
+    """Write the records of the shards to output in order of time
+
+    Args:
+        paths (Iterable[str]): shard files, or directories of shards
+        output (TextIO): where to write the merged records
+        pipeline_id (str | None): if set, only write the records of this pipeline
+
+    Returns:
+        int: the number of records written
+    """
+    shards = find_shards(paths)
+    num_written = 0
+    for _, _, line in heapq.merge(
+        *(
+            _read_shard(files, shard_num, pipeline_id)
+            for shard_num, files in enumerate(shards)
+        )
+    ):
+        output.write(line)
+        num_written += 1
+    return num_written
+
+
+def find_shards(paths: Iterable[str]) -> list[list[str]]:
+    """Return the files of each shard, oldest first
+
+    Args:
+        paths (Iterable[str]): shard files, or directories of shards
+
+    Raises:
+        FileNotFoundError: if a path does not exist
+        ValueError: if a path is neither a shard nor a directory
+
+    Returns:
+        list[list[str]]: the files of each shard, oldest backup first
+    """
+    backups: dict[str, list[tuple[int, str]]] = {}
+    for path in paths:
+        if os.path.isdir(path):
+            files = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        elif not os.path.exists(path):
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        else:
+            files = [path]
+        for file in files:
+            match = _SHARD_PATTERN.match(os.path.basename(file))
+            if match is None:
+                if file == path:
+                    raise ValueError(f"{path} is not a log shard")
+                continue
+            base = os.path.join(os.path.dirname(file), match["base"])
+            backup = int(match["backup"]) if match["backup"] is not None else 0
+            backups.setdefault(base, []).append((backup, file))
+
+    return [
+        [file for _, file in sorted(shard, reverse=True)]
+        for _, shard in sorted(backups.items())
+    ]
+
+
+def _read_shard(
+    files: list[str], shard_num: int, pipeline_id: str | None
+) -> Iterator[tuple[int, int, str]]:
+    """Yield (monotonic time, shard_num, line) of each record of the shard
+
+    Lines which are not records (eg., the last line of a worker that was killed
+        while writing it) are skipped
+    """
+    for file in files:
+        with open(file, "r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                    mono_ns = int(record["mono_ns"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if pipeline_id is not None and record.get("pipeline_id") != pipeline_id:
+                    continue
+                yield mono_ns, shard_num, line if line.endswith("\n") else line + "\n"
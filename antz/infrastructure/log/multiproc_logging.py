@@ -1,48 +1,344 @@
-"""Simple wrapper that makes a logger which writes to a queue
-and makes a listener on that queue to write out from
-    multiple processes. Requires an owner to manage it
-    but reduces multiprocesisng weirdness from logging
+"""Logging from multiple processes through a queue
+
+Each worker process logs through a BatchQueueHandler, which puts its records on a
+    queue shared by all workers. A BatchQueueListener in the submitter takes them
+    off the queue and writes them out with the handlers of the LoggingConfig
+
+The level of the configuration is set on the loggers themselves, so a record below
+    it is dropped by logger.debug(...) etc. before its message is formatted or its
+    arguments are converted to strings. Records which pass are formatted in the
+    worker (so their arguments need not be pickled) and sent in batches, so the
+    queue is not written to for every record. With type "off", no queue or
+    listener is made and the loggers are disabled
+
+With type "sharded" there is no queue either: each worker writes its records to a
+    size rotated file of its own, one JSON object per line with a monotonic
+    timestamp and the ids of the pipeline and job being run (see log_context), and
+    `antz logs merge` merges the files afterwards (see antz.infrastructure.log.merge)
 """
 
+import contextlib
+import contextvars
 import datetime
+import json
 import logging.handlers
 import multiprocessing as mp
-from typing import Final
+import os
+import sys
+import threading
+import time
+import warnings
+from typing import Any, Callable, Final, Iterator
 
 from antz.infrastructure.config.base import LoggingConfig
 
 ANTZ_LOG_ROOT_NAME: Final[str] = "antz"
+LOG_FORMAT: Final[str] = (
+    "%(asctime)s %(levelname)s [%(processName)s %(process)d] %(name)s: %(message)s"
+)
+SHARD_PREFIX: Final[str] = "antz_"
+SHARD_SUFFIX: Final[str] = ".jsonl"
+
+# ids of what the current thread is running, added to sharded records
+_log_context: contextvars.ContextVar[dict[str, str]] = contextvars.ContextVar(
+    "antz_log_context", default={}
+)
 
 
 def get_listener(
     logging_config: LoggingConfig,
-) -> tuple[mp.Queue, logging.handlers.QueueListener]:
+) -> tuple["mp.Queue | None", "BatchQueueListener | None"]:
     """Get listener, which will handle messages published to a queue
         and write them out to handlers based on configuration
 
+    The listener must be started before the workers log, and stopped after they
+        exit to write out the last records
+
     Args:
         logging_config (LoggingConfig): configuration of this logging module
 
     Returns:
-        tuple[mp.Queue, logging.handlers.QueueListener]:
+        tuple[mp.Queue | None, BatchQueueListener | None]:
             1. the queue for queue handlers
-            2. listener handle for stopping in the future
+            2. listener handle for starting and stopping
+            both None if logging is off or sharded
     """
+    if logging_config.type in ("off", "sharded"):
+        return None, None
 
     queue: mp.Queue = mp.Queue()
     handlers = _get_handlers(logging_config)
-    return queue, logging.handlers.QueueListener(queue, *handlers)
+    return queue, BatchQueueListener(queue, *handlers, respect_handler_level=True)
+
+
+def get_worker_logger(
+    name: str, queue: "mp.Queue | None", logging_config: LoggingConfig
+) -> logging.Logger:
+    """Return the logger of a worker which sends its records to queue
+
+    Only one handler is added to a logger, however often it is requested; a handler
+        of another queue or configuration is closed and replaced
+
+    Args:
+        name (str): name of the logger, under the antz root logger
+        queue (mp.Queue | None): queue of the listener; None if logging is off or
+            sharded
+        logging_config (LoggingConfig): configuration of this logging module
+
+    Returns:
+        logging.Logger: the logger
+    """
+    logger = logging.getLogger(f"{ANTZ_LOG_ROOT_NAME}.{name}")
+    logger.propagate = False
+    if logging_config.type == "sharded":
+        logger.setLevel(logging_config.level)
+        _add_shard_handler(logger, logging_config)
+        return logger
+    if logging_config.type == "off" or queue is None:
+        logger.setLevel(logging.CRITICAL + 1)
+        logger.disabled = True
+        return logger
+
+    logger.setLevel(logging_config.level)
+    logger.disabled = False
+    _replace_handlers(logger, ShardHandler, lambda _: False)
+    if not _replace_handlers(
+        logger,
+        BatchQueueHandler,
+        lambda handler: handler.queue is queue
+        and handler.batch_size == logging_config.batch_size
+        and handler.flush_interval == logging_config.flush_interval,
+    ):
+        logger.addHandler(
+            BatchQueueHandler(
+                queue, logging_config.batch_size, logging_config.flush_interval
+            )
+        )
+    return logger
+
+
+@contextlib.contextmanager
+def log_context(**ids: Any) -> Iterator[None]:
+    """Add ids (eg., pipeline_id and job_id) to the sharded records logged inside"""
+    token = _log_context.set(
+        {
+            **_log_context.get(),
+            **{key: str(val) for key, val in ids.items() if val is not None},
+        }
+    )
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def _replace_handlers(
+    logger: logging.Logger, handler_type: type, is_current: Callable[[Any], bool]
+) -> bool:
+    """Close and remove the handlers of handler_type which are not current
+
+    Returns:
+        bool: if logger has a current handler of handler_type
+    """
+    has_current = False
+    for handler in list(logger.handlers):
+        if not isinstance(handler, handler_type):
+            continue
+        if is_current(handler) and not has_current:
+            has_current = True
+        else:
+            logger.removeHandler(handler)
+            handler.close()
+    return has_current
+
+
+def flush_logger(logger: logging.Logger) -> None:
+    """Send the records buffered by the handlers of logger"""
+    for handler in logger.handlers:
+        handler.flush()
+
+
+class BatchQueueHandler(logging.handlers.QueueHandler):
+    """Puts lists of records on the queue instead of one record at a time
+
+    A batch is sent when it is full, when a record of level ERROR or above is
+        added, or when a record has waited flush_interval seconds
+    """
+
+    def __init__(self, queue: Any, batch_size: int, flush_interval: float) -> None:
+        """Create a handler with an empty batch
+
+        Args:
+            queue (Any): the queue to put batches on
+            batch_size (int): most records in a batch
+            flush_interval (float): most seconds a record waits to be sent
+        """
+        super().__init__(queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._batch: list[logging.LogRecord] = []
+        self._stop = threading.Event()
+        self._flusher: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def enqueue(self, record: Any) -> None:
+        """Add a prepared record to the batch, sending it if it is due"""
+        with self.lock:
+            self._start_flusher()
+            self._batch.append(record)
+            if len(self._batch) >= self.batch_size or record.levelno >= logging.ERROR:
+                self._send()
+
+    def flush(self) -> None:
+        """Send the batch now"""
+        with self.lock:
+            self._send()
+
+    def close(self) -> None:
+        """Send the batch and stop flushing"""
+        self._stop.set()
+        self.flush()
+        super().close()
+
+    def _send(self) -> None:
+        """Put the batch on the queue; the lock must be held"""
+        if self._batch:
+            batch, self._batch = self._batch, []
+            self.queue.put_nowait(batch)
+
+    def _start_flusher(self) -> None:
+        """Start the thread sending waiting records, once in each process
+
+        A handler may be created before its process forks or is spawned, so the
+            thread is started by the first record logged in each process
+        """
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._batch = []
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_periodically, name="antz-log-flusher", daemon=True
+        )
+        self._flusher.start()
+
+    def _flush_periodically(self) -> None:
+        stop = self._stop
+        while not stop.wait(self.flush_interval):
+            self.flush()
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """Handles the batches of records put on the queue by BatchQueueHandlers"""
+
+    def handle(self, record: Any) -> None:
+        """Handle every record of a batch"""
+        if isinstance(record, list):
+            for single_record in record:
+                super().handle(single_record)
+        else:
+            super().handle(record)
+
+    def stop(self) -> None:
+        """Handle every record still on the queue, then close the handlers"""
+        super().stop()
+        for handler in self.handlers:
+            handler.close()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats a record as one JSON object, with the fields of _add_shard_fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Return the record as a line of JSON"""
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            message = f"{message}\n{record.exc_text}"
+        fields = {
+            "mono_ns": getattr(record, "mono_ns", None),
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "message": message,
+        }
+        fields.update(getattr(record, "context", {}))
+        return json.dumps(fields)
+
+
+def _add_shard_fields(record: logging.LogRecord) -> bool:
+    """Add a monotonic timestamp and the log context to a record
+
+    The monotonic clock is shared by the processes of a machine, so the records
+        of all of its workers can be ordered by it, even if the time is changed
+    """
+    record.mono_ns = time.monotonic_ns()
+    record.context = _log_context.get()
+    return True
+
+
+class ShardHandler(logging.handlers.RotatingFileHandler):
+    """Writes the records of one process to its own size rotated file"""
+
+
+def _add_shard_handler(logger: logging.Logger, logging_config: LoggingConfig) -> None:
+    """Add a handler writing to the shard of this process, unless there is one
+
+    A handler of another directory or rotation, or a queue handler, is replaced
+    """
+    directory = (
+        logging_config.directory if logging_config.directory is not None else "."
+    )
+    path = os.path.abspath(
+        os.path.join(directory, f"{SHARD_PREFIX}{os.getpid()}{SHARD_SUFFIX}")
+    )
+    max_bytes = logging_config.max_file_size_mb * 2**20
+    _replace_handlers(logger, BatchQueueHandler, lambda _: False)
+    has_current = _replace_handlers(
+        logger,
+        ShardHandler,
+        lambda handler: handler.baseFilename == path
+        and handler.maxBytes == max_bytes
+        and handler.backupCount == logging_config.backup_count,
+    )
+    for handler in logger.handlers:
+        if isinstance(handler, ShardHandler):
+            handler.setLevel(logging_config.level)
+    if has_current:
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    handler = ShardHandler(
+        path,
+        maxBytes=max_bytes,
+        backupCount=logging_config.backup_count,
+        encoding="utf-8",
+        delay=True,
+    )
+    handler.setLevel(logging_config.level)
+    handler.addFilter(_add_shard_fields)
+    handler.setFormatter(JsonLinesFormatter())
+    logger.addHandler(handler)
 
 
 def _get_handlers(logging_config: LoggingConfig) -> list[logging.Handler]:
     """Return handlers for the given configuration"""
-
-    # FUTURE: improve handlers based on configuration
-    return [_get_file_handler(logging_config)]
+    handler: logging.Handler
+    if logging_config.type == "file":
+        handler = _get_file_handler(logging_config)
+    else:
+        if logging_config.type == "remote":
+            warnings.warn("Remote logging is not supported, logging to the console")
+        handler = logging.StreamHandler(sys.stderr)
+    handler.setLevel(logging_config.level)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return [handler]
 
 
 def _get_file_handler(
-    _logging_config: LoggingConfig,
+    logging_config: LoggingConfig,
 ) -> logging.handlers.RotatingFileHandler:
     """For handlers for local file storage, return the file handler
 
@@ -51,6 +347,14 @@ def _get_file_handler(
 
     Returns (RotatingFileHandler): file handler for local runner config
     """
-
-    file_name = f"LOG_{datetime.datetime.now()}.log"
-    return logging.handlers.RotatingFileHandler(file_name, delay=True)
+    directory = (
+        logging_config.directory if logging_config.directory is not None else "."
+    )
+    os.makedirs(directory, exist_ok=True)
+    file_name = f"LOG_{datetime.datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}.log"
+    return logging.handlers.RotatingFileHandler(
+        os.path.join(directory, file_name),
+        maxBytes=logging_config.max_file_size_mb * 2**20,
+        backupCount=logging_config.backup_count,
+        delay=True,
+    )
@@ -1,15 +1,36 @@
-"""Runs local configs"""
+"""Runs local configs
+
+The manager starts num_concurrent_jobs worker processes which all take pipelines
+    from one LocalTaskQueue, so the pipelines fanned out by a job (eg., the shard
+    tasks of antz.infrastructure.core.sharding) run in parallel. The queue counts
+    every pipeline from its submission until it has run, and the workers are
+    stopped once none are pending, including pipelines taken off the queue but
+    not yet started
+"""
 
-import logging.handlers
 import multiprocessing as mp
 import os
 import queue
 import threading
 import time
-
-from antz.infrastructure.config.base import Config, InitialConfig, LoggingConfig
+from typing import Any
+
+from antz.infrastructure.config.base import (
+    Config,
+    InitialConfig,
+    LoggingConfig,
+    ResourceConfig,
+)
+from antz.infrastructure.config.local_submitter import LocalSubmitterConfig
+from antz.infrastructure.core.dedup import SubmissionDeduplicator
 from antz.infrastructure.core.manager import run_manager
-from antz.infrastructure.log.multiproc_logging import ANTZ_LOG_ROOT_NAME, get_listener
+from antz.infrastructure.core.resources import close_resources, configure_resources
+from antz.infrastructure.core.staging import close_staging, configure_staging
+from antz.infrastructure.log.multiproc_logging import (
+    flush_logger,
+    get_listener,
+    get_worker_logger,
+)
 
 
 def run_local_submitter(config: InitialConfig) -> threading.Thread:
@@ -22,21 +43,24 @@ def run_local_submitter(config: InitialConfig) -> threading.Thread:
         Callable[[PipelineConfig], None]: callable that accepts a pipeline config
             and places it on the queue
     """
-    mp.set_start_method(
-        "spawn"
-    )  # we have significant threading, so complete isolation is required
+    # we have significant threading, so complete isolation is required;
+    #   forced, as the first queue or process made fixes the default method
+    if mp.get_start_method(allow_none=True) != "spawn":
+        mp.set_start_method("spawn", force=True)
 
-    unified_task_queue: mp.Queue = mp.Queue()
+    unified_task_queue = LocalTaskQueue()
 
     proc_ = LocalProcManager(
         task_queue=unified_task_queue,
         number_procs=config.submitter_config.num_concurrent_jobs,
+        submitter_config=config.submitter_config,
         logging_config=config.logging_config,
+        resources=config.resources,
     )
 
     def submit_pipeline(config: Config) -> None:
         """Closure for the unified task queue"""
-        return unified_task_queue.put(config.model_dump())
+        unified_task_queue.put(config.model_dump())
 
     submit_pipeline(config.analysis_config)
     proc_.start()
@@ -44,36 +68,88 @@ def run_local_submitter(config: InitialConfig) -> threading.Thread:
     return proc_
 
 
+class LocalTaskQueue:
+    """A queue of pipelines shared by processes, counting those not yet finished"""
+
+    def __init__(self) -> None:
+        """Create an empty queue"""
+        self._queue: mp.Queue = mp.Queue()
+        self._num_pending = mp.Value("q", 0)
+
+    def put(self, config: Any) -> None:
+        """Submit a pipeline, which is pending until task_done is called for it"""
+        with self._num_pending.get_lock():
+            self._num_pending.value += 1
+        self._queue.put(config)
+
+    def get(self, timeout: float) -> Any:
+        """Take the next pipeline; raises queue.Empty after timeout seconds"""
+        return self._queue.get(timeout=timeout)
+
+    def task_done(self) -> None:
+        """Mark a pipeline taken with get as finished
+
+        Pipelines submitted while running it must be put before this is called
+        """
+        with self._num_pending.get_lock():
+            self._num_pending.value -= 1
+
+    def num_pending(self) -> int:
+        """Return the number of pipelines submitted and not yet finished"""
+        with self._num_pending.get_lock():
+            return self._num_pending.value
+
+
 class LocalProcManager(threading.Thread):
     """Holds the various local runners and issues them a kill command when done"""
 
     def __init__(
-        self, task_queue: mp.Queue, number_procs: int, logging_config: LoggingConfig
+        self,
+        task_queue: LocalTaskQueue,
+        number_procs: int,
+        submitter_config: LocalSubmitterConfig,
+        logging_config: LoggingConfig,
+        resources: dict[str, ResourceConfig] | None = None,
     ) -> None:
         """Creates the local proc manager
 
         Args:
-            task_queue (mp.Queue[PipelineConfig]): universal queue for job submission
+            task_queue (LocalTaskQueue): universal queue for job submission
             number_procs (int): number of parallel processes to start up
+            submitter_config (LocalSubmitterConfig): configuration of the submitter
             logging_config (LoggingConfig): configuration of instance loggers
+            resources (dict[str, ResourceConfig] | None): resources of each worker
         """
         super().__init__()
         self.task_queue = task_queue
         self.number_procs = number_procs
+        self.submitter_config = submitter_config
+        self.resources = resources if resources is not None else {}
+        self.logging_config = logging_config
         self.logger_queue, self.logger_proc = get_listener(logging_config)
 
     def run(self) -> None:
         """Run and issue kill command when nothing else to do and the jobs are complete"""
 
-        children = [LocalProc(self.task_queue, logger_queue=self.logger_queue)]
+        if self.logger_proc is not None:
+            self.logger_proc.start()
+
+        children = [
+            LocalProc(
+                self.task_queue,
+                logger_queue=self.logger_queue,
+                submitter_config=self.submitter_config,
+                logging_config=self.logging_config,
+                resources=self.resources,
+            )
+            for _ in range(max(self.number_procs, 1))
+        ]
 
         for child in children:
             child.start()
 
         while True:
-            if self.task_queue.qsize() == 0 and all(
-                not child.get_is_executing() for child in children
-            ):
+            if self.task_queue.num_pending() <= 0:
                 for child in children:
                     child.set_dead(True)
                 break
@@ -81,17 +157,31 @@ class LocalProcManager(threading.Thread):
 
         for child in children:
             child.join()
+            flush_logger(child.logger)
+
+        # the children have sent all of their records, so write out the rest
+        if self.logger_proc is not None:
+            self.logger_proc.stop()
 
 
 class LocalProc(mp.Process):
     """Local proc is the node that actually runs the code"""
 
-    def __init__(self, task_queue: mp.Queue, logger_queue: mp.Queue) -> None:
+    def __init__(
+        self,
+        task_queue: LocalTaskQueue,
+        logger_queue: "mp.Queue | None",
+        submitter_config: LocalSubmitterConfig,
+        logging_config: LoggingConfig | None = None,
+        resources: dict[str, ResourceConfig] | None = None,
+    ) -> None:
         """Initialize the process with the universal job queue"""
 
         super().__init__()
 
         self._queue = task_queue
+        self._submitter_config = submitter_config
+        self._resources = resources if resources is not None else {}
         self._is_executing = mp.Value("b")
         with self._is_executing.get_lock():
             self._is_executing.value = 0
@@ -100,9 +190,12 @@ class LocalProc(mp.Process):
         with self._is_dead.get_lock():
             self._is_dead.value = 0
 
-        qh = logging.handlers.QueueHandler(logger_queue)
-        self.logger = logging.getLogger(f"{ANTZ_LOG_ROOT_NAME}.localProc_{os.getpid()}")
-        self.logger.addHandler(qh)
+        # loggers are not sent to the process, so it makes its own in run
+        self._logging = (
+            logger_queue,
+            logging_config if logging_config is not None else LoggingConfig(),
+        )
+        self.logger = get_worker_logger("localProcManager", *self._logging)
 
     def get_is_executing(self) -> bool:
         """Return if the current process is executing a pipeline"""
@@ -118,18 +211,37 @@ class LocalProc(mp.Process):
 
     def run(self):
         """Infinitely loop waiting for a new job on the queue until the set_dead(True)"""
+        self.logger = get_worker_logger(f"localProc_{os.getpid()}", *self._logging)
 
         def submit_fn(config: Config) -> None:
-            """Submit a pipeline to this submitter"""
-            self._queue.put(config)
+            """Submit a pipeline to this submitter
+
+            Dumped first, as the functions of jobs are only pickled by name
+            """
+            self._queue.put(config.model_dump())
+
+        deduplicator: SubmissionDeduplicator | None = None
+        if self._submitter_config.deduplicate_submissions:
+            deduplicator = SubmissionDeduplicator(
+                self._submitter_config.dedup_index_size
+            )
+            submit_fn = deduplicator.wrap(submit_fn)
+
+        # created lazily by the first job which requests each
+        configure_resources(self._resources)
+        configure_staging(
+            self._submitter_config.staging_directory,
+            int(self._submitter_config.staging_max_size_gb * 2**30),
+        )
 
         while not self._is_dead.value:
             try:
-                next_config = Config.model_validate(self._queue.get(timeout=1))
-                self.logger.info("Got next configuration %s", next_config.config.id)
+                task = self._queue.get(timeout=1)
                 with self._is_executing.get_lock():
                     self._is_executing.value = True
                 try:
+                    next_config = Config.model_validate(task)
+                    self.logger.info("Got next configuration %s", next_config.config.id)
                     run_manager(next_config, submit_fn=submit_fn, logger=self.logger)
                 except Exception as exc:  # pylint: disable=broad-exception-caught
                     self.logger.error(
@@ -138,8 +250,14 @@ class LocalProc(mp.Process):
 
                 with self._is_executing.get_lock():
                     self._is_executing.value = False
+                self._queue.task_done()  # after the pipelines it submitted
             except queue.Empty as _e:
                 pass  # just waiting for another job
             time.sleep(0.5)  # only check every 1/2 second to reduce resource usage
+        close_resources(self.logger)
+        close_staging(self.logger)
+        if deduplicator is not None:
+            deduplicator.report(self.logger)
+        flush_logger(self.logger)
         with self._is_executing.get_lock():
             self._is_executing = False
@@ -46,16 +46,25 @@ def get_job_type(job_full_name: str) -> str | None:
 
 
 __all__ = [
+    "archive",
     "assert_variable",
     "change_variable",
+    "checksum",
     "compare",
+    "compare_files",
+    "convert",
     "copy",
+    "create_pipelines_from_files",
     "create_pipelines_from_matrix",
     "delete",
+    "edit_csv",
+    "edit_document",
     "explode_pipeline",
+    "file_operations",
     "if_then",
     "nop",
     "parallel_pipelines",
+    "parameter_sweep",
     "restart_pipeline",
     "run_script",
     "set_variable_from_function",
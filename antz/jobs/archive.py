@@ -0,0 +1,418 @@
+"""Create or extract a tar or zip archive of a directory
+
+Tar archives are written as a stream: the directory is walked and its files read
+    one after another, while the compressed output is made on a pool of threads.
+    The stream is cut into blocks of block_size_mb which are compressed
+    independently (each a complete gzip member or zstd frame) and written in order,
+    so the archive is a normal .tar.gz or .tar.zst which any tool can read
+
+Tar archives are extracted as a stream too; the contents of the files are written
+    on a pool of threads while the archive is decompressed. Files larger than a
+    block are written as they are read instead of held in memory
+
+Zip archives compress each file on its own, so they are extracted in parallel, each
+    thread reading its share of the files. They are created by one thread
+
+In both directions at most max_workers * 2 blocks (or files of up to a block) are in
+    flight, so memory use is bounded whatever the size of the archive
+
+params = {
+    "archive" (str): path/to/archive.tar.gz, .tgz, .tar.zst, .tzst, .tar or .zip
+    "path" (str): path/to/directory to archive, or to extract into
+    "extract" (bool): extract the archive instead of creating it
+    ...see Parameters
+}
+
+zstd compression needs the zstandard package
+"""
+
+import gzip
+import logging
+import os
+import shutil
+import tarfile
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, Any, Callable, Final, Literal
+
+from pydantic import BaseModel, PositiveInt
+
+from antz.infrastructure.config.base import ParametersType
+from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.status import Status
+
+# (format, compression) by extension of the archive, longest extensions first
+_FORMATS_BY_EXTENSION: Final[list[tuple[str, tuple[str, str]]]] = [
+    (".tar.gz", ("tar", "gzip")),
+    (".tar.zst", ("tar", "zstd")),
+    (".tgz", ("tar", "gzip")),
+    (".tzst", ("tar", "zstd")),
+    (".tar", ("tar", "none")),
+    (".zip", ("zip", "gzip")),
+]
+
+
+class Parameters(BaseModel, frozen=True):
+    """Parameters of the archive job"""
+
+    archive: str
+    path: str
+    extract: bool = False
+    archive_format: Literal["tar", "zip"] | None = None
+    compression: Literal["gzip", "zstd", "none"] | None = None
+    compression_level: int | None = None
+    arcname: str | None = None
+    block_size_mb: PositiveInt = 4
+    max_workers: PositiveInt = 8
+
+
+@simple_job
+def archive(parameters: ParametersType, logger: logging.Logger) -> Status:
+    """Archive the directory at path, or extract the archive into path
+
+    Parameters {
+        archive (str): path/to/archive to create or extract
+        path (str): path/to/directory (or file) to archive, or directory to extract
+            into
+        extract (bool): if True, extract the archive instead of creating it
+        archive_format (str | None): tar or zip; inferred from the extension of
+            archive if None
+        compression (str | None): gzip, zstd or none; inferred from the extension if
+            None. Zip archives are compressed with deflate (that of gzip) unless none
+        compression_level (int | None): level of the compression; its default if None
+        arcname (str | None): name of path in the archive; its basename if None
+        block_size_mb (int): MB of a tar stream compressed at a time by one thread
+        max_workers (int): number of threads compressing or writing
+    }
+
+    Args:
+        parameters (ParametersType): see above
+        logger (logging.Logger): logger to assist with debugging
+
+    Returns:
+        Status: SUCCESS if the archive was created or extracted; ERROR otherwise
+    """
+    params = Parameters.model_validate(parameters)
+
+    inferred = next(
+        (
+            formats
+            for extension, formats in _FORMATS_BY_EXTENSION
+            if params.archive.lower().endswith(extension)
+        ),
+        None,
+    )
+    inferred_format, inferred_compression = inferred or (None, "none")
+    archive_format = params.archive_format or inferred_format
+    compression = params.compression or inferred_compression
+    if archive_format is None:
+        logger.error("Unable to infer the format of %s", params.archive)
+        return Status.ERROR
+    if archive_format == "zip" and compression == "zstd":
+        logger.error("Zip archives cannot be compressed with zstd")
+        return Status.ERROR
+
+    try:
+        if params.extract and archive_format == "tar":
+            extract_tar(params, compression)
+        elif params.extract:
+            extract_zip(params)
+        else:
+            _create(params, archive_format, compression)
+    except (OSError, RuntimeError, tarfile.TarError, zipfile.BadZipFile) as exc:
+        logger.error(
+            "Unable to %s", "extract" if params.extract else "archive", exc_info=exc
+        )
+        return Status.ERROR
+    return Status.SUCCESS
+
+
+def _create(params: Parameters, archive_format: str, compression: str) -> None:
+    """Create the archive next to its destination and rename it into place"""
+    arcname = params.arcname or os.path.basename(os.path.normpath(params.path))
+    tmp_path = f"{params.archive}.{os.getpid()}.tmp"
+    try:
+        if archive_format == "tar":
+            with (
+                open(tmp_path, "wb") as fh,
+                BlockCompressor(
+                    fh,
+                    compression,
+                    params.compression_level,
+                    params.block_size_mb * 2**20,
+                    params.max_workers,
+                ) as compressor,
+            ):
+                with tarfile.open(fileobj=compressor, mode="w|") as tar:
+                    tar.add(params.path, arcname=arcname)
+        else:
+            with zipfile.ZipFile(
+                tmp_path,
+                "w",
+                compression=(
+                    zipfile.ZIP_STORED
+                    if compression == "none"
+                    else zipfile.ZIP_DEFLATED
+                ),
+                compresslevel=params.compression_level,
+            ) as zip_file:
+                _add_to_zip(zip_file, params.path, arcname)
+        os.replace(tmp_path, params.archive)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _add_to_zip(zip_file: zipfile.ZipFile, path: str, arcname: str) -> None:
+    """Add the file, or the directory tree, at path to the zip under arcname"""
+    zip_file.write(path, arcname)
+    if not os.path.isdir(path):
+        return
+    for dir_path, dir_names, names in os.walk(path):
+        dir_names.sort()
+        for name in dir_names + sorted(names):
+            full_path = os.path.join(dir_path, name)
+            zip_file.write(
+                full_path, os.path.join(arcname, os.path.relpath(full_path, path))
+            )
+
+
+class BlockCompressor:
+    """A writable file which compresses blocks of what is written to it on threads
+
+    Each block is compressed on its own, as a gzip member or zstd frame, and the
+        blocks are written to the output in order. A stream of such blocks is a
+        valid gzip or zstd file
+    """
+
+    def __init__(
+        self,
+        out: IO[bytes],
+        compression: str,
+        level: int | None,
+        block_size: int,
+        max_workers: int,
+    ) -> None:
+        """Compress what is written into out
+
+        Args:
+            out (IO[bytes]): file to write the compressed blocks to
+            compression (str): gzip, zstd or none
+            level (int | None): compression level; the default if None
+            block_size (int): bytes in each block
+            max_workers (int): number of threads compressing blocks
+        """
+        self._out = out
+        self._compress = _get_block_compressor(compression, level)
+        self._block_size = block_size
+        self._max_in_flight = max_workers * 2
+        self._buffer = bytearray()
+        self._in_flight: deque[Future] = deque()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def write(self, data: bytes) -> int:
+        """Buffer data, compressing every full block"""
+        self._buffer += data
+        if len(self._buffer) >= self._block_size:
+            with memoryview(self._buffer) as view:
+                num_blocks = len(view) // self._block_size
+                for block in range(num_blocks):
+                    start = block * self._block_size
+                    self._submit(bytes(view[start : start + self._block_size]))
+            del self._buffer[: num_blocks * self._block_size]
+        return len(data)
+
+    def close(self) -> None:
+        """Compress what is left and write every block"""
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._in_flight:
+            self._out.write(self._in_flight.popleft().result())
+        self._executor.shutdown()
+
+    def __enter__(self) -> "BlockCompressor":
+        return self
+
+    def __exit__(self, exc_type: Any, *_) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(cancel_futures=True)
+
+    def _submit(self, block: bytes) -> None:
+        if self._compress is None:
+            self._out.write(block)
+            return
+        self._in_flight.append(self._executor.submit(self._compress, block))
+        if len(self._in_flight) >= self._max_in_flight:
+            self._out.write(self._in_flight.popleft().result())
+
+
+def _get_block_compressor(
+    compression: str, level: int | None
+) -> Callable[[bytes], bytes] | None:
+    """Return a function compressing a block on its own; None for no compression"""
+    if compression == "none":
+        return None
+    if compression == "gzip":
+        gzip_level = 6 if level is None else level
+
+        def compress_gzip(block: bytes) -> bytes:
+            # wbits 31 makes a gzip member, with header and trailer
+            compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            return compressor.compress(block) + compressor.flush()
+
+        return compress_gzip
+
+    zstandard = _import_zstandard()
+    zstd_level = 3 if level is None else level
+    # compressors are not thread safe, so each block gets its own
+    return lambda block: zstandard.ZstdCompressor(level=zstd_level).compress(block)
+
+
+def _import_zstandard() -> Any:
+    """Return the zstandard module, which is optional"""
+    try:
+        # pylint: disable-next=import-outside-toplevel,import-error
+        import zstandard
+    except ImportError as exc:
+        raise RuntimeError(
+            "zstd compression requires zstandard to be installed"
+        ) from exc
+    return zstandard
+
+
+def extract_tar(params: Parameters, compression: str) -> None:
+    """Extract the tar archive into params.path, writing files on threads
+
+    Args:
+        params (Parameters): the archive, destination and sizes
+        compression (str): gzip, zstd or none
+
+    Raises:
+        RuntimeError: if a member would be extracted outside of params.path
+    """
+    destination = os.path.realpath(params.path)
+    os.makedirs(destination, exist_ok=True)
+    block_size = params.block_size_mb * 2**20
+    dirs: list[tuple[str, tarfile.TarInfo]] = []
+    in_flight: deque[Future] = deque()
+
+    with (
+        open(params.archive, "rb") as fh,
+        ThreadPoolExecutor(max_workers=params.max_workers) as executor,
+    ):
+        if compression == "gzip":
+            stream: Any = gzip.GzipFile(fileobj=fh)
+        elif compression == "zstd":
+            stream = (
+                _import_zstandard()
+                .ZstdDecompressor()
+                .stream_reader(fh, read_across_frames=True)
+            )
+        else:
+            stream = fh
+
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            for member in tar:
+                target = _get_target(destination, member.name)
+                if member.isdir():
+                    os.makedirs(target, exist_ok=True)
+                    dirs.append((target, member))
+                elif member.isfile():
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    source = tar.extractfile(member)
+                    assert source is not None
+                    if member.size > block_size:
+                        _write_member(target, source, member)
+                        continue
+                    in_flight.append(
+                        executor.submit(_write_member, target, source.read(), member)
+                    )
+                    if len(in_flight) >= params.max_workers * 2:
+                        in_flight.popleft().result()
+                else:
+                    # links may point at files still being written
+                    while in_flight:
+                        in_flight.popleft().result()
+                    _extract_special(tar, member, destination)
+            while in_flight:
+                in_flight.popleft().result()
+
+    # after the files, as writing into a directory changes its mtime
+    for target, member in reversed(dirs):
+        os.chmod(target, (member.mode & 0o755) | 0o700)
+        os.utime(target, (member.mtime, member.mtime))
+
+
+def _get_target(destination: str, name: str) -> str:
+    """Return where the member name is extracted to; it must be inside destination"""
+    target = os.path.realpath(os.path.join(destination, name))
+    if os.path.commonpath([destination, target]) != destination:
+        raise RuntimeError(f"{name} would be extracted outside of {destination}")
+    return target
+
+
+def _write_member(
+    target: str, data: bytes | IO[bytes], member: tarfile.TarInfo
+) -> None:
+    """Write the contents of a file member and set its mode and mtime"""
+    with open(target, "wb") as fh:
+        if isinstance(data, bytes):
+            fh.write(data)
+        else:
+            shutil.copyfileobj(data, fh, 2**20)
+    # as the data filter of tarfile: no group/other write, no special bits
+    os.chmod(target, (member.mode & 0o755) | 0o600)
+    os.utime(target, (member.mtime, member.mtime))
+
+
+def _extract_special(
+    tar: tarfile.TarFile, member: tarfile.TarInfo, destination: str
+) -> None:
+    """Extract a link or other special member with the checks of tarfile"""
+    if hasattr(tarfile, "data_filter"):
+        tar.extract(member, destination, filter="data")
+    elif member.issym() or member.islnk():
+        _get_target(
+            destination, os.path.join(os.path.dirname(member.name), member.linkname)
+        )
+        tar.extract(member, destination)
+    else:
+        raise RuntimeError(f"Unable to safely extract {member.name}")
+
+
+def extract_zip(params: Parameters) -> None:
+    """Extract the zip archive into params.path, each thread extracting a share
+
+    Raises:
+        RuntimeError: if a member would be extracted outside of params.path
+    """
+    destination = os.path.realpath(params.path)
+    with zipfile.ZipFile(params.archive) as zip_file:
+        members = zip_file.infolist()
+
+    # directories are made first, as threads making the same one at once may fail
+    for member in members:
+        target = _get_target(destination, member.filename)
+        os.makedirs(
+            target if member.is_dir() else os.path.dirname(target), exist_ok=True
+        )
+
+    # largest first, dealt out in turn, so the shares are of similar size
+    members.sort(key=lambda member: member.file_size, reverse=True)
+    shares = [
+        members[worker :: params.max_workers] for worker in range(params.max_workers)
+    ]
+
+    def extract_share(share: list[zipfile.ZipInfo]) -> None:
+        with zipfile.ZipFile(params.archive) as zip_file:
+            for member in share:
+                zip_file.extract(member, destination)
+
+    with ThreadPoolExecutor(max_workers=params.max_workers) as executor:
+        for _ in executor.map(extract_share, shares):
+            pass
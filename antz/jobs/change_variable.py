@@ -23,6 +23,7 @@ from antz.infrastructure.config.base import (
     PipelineConfig,
     PrimitiveType,
 )
+from antz.infrastructure.core.scope import VariableScope
 from antz.infrastructure.core.status import Status
 
 
@@ -68,9 +69,8 @@ def change_variable(
         params_parsed.right_hand_side,
     )
 
-    new_vars = {
-        **variables,
-        params_parsed.left_hand_side: params_parsed.right_hand_side,
-    }
+    new_vars = VariableScope.from_mapping(variables).set(
+        params_parsed.left_hand_side, params_parsed.right_hand_side
+    )
 
     return Status.SUCCESS, new_vars
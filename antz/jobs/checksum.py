@@ -0,0 +1,286 @@
+"""Hash files into a manifest, or verify files against one
+
+Files are hashed on a pool of threads. Each file is memory mapped and hashed in
+    large chunks of the mapping, so no data is copied into python and hashlib
+    releases the GIL while hashing; hashing many files is then limited by the
+    disks rather than by python
+
+With verify, the files listed in the manifest are checked instead: a file whose
+    size differs fails without being read, and the first failure stops the check
+
+params = {
+    "paths" (str | list[str]): files, directories (hashed recursively) or globs
+    "manifest" (str): path/to/manifest.json to write, or to verify against
+    "verify" (bool): check the files of the manifest instead of writing it
+    ...see Parameters
+}
+
+The manifest is
+    {"version": 1, "algorithm": name, "files": {path: {"size": int, "digest": hex}}}
+"""
+
+import contextlib
+import errno
+import glob
+import hashlib
+import json
+import logging
+import mmap
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Iterator
+
+from pydantic import BaseModel, PositiveInt, field_validator
+
+from antz.infrastructure.config.base import ParametersType
+from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.status import Status
+
+
+class Parameters(BaseModel, frozen=True):
+    """Parameters of the checksum job"""
+
+    manifest: str
+    paths: str | list[str] = []
+    verify: bool = False
+    algorithm: str = "blake2b"
+    max_workers: PositiveInt = 8
+    chunk_size_mb: PositiveInt = 16
+
+    @field_validator("algorithm")
+    @classmethod
+    def check_algorithm(cls, algorithm: str) -> str:
+        """Only allow algorithms hashlib has"""
+        if algorithm not in hashlib.algorithms_available:
+            raise ValueError(f"Unknown hash algorithm {algorithm}")
+        return algorithm
+
+
+@simple_job
+def checksum(parameters: ParametersType, logger: logging.Logger) -> Status:
+    """Write the digests of files to a manifest, or verify the files of a manifest
+
+    Parameters {
+        manifest (str): path/to/manifest.json to write, or to verify against
+        paths (str | list[str]): files, directories or globs to hash; not used
+            with verify
+        verify (bool): if True, check that every file of the manifest still has its
+            size and digest
+        algorithm (str): hashlib algorithm, eg., blake2b, sha256 or md5; with
+            verify, the algorithm of the manifest is used
+        max_workers (int): number of files hashed at the same time
+        chunk_size_mb (int): MB of a file hashed at a time
+    }
+
+    Args:
+        parameters (ParametersType): see above
+        logger (logging.Logger): logger to assist with debugging
+
+    Returns:
+        Status: SUCCESS if the manifest was written or verified; ERROR otherwise
+    """
+    params = Parameters.model_validate(parameters)
+    if params.verify:
+        return _verify(params, logger)
+
+    try:
+        paths = expand_paths(params.paths)
+    except FileNotFoundError as exc:
+        logger.error("Nothing to hash at %s", exc.filename)
+        return Status.ERROR
+
+    tmp_path = f"{params.manifest}.{os.getpid()}.tmp"
+    try:
+        digests = hash_files(
+            paths, params.algorithm, params.max_workers, params.chunk_size_mb * 2**20
+        )
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(
+                {
+                    "version": 1,
+                    "algorithm": params.algorithm,
+                    "files": {
+                        path: {"size": size, "digest": digest}
+                        for path, (size, digest) in digests.items()
+                    },
+                },
+                fh,
+            )
+        os.replace(tmp_path, params.manifest)
+    except OSError as exc:
+        logger.error("Unable to write the checksums", exc_info=exc)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        return Status.ERROR
+
+    logger.debug("Hashed %d files", len(digests))
+    return Status.SUCCESS
+
+
+def _verify(params: Parameters, logger: logging.Logger) -> Status:
+    """Check the files of the manifest, stopping at the first which differs"""
+    try:
+        with open(params.manifest, "r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+        expected = {
+            path: (entry["size"], entry["digest"])
+            for path, entry in manifest["files"].items()
+        }
+        algorithm = manifest["algorithm"]
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        logger.error("Unable to read the manifest", exc_info=exc)
+        return Status.ERROR
+
+    for path, (size, _) in expected.items():
+        if not os.path.isfile(path) or os.path.getsize(path) != size:
+            logger.error("%s is missing or changed size", path)
+            return Status.ERROR
+
+    try:
+        hash_files(
+            list(expected),
+            algorithm,
+            params.max_workers,
+            params.chunk_size_mb * 2**20,
+            expected=expected,
+        )
+    except ChecksumMismatchError as exc:
+        logger.error("%s", exc)
+        return Status.ERROR
+    except OSError as exc:
+        logger.error("Unable to verify the checksums", exc_info=exc)
+        return Status.ERROR
+
+    logger.debug("Verified %d files", len(expected))
+    return Status.SUCCESS
+
+
+class ChecksumMismatchError(RuntimeError):
+    """A file does not have its expected digest"""
+
+
+def expand_paths(paths: str | list[str]) -> list[str]:
+    """Return the absolute paths of the files in paths, with directories walked
+
+    Args:
+        paths (str | list[str]): files, directories or globs
+
+    Raises:
+        FileNotFoundError: if a path does not exist or a glob matches nothing, so
+            no file asked for is silently left out
+
+    Returns:
+        list[str]: sorted paths of the files, without duplicates
+    """
+    files: set[str] = set()
+    for pattern in [paths] if isinstance(paths, str) else paths:
+        if glob.has_magic(pattern):
+            matches = glob.glob(pattern, recursive=True)
+        else:
+            matches = [pattern] if os.path.exists(pattern) else []
+        if not matches:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), pattern)
+        for path in matches:
+            if os.path.isdir(path):
+                for dir_path, _, names in os.walk(path):
+                    files.update(os.path.join(dir_path, name) for name in names)
+            else:
+                files.add(path)
+    return sorted(os.path.abspath(path) for path in files)
+
+
+def hash_files(
+    paths: list[str],
+    algorithm: str,
+    max_workers: int,
+    chunk_size: int,
+    expected: dict[str, tuple[int, str]] | None = None,
+) -> dict[str, tuple[int, str]]:
+    """Hash files on a pool of threads
+
+    At most max_workers * 2 files are queued at a time, so the first error or
+        mismatch stops the hashing soon after
+
+    Args:
+        paths (list[str]): files to hash
+        algorithm (str): hashlib algorithm
+        max_workers (int): number of threads
+        chunk_size (int): bytes hashed at a time
+        expected (dict[str, tuple[int, str]] | None): (size, digest) each file must
+            have, by path
+
+    Raises:
+        ChecksumMismatchError: if a file does not have its expected digest
+        OSError: if a file cannot be read
+
+    Returns:
+        dict[str, tuple[int, str]]: (size, hex digest) of each file by path
+    """
+    results: dict[str, tuple[int, str]] = {}
+    remaining: Iterator[str] = iter(paths)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running: dict[Future, str] = {}
+        try:
+            while True:
+                for path in remaining:
+                    future = executor.submit(hash_file, path, algorithm, chunk_size)
+                    running[future] = path
+                    if len(running) >= max_workers * 2:
+                        break
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = running.pop(future)
+                    results[path] = future.result()
+                    if expected is not None and results[path] != expected[path]:
+                        raise ChecksumMismatchError(f"{path} has changed")
+        finally:
+            for future in running:
+                future.cancel()
+    return results
+
+
+def hash_file(path: str, algorithm: str, chunk_size: int) -> tuple[int, str]:
+    """Return the size and hex digest of the file at path, hashed in chunks
+
+    Args:
+        path (str): file to hash
+        algorithm (str): hashlib algorithm
+        chunk_size (int): bytes hashed at a time
+
+    Returns:
+        tuple[int, str]: the size of the file and its hex digest
+    """
+    digest: Any = hashlib.new(algorithm)
+    size = 0
+    for chunk in iter_file_chunks(path, chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+    if algorithm.startswith("shake_"):
+        return size, digest.hexdigest(32)
+    return size, digest.hexdigest()
+
+
+def iter_file_chunks(path: str, chunk_size: int) -> Iterator[memoryview]:
+    """Yield the contents of the file at path in chunks without copying them
+
+    The file is memory mapped, reading ahead sequentially; files which cannot be
+        mapped (eg., empty files or pipes) are read instead. A chunk is only valid
+        until the next is yielded
+    """
+    with open(path, "rb") as fh:
+        try:
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # not mappable, eg., empty
+            while chunk := fh.read(chunk_size):
+                yield memoryview(chunk)
+            return
+
+        with mapped, memoryview(mapped) as view:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            for offset in range(0, len(view), chunk_size):
+                with view[offset : offset + chunk_size] as chunk:
+                    yield chunk
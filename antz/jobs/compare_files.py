@@ -0,0 +1,192 @@
+"""Check that two files, or two directory trees, have the same contents
+
+Directories are equal if they have the same relative file paths and each pair of
+    files is equal. Sizes are compared first, so files of different sizes are never
+    read. Pairs are compared on a pool of threads, each in large chunks read into
+    reused buffers, and the comparison stops at the first difference
+
+params = {
+    "left" (str): path/to/file or directory
+    "right" (str): path/to/file or directory
+    ...see Parameters
+}
+"""
+
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import BinaryIO, Iterator
+
+from pydantic import BaseModel, PositiveInt
+
+from antz.infrastructure.config.base import ParametersType
+from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.status import Status
+
+
+class Parameters(BaseModel, frozen=True):
+    """Parameters of the compare_files job"""
+
+    left: str
+    right: str
+    max_workers: PositiveInt = 8
+    chunk_size_mb: PositiveInt = 16
+
+
+@simple_job
+def compare_files(parameters: ParametersType, logger: logging.Logger) -> Status:
+    """Succeed only if left and right have the same contents
+
+    Parameters {
+        left (str): path/to/file or directory
+        right (str): path/to/file or directory
+        max_workers (int): number of pairs of files compared at the same time
+        chunk_size_mb (int): MB of each file compared at a time
+    }
+
+    Args:
+        parameters (ParametersType): see above
+        logger (logging.Logger): logger to assist with debugging
+
+    Returns:
+        Status: SUCCESS if the contents are equal; ERROR otherwise
+    """
+    params = Parameters.model_validate(parameters)
+
+    try:
+        difference = find_difference(
+            params.left,
+            params.right,
+            params.max_workers,
+            params.chunk_size_mb * 2**20,
+        )
+    except OSError as exc:
+        logger.error("Unable to compare the files", exc_info=exc)
+        return Status.ERROR
+
+    if difference is not None:
+        logger.error("%s and %s differ: %s", params.left, params.right, difference)
+        return Status.ERROR
+    return Status.SUCCESS
+
+
+def find_difference(
+    left: str, right: str, max_workers: int, chunk_size: int
+) -> str | None:
+    """Return the first difference found between left and right; None if equal
+
+    Args:
+        left (str): file or directory
+        right (str): file or directory
+        max_workers (int): number of threads
+        chunk_size (int): bytes of each file compared at a time
+
+    Raises:
+        OSError: if a file cannot be read
+
+    Returns:
+        str | None: description of a difference, or None
+    """
+    if os.path.isdir(left) != os.path.isdir(right):
+        return "only one is a directory"
+    if not os.path.isdir(left):
+        return None if files_equal(left, right, chunk_size) else "contents differ"
+
+    left_files = _list_files(left)
+    right_files = _list_files(right)
+    if left_files.keys() != right_files.keys():
+        name = sorted(left_files.keys() ^ right_files.keys())[0]
+        return f"{name} is only in one"
+    for name, size in left_files.items():
+        if right_files[name] != size:
+            return f"{name} differs in size"
+
+    return _compare_pairs(left, right, sorted(left_files), max_workers, chunk_size)
+
+
+def _compare_pairs(
+    left: str, right: str, names: list[str], max_workers: int, chunk_size: int
+) -> str | None:
+    """Compare left/name to right/name for each name on a pool of threads
+
+    At most max_workers * 2 pairs are queued at a time, so the first difference
+        stops the comparison soon after
+    """
+    remaining: Iterator[str] = iter(names)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running: dict[Future, str] = {}
+        try:
+            while True:
+                for name in remaining:
+                    future = executor.submit(
+                        files_equal,
+                        os.path.join(left, name),
+                        os.path.join(right, name),
+                        chunk_size,
+                    )
+                    running[future] = name
+                    if len(running) >= max_workers * 2:
+                        break
+                if not running:
+                    return None
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if not future.result():
+                        return f"{name} contents differ"
+        finally:
+            for future in running:
+                future.cancel()
+
+
+def files_equal(left: str, right: str, chunk_size: int) -> bool:
+    """Return True if the files have the same contents, reading them in chunks
+
+    Args:
+        left (str): path/to/file
+        right (str): path/to/file
+        chunk_size (int): bytes of each file compared at a time
+
+    Returns:
+        bool: True if equal
+    """
+    if os.path.getsize(left) != os.path.getsize(right):
+        return False
+    left_buffer = bytearray(chunk_size)
+    right_buffer = bytearray(chunk_size)
+    with (
+        open(left, "rb", buffering=0) as left_fh,
+        open(right, "rb", buffering=0) as right_fh,
+    ):
+        while True:
+            num_left = _read_into(left_fh, left_buffer)
+            num_right = _read_into(right_fh, right_buffer)
+            if num_left != num_right:
+                return False
+            if num_left < chunk_size:
+                # bytearray comparison is a memcmp; slice only the last chunk
+                return left_buffer[:num_left] == right_buffer[:num_right]
+            if left_buffer != right_buffer:
+                return False
+
+
+def _read_into(fh: BinaryIO, buffer: bytearray) -> int:
+    """Fill buffer from fh unless it ends first; return the number of bytes read"""
+    num_read = 0
+    with memoryview(buffer) as view:
+        while num_read < len(buffer):
+            num = fh.readinto(view[num_read:])
+            if not num:
+                break
+            num_read += num
+    return num_read
+
+
+def _list_files(root: str) -> dict[str, int]:
+    """Return the size of every file under root by its path relative to root"""
+    files = {}
+    for dir_path, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dir_path, name)
+            files[os.path.relpath(path, root)] = os.path.getsize(path)
+    return files
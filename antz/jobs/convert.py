@@ -0,0 +1,388 @@
+"""Convert a CSV, XLSX or HDF5 table to parquet
+
+The source is read in chunks and written as it is read, so memory use depends on the
+    chunk and row group sizes, not on the size of the file
+    - csv is parsed by the arrow streaming reader, block_size_mb at a time. Its
+        column types are inferred from the first block and fixed for the rest of
+        the file, so a column whose later values do not fit (eg., ids which become
+        strings) fails; set the column in column_types or a larger block_size_mb
+    - xlsx rows are streamed from the workbook in read only mode (needs openpyxl)
+    - hdf5 tables are read chunk_size rows at a time (needs pytables); fixed
+        format frames cannot be read in parts and are read whole
+
+The parquet file is written next to the destination and renamed into place once
+    complete, so a failed or running conversion never leaves a partial file
+
+Requires pyarrow
+
+params = {
+    "source" (str): path/to/table.csv, .tsv, .xlsx, .h5 or .hdf5
+    "destination" (str): path/to/table.parquet
+    ...see Parameters
+}
+"""
+
+import importlib.util
+import logging
+import os
+from typing import Any, Final, Iterator, Literal
+
+import pandas as pd
+from pydantic import BaseModel, PositiveInt
+
+from antz.infrastructure.config.base import ParametersType
+from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.status import Status
+
+_FORMATS_BY_EXTENSION: Final[dict[str, str]] = {
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".xlsx": "xlsx",
+    ".h5": "hdf5",
+    ".hdf5": "hdf5",
+    ".hdf": "hdf5",
+}
+
+
+class Parameters(BaseModel, frozen=True):
+    """Parameters of the convert job"""
+
+    source: str
+    destination: str
+    source_format: Literal["csv", "xlsx", "hdf5"] | None = None
+    columns: list[str] | None = None
+    column_types: dict[str, str] | None = None
+    row_group_size: PositiveInt = 100_000
+    compression: Literal["snappy", "gzip", "brotli", "zstd", "lz4", "none"] = "snappy"
+    compression_level: int | None = None
+    chunk_size: PositiveInt = 10_000
+    block_size_mb: PositiveInt = 16
+    delimiter: str | None = None
+    use_threads: bool = True
+    sheet_name: str | int = 0
+    hdf5_key: str | None = None
+
+
+@simple_job
+def convert(parameters: ParametersType, logger: logging.Logger) -> Status:
+    """Convert the table at source to a parquet file at destination
+
+    Parameters {
+        source (str): path/to/table to convert
+        destination (str): path/to/table.parquet to create or overwrite
+        source_format (str | None): csv, xlsx or hdf5; inferred from the extension
+            of source if None
+        columns (list[str] | None): only convert these columns; all if None
+        column_types (dict[str, str] | None): arrow type of columns by name, eg.,
+            {"id": "int64", "value": "float32", "name": "string"}
+        row_group_size (int): rows per parquet row group
+        compression (str): parquet compression codec, or none
+        compression_level (int | None): level of the codec; its default if None
+        chunk_size (int): rows read at a time from xlsx and hdf5
+        block_size_mb (int): MB of csv parsed at a time; must hold a whole row.
+            The types of the columns not in column_types are inferred from the
+            first block
+        delimiter (str | None): csv delimiter; tab for .tsv, else comma, if None
+        use_threads (bool): if True, parse csv with a thread per core
+        sheet_name (str | int): xlsx sheet, by name or index
+        hdf5_key (str | None): key of the hdf5 table; only needed if there are many
+    }
+
+    Args:
+        parameters (ParametersType): see above
+        logger (logging.Logger): logger to assist with debugging
+
+    Returns:
+        Status: SUCCESS if the parquet file was written; ERROR otherwise
+    """
+    params = Parameters.model_validate(parameters)
+
+    source_format = params.source_format or _FORMATS_BY_EXTENSION.get(
+        os.path.splitext(params.source)[1].lower()
+    )
+    if source_format is None:
+        logger.error("Unable to infer the format of %s", params.source)
+        return Status.ERROR
+
+    if importlib.util.find_spec("pyarrow") is None:
+        logger.error("Converting to parquet requires pyarrow to be installed")
+        return Status.ERROR
+
+    tmp_path = f"{params.destination}.{os.getpid()}.tmp"
+    try:
+        if os.path.dirname(params.destination):
+            os.makedirs(os.path.dirname(params.destination), exist_ok=True)
+        tables = {"csv": _read_csv, "xlsx": _read_xlsx, "hdf5": _read_hdf5}[
+            source_format
+        ](params)
+        num_rows = write_parquet(tables, tmp_path, params)
+        os.replace(tmp_path, params.destination)
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        # arrow, pandas and the readers each raise their own errors
+        logger.error("Unable to convert %s", params.source, exc_info=exc)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return Status.ERROR
+
+    logger.debug("Converted %d rows of %s", num_rows, params.source)
+    return Status.SUCCESS
+
+
+def write_parquet(tables: Iterator[Any], path: str, params: Parameters) -> int:
+    """Write a stream of arrow tables to one parquet file with fixed size row groups
+
+    Only one row group of rows is buffered at a time. Until the first row group is
+        written, the schema is widened to fit every table (eg., a column of only
+        nulls takes the type of later values, ints become floats, and columns of
+        mixed numbers and strings become strings); later tables are cast to it.
+        The arrow csv reader fixes its types itself, so this only widens xlsx and
+        hdf5 tables
+
+    Args:
+        tables (Iterator[pyarrow.Table]): the tables to write, in order
+        path (str): path/to/file.parquet to write
+        params (Parameters): parameters of the conversion
+
+    Raises:
+        RuntimeError: if a table cannot be cast to the schema already written
+
+    Returns:
+        int: the number of rows written
+    """
+    # pylint: disable-next=import-outside-toplevel,import-error
+    import pyarrow as pa
+    import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel,import-error
+
+    column_types = {
+        name: pa.type_for_alias(type_name)
+        for name, type_name in (params.column_types or {}).items()
+    }
+
+    schema = None
+    writer = None
+    pending: list = []
+    num_pending = 0
+    num_rows = 0
+    try:
+        for table in tables:
+            table = _cast_columns(table, column_types)
+            if schema is None:
+                schema = table.schema
+            elif writer is None:
+                schema = _unify_schemas(schema, table.schema)
+            else:
+                table = _cast_to_written(table, schema)
+            pending.append(table)
+            num_pending += table.num_rows
+
+            while num_pending >= params.row_group_size:
+                if writer is None:
+                    # the schema is final once a row group is written
+                    writer = _open_writer(pq, path, schema, params)
+                buffered = _concat_as(pa, pending, schema)  # zero copy if same schema
+                writer.write_table(buffered.slice(0, params.row_group_size))
+                pending = [buffered.slice(params.row_group_size)]
+                num_pending -= params.row_group_size
+                num_rows += params.row_group_size
+
+        if schema is None:
+            raise RuntimeError("Source has no table to convert")
+        if writer is None:
+            writer = _open_writer(pq, path, schema, params)
+        if num_pending:
+            writer.write_table(_concat_as(pa, pending, schema))
+            num_rows += num_pending
+    finally:
+        if writer is not None:
+            writer.close()
+    return num_rows
+
+
+def _open_writer(pq: Any, path: str, schema: Any, params: Parameters) -> Any:
+    """Open the parquet writer of path with the compression of params"""
+    return pq.ParquetWriter(
+        path,
+        schema,
+        compression=None if params.compression == "none" else params.compression,
+        compression_level=params.compression_level,
+    )
+
+
+def _concat_as(pa: Any, tables: list, schema: Any) -> Any:
+    """Concatenate the tables, casting those which do not have schema"""
+    return pa.concat_tables(
+        [table if table.schema == schema else table.cast(schema) for table in tables]
+    )
+
+
+def _cast_to_written(table: Any, schema: Any) -> Any:
+    """Cast table to the schema of the row groups already written"""
+    if table.schema == schema:
+        return table
+    try:
+        return table.cast(schema)
+    except Exception as exc:
+        raise RuntimeError(
+            f"The types of the columns changed after the first row group was "
+            f"written ({exc}); set column_types for these columns"
+        ) from exc
+
+
+def _unify_schemas(schema: Any, new_schema: Any) -> Any:
+    """Return the schema of schema's columns wide enough for both schemas
+
+    Types arrow can promote (eg., null to anything, int to float) are promoted;
+        other pairs with a string become strings
+
+    Raises:
+        RuntimeError: if the types of a column cannot be unified
+    """
+    # pylint: disable-next=import-outside-toplevel,import-error
+    import pyarrow as pa
+
+    if new_schema == schema:
+        return schema
+    fields = []
+    for field in schema:
+        index = new_schema.get_field_index(field.name)
+        if index == -1:
+            raise RuntimeError(f"Column {field.name} is missing from a chunk")
+        new_type = new_schema.field(index).type
+        try:
+            fields.append(
+                pa.unify_schemas(
+                    [pa.schema([field]), pa.schema([field.with_type(new_type)])],
+                    promote_options="permissive",
+                ).field(0)
+            )
+        except (pa.ArrowTypeError, pa.ArrowInvalid) as exc:
+            if not any(
+                pa.types.is_string(col_type) or pa.types.is_large_string(col_type)
+                for col_type in (field.type, new_type)
+            ):
+                raise RuntimeError(
+                    f"Column {field.name} is both {field.type} and {new_type}; set "
+                    f"its type in column_types"
+                ) from exc
+            fields.append(field.with_type(pa.large_string()))
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def _cast_columns(table: Any, column_types: dict[str, Any]) -> Any:
+    """Cast the columns of table named in column_types"""
+    for name, column_type in column_types.items():
+        index = table.schema.get_field_index(name)
+        if index != -1 and table.schema.field(index).type != column_type:
+            table = table.set_column(index, name, table.column(index).cast(column_type))
+    return table
+
+
+def _read_csv(params: Parameters) -> Iterator[Any]:
+    """Stream the csv as arrow tables, starting with an empty one of its schema
+
+    Raises:
+        RuntimeError: if a later block has a value which does not fit the type
+            inferred from the first block
+    """
+    # pylint: disable-next=import-outside-toplevel,import-error
+    import pyarrow as pa
+    from pyarrow import csv  # pylint: disable=import-outside-toplevel,import-error
+
+    delimiter = params.delimiter or ("\t" if params.source.endswith(".tsv") else ",")
+    column_types = {
+        name: pa.type_for_alias(type_name)
+        for name, type_name in (params.column_types or {}).items()
+    }
+    with csv.open_csv(
+        params.source,
+        read_options=csv.ReadOptions(
+            block_size=params.block_size_mb * 2**20, use_threads=params.use_threads
+        ),
+        parse_options=csv.ParseOptions(delimiter=delimiter),
+        convert_options=csv.ConvertOptions(
+            column_types=column_types, include_columns=params.columns
+        ),
+    ) as reader:
+        yield reader.schema.empty_table()
+        while True:
+            try:
+                batch = reader.read_next_batch()
+            except StopIteration:
+                return
+            except pa.ArrowInvalid as exc:
+                if "conversion error" not in str(exc):
+                    raise
+                raise RuntimeError(
+                    f"{exc}; csv column types are inferred from the first "
+                    f"block_size_mb of the file, set the type of this column in "
+                    f"column_types or a larger block_size_mb"
+                ) from exc
+            yield pa.Table.from_batches([batch])
+
+
+def _read_xlsx(params: Parameters) -> Iterator[Any]:
+    """Stream the rows of the sheet as arrow tables of chunk_size rows"""
+    try:
+        # pylint: disable-next=import-outside-toplevel,import-error
+        import openpyxl
+    except ImportError as exc:
+        raise RuntimeError("Converting xlsx requires openpyxl") from exc
+
+    workbook = openpyxl.load_workbook(params.source, read_only=True, data_only=True)
+    try:
+        sheet = (
+            workbook.worksheets[params.sheet_name]
+            if isinstance(params.sheet_name, int)
+            else workbook[params.sheet_name]
+        )
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(name) for name in next(rows, ())]
+
+        chunk: list[tuple] = []
+        num_chunks = 0
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= params.chunk_size:
+                yield _frame_to_table(pd.DataFrame(chunk, columns=header), params)
+                chunk = []
+                num_chunks += 1
+        if chunk or num_chunks == 0:
+            yield _frame_to_table(pd.DataFrame(chunk, columns=header), params)
+    finally:
+        workbook.close()
+
+
+def _read_hdf5(params: Parameters) -> Iterator[Any]:
+    """Stream the hdf5 frame as arrow tables of chunk_size rows"""
+    with pd.HDFStore(params.source, mode="r") as store:
+        keys = store.keys()
+        key = params.hdf5_key
+        if key is None:
+            if len(keys) != 1:
+                raise RuntimeError(f"Set hdf5_key to one of {keys}")
+            key = keys[0]
+
+        if store.get_storer(key).is_table:
+            frames = store.select(
+                key, columns=params.columns, chunksize=params.chunk_size
+            )
+        else:
+            frame = store.get(key)
+            frames = (
+                frame.iloc[start : start + params.chunk_size]
+                for start in range(0, max(len(frame), 1), params.chunk_size)
+            )
+        for frame in frames:
+            yield _frame_to_table(frame, params)
+
+
+def _frame_to_table(frame: pd.DataFrame, params: Parameters) -> Any:
+    """Convert a chunk to an arrow table, keeping the index only if it is named"""
+    # pylint: disable-next=import-outside-toplevel,import-error
+    import pyarrow as pa
+
+    if params.columns is not None:
+        frame = frame[params.columns]
+    return pa.Table.from_pandas(
+        frame, preserve_index=any(name is not None for name in frame.index.names)
+    )
@@ -1,22 +1,46 @@
-"""Copy job will copy a file or directory to another location"""
+"""Copy job will copy a file or directory to another location
 
+Directories are copied on a pool of threads and each file with the fastest method
+    the filesystems support, see antz.infrastructure.core.file_copy
+
+source may be a glob or a list of paths/globs; each match is copied into the
+    destination directory under its own name
+
+With sync, only files which changed are copied, so rerunning a copy is nearly free.
+    A file is unchanged if the destination has the same size and mtime (and, with
+    checksum, the same contents; the mtime is then ignored). Files in the
+    destination which are not in the source are kept
+
+A manifest file records the source each destination file was copied from. Files
+    whose source still has the recorded size and mtime (or hash) are then skipped
+    without looking at the destination at all, so the manifest must not be used
+    if the destination may be modified by anything else
+"""
+
+import errno
+import glob
 import logging
 import os
-import shutil
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PositiveInt
 
 from antz.infrastructure.config.base import ParametersType
 from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.file_copy import CopySync, copy_file_contents, copy_tree
 from antz.infrastructure.core.status import Status
 
 
 class Parameters(BaseModel, frozen=True):
     """The parameters required for the copy command"""
 
-    source: str
+    source: str | list[str]
     destination: str
     infer_name: bool = False
+    max_workers: PositiveInt = 8
+    reflink: bool = True
+    sync: bool = False
+    checksum: bool = False
+    manifest: str | None = None
 
 
 @simple_job
@@ -24,8 +48,14 @@ def copy(parameters: ParametersType, logger: logging.Logger) -> Status:
     """Copy file or directory from parameters.soruce to parameters.destination
 
     ParametersType {
-        source: path/to/copy/from
-        destination: path/to/copy/to
+        source: path/to/copy/from, a glob, or a list of paths or globs
+        destination: path/to/copy/to; a directory if source is a glob or a list
+        infer_name: if True and destination is a directory, copy into it
+        max_workers: number of threads copying files
+        reflink: if True, try to clone files before copying them
+        sync: if True, only copy files which changed; see module docstring
+        checksum: if True, sync compares the contents instead of the mtime
+        manifest: path/to/manifest.json of the last sync, created if missing
     }
 
     Args:
@@ -38,7 +68,86 @@ def copy(parameters: ParametersType, logger: logging.Logger) -> Status:
         return Status.ERROR
     copy_parameters = Parameters.model_validate(parameters)
 
+    syncer = None
+    if copy_parameters.sync:
+        syncer = CopySync(copy_parameters.checksum, copy_parameters.manifest)
+    try:
+        status = _copy_sources(copy_parameters, syncer, logger)
+    finally:
+        if syncer is not None:
+            syncer.save()
+            logger.debug(
+                "Synced %d files, %d unchanged", syncer.num_copied, syncer.num_skipped
+            )
+    return status
+
+
+def _copy_sources(
+    copy_parameters: Parameters, syncer: "CopySync | None", logger: logging.Logger
+) -> Status:
+    """Copy the source, or every path matched by it into the destination"""
+    if isinstance(copy_parameters.source, str) and not glob.has_magic(
+        copy_parameters.source
+    ):
+        return _copy_path(copy_parameters, syncer, logger)
+
+    try:
+        sources = _expand_sources(copy_parameters.source)
+    except FileNotFoundError as exc:
+        logger.error("Missing source %s", exc.filename)
+        return Status.ERROR
+    if not sources:
+        logger.error("No sources match %s", copy_parameters.source)
+        return Status.ERROR
+    if os.path.isfile(copy_parameters.destination):
+        return Status.ERROR
+
+    logger.debug("Copying %d sources", len(sources))
+    os.makedirs(copy_parameters.destination, exist_ok=True)
+    for source in sources:
+        status = _copy_path(
+            copy_parameters.model_copy(
+                update={
+                    "source": source,
+                    "destination": os.path.join(
+                        copy_parameters.destination, os.path.basename(source)
+                    ),
+                }
+            ),
+            syncer,
+            logger,
+        )
+        if status != Status.SUCCESS:
+            return status
+    return Status.SUCCESS
+
+
+def _expand_sources(source: str | list[str]) -> list[str]:
+    """Return the paths matching source, a path, glob or list of them
+
+    Only a glob may match nothing
+
+    Raises:
+        FileNotFoundError: if a path which is not a glob does not exist
+    """
+    patterns = [source] if isinstance(source, str) else source
+    sources: list[str] = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            sources.extend(sorted(glob.glob(pattern, recursive=True)))
+        elif os.path.exists(pattern):
+            sources.append(pattern)
+        else:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), pattern)
+    return sources
+
+
+def _copy_path(
+    copy_parameters: Parameters, syncer: "CopySync | None", logger: logging.Logger
+) -> Status:
+    """Copy a single file or directory"""
     source = copy_parameters.source
+    assert isinstance(source, str)
 
     if not os.path.exists(source):
         return Status.ERROR
@@ -46,23 +155,25 @@ def copy(parameters: ParametersType, logger: logging.Logger) -> Status:
 
     if source_is_file:
         logger.debug("Copying file")
-        return _copy_file(copy_parameters)
+        return _copy_file(copy_parameters, syncer)
 
     logger.debug("Copying directory")
-    return _copy_dir(copy_parameters)
+    return _copy_dir(copy_parameters, syncer)
 
 
-def _copy_file(copy_parameters: Parameters) -> Status:
+def _copy_file(copy_parameters: Parameters, syncer: "CopySync | None") -> Status:
     """Copy a file from source to destination
 
     Args:
         copy_parameters (Parameters): ParametersType of the copy job
+        syncer (CopySync | None): if set, only copy the file if it changed
 
     Returns:
         Status: resulitng status after running the job
     """
     src = copy_parameters.source
     dst = copy_parameters.destination
+    assert isinstance(src, str)
 
     if os.path.exists(dst) and os.path.isdir(dst):
         if copy_parameters.infer_name:
@@ -75,16 +186,20 @@ def _copy_file(copy_parameters: Parameters) -> Status:
     os.makedirs(dst_dir, exist_ok=True)
 
     try:
-        shutil.copyfile(src, dst)
+        if syncer is not None:
+            syncer.sync_file(src, dst, reflink=copy_parameters.reflink)
+        else:
+            copy_file_contents(src, dst, reflink=copy_parameters.reflink)
         return Status.SUCCESS
     except Exception as _exc:  # pylint: disable=broad-exception-caught
         return Status.ERROR
 
 
-def _copy_dir(copy_parameters: Parameters) -> Status:
+def _copy_dir(copy_parameters: Parameters, syncer: "CopySync | None") -> Status:
     """Copy a directory from a source to destination
     Args:
         copy_parameters (CopyParameters): ParametersType of the copy job
+        syncer (CopySync | None): if set, only copy the files which changed
 
     Returns:
         Status: resulitng status after running the job
@@ -92,12 +207,19 @@ def _copy_dir(copy_parameters: Parameters) -> Status:
 
     src = copy_parameters.source
     dst = copy_parameters.destination
+    assert isinstance(src, str)
 
-    if os.path.exists(dst) and os.path.isfile(dst):
+    if os.path.isfile(dst) or (syncer is None and os.path.exists(dst)):
         return Status.ERROR
 
     try:
-        shutil.copytree(src, dst)
+        copy_tree(
+            src,
+            dst,
+            max_workers=copy_parameters.max_workers,
+            reflink=copy_parameters.reflink,
+            syncer=syncer,
+        )
         return Status.SUCCESS
     except Exception as _exc:  # pylint: disable=broad-exception-caught
         return Status.ERROR
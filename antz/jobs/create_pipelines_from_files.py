@@ -0,0 +1,309 @@
+"""Create one pipeline per file found by scanning directories
+
+The directories are scanned with os.scandir, each level of the tree in parallel on a
+    pool of threads. Every file whose name matches pattern (a glob), or whose path
+    relative to the scanned directory matches regex, gets a pipeline with the
+    variables
+    {prefix}_path: absolute path of the file
+    {prefix}_name: name of the file
+    {prefix}_size: size of the file in bytes
+    {prefix}_mtime: modification time of the file in seconds since the epoch
+
+With an index file, the listing of every directory is saved with the directory's
+    mtime. A later scan reuses the saved listing of any directory whose mtime has
+    not changed, so only directories where files were added, removed or renamed are
+    listed again. The sizes and mtimes of the files in reused directories are
+    refreshed with a stat each unless trust_index, in which case files rewritten in
+    place (rather than replaced) are not noticed
+
+With only_changed, pipelines are only created for files which are new or whose size
+    or mtime changed since the index was saved
+"""
+
+import fnmatch
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Mapping
+
+from pydantic import BaseModel, PositiveInt
+
+from antz.infrastructure.config.base import (
+    Config,
+    ParametersType,
+    PipelineConfig,
+    PrimitiveType,
+    SubmitFunctionType,
+)
+from antz.infrastructure.config.job_decorators import submitter_job
+from antz.infrastructure.core.scope import VariableScope
+from antz.infrastructure.core.status import Status
+
+# a directory changed this recently may change again within the same mtime tick,
+#   so its listing is not trusted on the next scan
+_RACY_NS: int = 2 * 10**9
+
+# {"mtime_ns": int | None, "files": {name: [size, mtime_ns]}, "dirs": [name]}
+DirListing = dict[str, Any]
+
+
+class Parameters(BaseModel, frozen=True):
+    """Parameters of the create_pipelines_from_files job"""
+
+    directories: str | list[str]
+    pipeline_config_template: PipelineConfig
+    pattern: str = "*"
+    regex: str | None = None
+    recursive: bool = True
+    max_workers: PositiveInt = 8
+    index: str | None = None
+    only_changed: bool = False
+    trust_index: bool = False
+    prefix: str = "file"
+
+
+@submitter_job
+def create_pipelines_from_files(
+    parameters: ParametersType,
+    submit_fn: SubmitFunctionType,
+    variables: Mapping[str, PrimitiveType],
+    _pipeline_config: PipelineConfig,
+    logger: logging.Logger,
+) -> Status:
+    """Create a pipeline for every matching file in the directories
+
+    Parameters {
+        directories (str | list[str]): directories to scan
+        pipeline_config_template (PipelineConfig): pipeline to create for each file
+        pattern (str): glob the file names must match
+        regex (str | None): if set, regex searched for in the path of the file
+            relative to its scanned directory, instead of pattern
+        recursive (bool): if True, scan the subdirectories too
+        max_workers (int): number of threads listing directories
+        index (str | None): path/to/index.json of the last scan, created if missing
+        only_changed (bool): if True, only files new or changed since the last scan
+            of the index get a pipeline
+        trust_index (bool): if True, do not stat the files of unchanged directories
+        prefix (str): prefix of the names of the variables set for each file
+    }
+
+    Args:
+        parameters (ParametersType): see above
+        submit_fn (SubmitFunctionType): function to submit the pipeline to for execution
+        variables (Mapping[str, PrimitiveType]): variables from the outer context
+        _pipeline_config (PipelineConfig): the pipeline running this job
+        logger (logging.Logger): logger to assist with debugging
+
+    Returns:
+        Status: FINAL if the pipelines were submitted; ERROR otherwise
+    """
+    params = Parameters.model_validate(parameters)
+    if params.only_changed and params.index is None:
+        logger.error("only_changed requires an index")
+        return Status.ERROR
+
+    old_index = _load_index(params.index, logger)
+    scanner = DirectoryScanner(
+        old_index, params.recursive, params.max_workers, params.trust_index
+    )
+    try:
+        files = find_files(params, scanner)
+    except OSError as exc:
+        logger.error("Unable to scan the directories", exc_info=exc)
+        return Status.ERROR
+    logger.debug(
+        "Found %d files; listed %d directories and reused %d",
+        len(files),
+        scanner.num_listed,
+        scanner.num_reused,
+    )
+
+    template = params.pipeline_config_template
+    outer_scope = VariableScope.from_mapping(variables)
+    for file_num, (path, size, mtime_ns) in enumerate(files):
+        if params.only_changed and _get_old_stat(old_index, path) == [size, mtime_ns]:
+            continue
+        submit_fn(
+            Config(
+                config=template.model_copy(update={"name": f"file_{file_num}"}),
+                variables=outer_scope.update(
+                    {
+                        f"{params.prefix}_path": path,
+                        f"{params.prefix}_name": os.path.basename(path),
+                        f"{params.prefix}_size": size,
+                        f"{params.prefix}_mtime": mtime_ns / 1e9,
+                    }
+                ),
+            )
+        )
+
+    if params.index is not None:
+        try:
+            scanner.save(params.index)
+        except OSError as exc:
+            logger.error("Unable to save the index", exc_info=exc)
+            return Status.ERROR
+    return Status.FINAL
+
+
+def find_files(
+    params: Parameters, scanner: "DirectoryScanner"
+) -> list[tuple[str, int, int]]:
+    """Scan the directories and return the matching files
+
+    Args:
+        params (Parameters): the directories and patterns
+        scanner (DirectoryScanner): scanner to list the directories with
+
+    Returns:
+        list[tuple[str, int, int]]: sorted (absolute path, size, mtime_ns) of the files
+    """
+    roots = (
+        [params.directories]
+        if isinstance(params.directories, str)
+        else params.directories
+    )
+    regex = re.compile(params.regex) if params.regex is not None else None
+
+    files = []
+    for root in roots:
+        root = os.path.abspath(root)
+        for dir_path, listing in scanner.scan(root).items():
+            for name, (size, mtime_ns) in listing["files"].items():
+                path = os.path.join(dir_path, name)
+                if regex is not None:
+                    if not regex.search(os.path.relpath(path, root)):
+                        continue
+                elif not fnmatch.fnmatchcase(name, params.pattern):
+                    continue
+                files.append((path, size, mtime_ns))
+    files.sort()
+    return files
+
+
+def _load_index(path: str | None, logger: logging.Logger) -> dict[str, DirListing]:
+    """Return the listings of the index at path; empty if there is none"""
+    if path is None or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)["directories"]
+    except (OSError, ValueError, KeyError) as exc:
+        logger.warning("Ignoring unreadable index %s", path, exc_info=exc)
+        return {}
+
+
+def _get_old_stat(old_index: dict[str, DirListing], path: str) -> list[int] | None:
+    """Return the [size, mtime_ns] of path in the old index, if it is there"""
+    listing = old_index.get(os.path.dirname(path))
+    return None if listing is None else listing["files"].get(os.path.basename(path))
+
+
+class DirectoryScanner:
+    """Lists directory trees in parallel, reusing the listings of an old index"""
+
+    def __init__(
+        self,
+        old_index: dict[str, DirListing],
+        recursive: bool,
+        max_workers: int,
+        trust_index: bool,
+    ) -> None:
+        """Create a scanner
+
+        Args:
+            old_index (dict[str, DirListing]): listings of a previous scan by path
+            recursive (bool): if True, list subdirectories too
+            max_workers (int): number of threads listing directories
+            trust_index (bool): if True, reuse the file stats of unchanged directories
+        """
+        self.num_listed: int = 0
+        self.num_reused: int = 0
+        self._old_index = old_index
+        self._recursive = recursive
+        self._max_workers = max_workers
+        self._trust_index = trust_index
+        self._index: dict[str, DirListing] = {}
+
+    def scan(self, root: str) -> dict[str, DirListing]:
+        """Return the listing of root and (if recursive) every directory under it
+
+        Each level of the tree is listed in parallel
+        """
+        listings: dict[str, DirListing] = {}
+        scan_start_ns = time.time_ns()
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            level = [root]
+            while level:
+                next_level = []
+                for dir_path, (listing, reused) in zip(
+                    level,
+                    executor.map(lambda path: self._list(path, scan_start_ns), level),
+                ):
+                    listings[dir_path] = listing
+                    if reused:
+                        self.num_reused += 1
+                    else:
+                        self.num_listed += 1
+                    if self._recursive:
+                        next_level.extend(
+                            os.path.join(dir_path, name) for name in listing["dirs"]
+                        )
+                level = next_level
+        self._index.update(listings)
+        return listings
+
+    def save(self, path: str) -> None:
+        """Write the listings of every scan so far atomically to the index at path"""
+        index_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(index_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"version": 1, "directories": self._index}, fh)
+        os.replace(tmp_path, path)
+
+    def _list(self, dir_path: str, scan_start_ns: int) -> tuple[DirListing, bool]:
+        """Return the listing of one directory and if the old one was reused"""
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+        # a listing saved during the directory's last mtime tick may be incomplete
+        trusted_mtime_ns = mtime_ns if mtime_ns < scan_start_ns - _RACY_NS else None
+
+        old = self._old_index.get(dir_path)
+        if old is not None and old["mtime_ns"] is not None:
+            if old["mtime_ns"] == mtime_ns:
+                if self._trust_index:
+                    return old, True
+                return {
+                    "mtime_ns": mtime_ns,
+                    "files": self._stat_files(dir_path, old["files"]),
+                    "dirs": old["dirs"],
+                }, True
+
+        files: dict[str, list[int]] = {}
+        dirs: list[str] = []
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.name)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = [stat.st_size, stat.st_mtime_ns]
+                except FileNotFoundError:
+                    continue  # removed while listing
+        return {"mtime_ns": trusted_mtime_ns, "files": files, "dirs": dirs}, False
+
+    @staticmethod
+    def _stat_files(dir_path: str, names: dict[str, Any]) -> dict[str, list[int]]:
+        """Return the current [size, mtime_ns] of the named files of dir_path"""
+        files = {}
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(dir_path, name))
+            except FileNotFoundError:
+                continue
+            files[name] = [stat.st_size, stat.st_mtime_ns]
+        return files
@@ -13,30 +13,54 @@ This will create three pipelines and set the **variables** for each
     such that for the first pipeline "file_dst" variable is "path1"
 
 **This will overwrite variables**
+
+The matrix is streamed in chunks of chunk_size rows (csv chunks, parquet record
+    batches) so that memory stays constant no matter how many rows there are.
+    If only some columns are needed as variables, list them in columns and
+    only those will be read
+
+With pre_resolve_parameters, the parameters of every stage of the template are
+    resolved for all rows at once (see resolve_variables_batch) so that the
+    created pipelines are handed ready-made parameters. This is only done if the
+    template has no mutable jobs, as those may change the variables between stages
+
+For very large matrices, set num_shards to split the rows into shard tasks which are
+    run by other workers (see antz.infrastructure.core.sharding). Each shard only parses
+    its own range of rows: parquet shards read only the row groups of their range,
+    but csv shards must still scan the lines before it (without parsing them), so
+    a csv matrix costs each shard a scan up to its range. With recursive_shards,
+    large shards shard again
 """
 
 import logging
 import os
-from typing import Any, Callable, Generator, Mapping
+from typing import Any, Callable, Generator, Iterator, Mapping
 
 import pandas as pd
-from pydantic import BaseModel
+from pydantic import PositiveInt
 
 from antz.infrastructure.config.base import (
     Config,
+    MutableJobConfig,
     ParametersType,
     PipelineConfig,
     PrimitiveType,
 )
 from antz.infrastructure.config.job_decorators import submitter_job
+from antz.infrastructure.core.scope import VariableScope
+from antz.infrastructure.core.sharding import ShardParameters, shard_or_get_range
 from antz.infrastructure.core.status import Status
+from antz.infrastructure.core.variables import resolve_variables_batch
 
 
-class Parameters(BaseModel, frozen=True):
+class Parameters(ShardParameters, frozen=True):
     """The parameters required for the copy command"""
 
     matrix_path: str | os.PathLike[str]
     pipeline_config_template: PipelineConfig
+    pre_resolve_parameters: bool = False
+    chunk_size: PositiveInt = 10_000
+    columns: list[str] | None = None
 
 
 @submitter_job
@@ -44,7 +68,7 @@ def create_pipelines_from_matrix(
     parameters: ParametersType,
     submit_fn: Callable[[Config], None],
     variables: Mapping[str, PrimitiveType],
-    _pipeline_config: PipelineConfig,
+    pipeline_config: PipelineConfig,
     logger: logging.Logger,
 ) -> Status:
     """Copy file or directory from parameters.soruce to parameters.destination
@@ -64,6 +88,27 @@ def create_pipelines_from_matrix(
         return Status.ERROR
     pipeline_params = Parameters.model_validate(parameters)
 
+    if pipeline_params.pre_resolve_parameters and _has_mutable_stage(
+        pipeline_params.pipeline_config_template
+    ):
+        logger.warning(
+            "Template has mutable jobs, so its parameters will not be pre-resolved"
+        )
+
+    row_range = shard_or_get_range(
+        parameters,
+        lambda: count_matrix_rows(pipeline_params.matrix_path),
+        submit_fn,
+        variables,
+        pipeline_config,
+    )
+    if row_range is None:
+        logger.debug("Sharded the matrix %s", pipeline_params.matrix_path)
+        return Status.FINAL
+    pipeline_params = pipeline_params.model_copy(
+        update={"row_start": row_range[0], "row_stop": row_range[1]}
+    )
+
     for new_config in generate_configs(pipeline_params, variables=variables):
         logger.debug("Submitting new pipeline: %s", new_config.config.id)
         submit_fn(new_config)
@@ -88,27 +133,193 @@ def generate_configs(
         RuntimeError: if the file type is not .parquet, .csv, or .xlsx
     """
 
-    case_matrix: pd.DataFrame
-    if os.path.splitext(params.matrix_path)[1] == ".csv":
-        case_matrix = pd.read_csv(params.matrix_path)
-    elif os.path.splitext(params.matrix_path)[1] == ".xlsx":
-        case_matrix = pd.read_excel(params.matrix_path)
-    elif os.path.splitext(params.matrix_path)[1] in (".parquet", ".parq"):
-        case_matrix = pd.read_parquet(params.matrix_path)
+    template = params.pipeline_config_template
+    outer_scope = VariableScope.from_mapping(variables)
+    pre_resolve = params.pre_resolve_parameters and not _has_mutable_stage(template)
+
+    row_num: int = params.row_start
+    for chunk in iter_matrix_chunks(
+        params.matrix_path,
+        chunk_size=params.chunk_size,
+        columns=params.columns,
+        row_start=params.row_start,
+        row_stop=params.row_stop,
+    ):
+        # columns are converted to lists of python values once per chunk,
+        #   rather than boxing every row into a Series
+        names = [str(name) for name in chunk.columns]
+        rows = zip(*(chunk[name].tolist() for name in chunk.columns))
+
+        stage_parameters: list[list[ParametersType]] | None = None
+        if pre_resolve:
+            stage_parameters = [
+                resolve_variables_batch(stage.parameters, chunk, outer_scope)
+                for stage in template.stages
+            ]
+
+        for chunk_row, row in enumerate(rows):
+            update: dict[str, object] = {"name": f"pipeline_{row_num}"}
+            if stage_parameters is not None:
+                update["stages"] = [
+                    stage.model_copy(update={"parameters": resolved[chunk_row]})
+                    for stage, resolved in zip(template.stages, stage_parameters)
+                ]
+            yield Config(
+                # the template is immutable, so a shallow copy is enough
+                config=template.model_copy(update=update),
+                # every row shares the outer scope
+                variables=outer_scope.update(dict(zip(names, row))),
+            )
+            row_num += 1
+
+
+def iter_matrix_chunks(
+    matrix_path: str | os.PathLike[str],
+    chunk_size: int,
+    columns: list[str] | None = None,
+    row_start: int = 0,
+    row_stop: int | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Read the case matrix in chunks of at most chunk_size rows
+
+    Args:
+        matrix_path (str | os.PathLike[str]): path to a .csv, .xlsx or .parquet matrix
+        chunk_size (int): maximum number of rows per chunk
+        columns (list[str] | None): only read these columns; all if None
+        row_start (int): first row to read
+        row_stop (int | None): one past the last row to read; the end if None
+
+    Yields:
+        Iterator[pd.DataFrame]: the chunks of the matrix, in order
+
+    Throws:
+        RuntimeError: if the file type is not .parquet, .csv, or .xlsx
+    """
+    if row_stop is not None and row_stop <= row_start:
+        return
+
+    extension = os.path.splitext(matrix_path)[1]
+    if extension == ".csv":
+        yield from _iter_csv_chunks(
+            matrix_path, chunk_size, columns, row_start, row_stop
+        )
+    elif extension in (".parquet", ".parq"):
+        yield from _iter_parquet_chunks(
+            matrix_path, chunk_size, columns, row_start, row_stop
+        )
+    elif extension == ".xlsx":
+        # excel files cannot be streamed by pandas, but they are small by nature
+        case_matrix = pd.read_excel(matrix_path, usecols=columns)
+        case_matrix = case_matrix.iloc[row_start:row_stop]
+        for start in range(0, len(case_matrix), chunk_size):
+            yield case_matrix.iloc[start : start + chunk_size]
     else:
         raise RuntimeError("Unknown file type for the case matrix provided")
 
-    pipeline_base: dict[str, Any] = params.pipeline_config_template.model_dump()
-
-    for idx, row in case_matrix.iterrows():
-        pipeline_base["name"] = f"pipeline_{idx}"
-        print(pipeline_base)
-        yield Config.model_validate(
-            {
-                "config": pipeline_base,
-                "variables": {
-                    **variables,  # keep outer scope
-                    **dict(zip(row.index, row)),
-                },
-            }
+
+def _iter_csv_chunks(
+    matrix_path: str | os.PathLike[str],
+    chunk_size: int,
+    columns: list[str] | None,
+    row_start: int,
+    row_stop: int | None,
+) -> Iterator[pd.DataFrame]:
+    """Read the rows [row_start, row_stop) of a csv file in chunks
+
+    A csv file has no index of its rows, so the rows before row_start are still
+        scanned, but only for their ends (quoted newlines are respected): they are
+        skipped as a count of lines by the C parser, without being split into
+        fields or converted
+    """
+    names = None
+    if row_start > 0:
+        # the header is read on its own, then skipped along with the first rows
+        names = list(pd.read_csv(matrix_path, nrows=0).columns)
+    with pd.read_csv(
+        matrix_path,
+        chunksize=chunk_size,
+        usecols=columns,
+        header=0 if names is None else None,
+        names=names,
+        skiprows=None if names is None else row_start + 1,
+        nrows=None if row_stop is None else row_stop - row_start,
+        engine="c",
+    ) as reader:
+        yield from reader
+
+
+def count_matrix_rows(matrix_path: str | os.PathLike[str]) -> int:
+    """Return the number of rows of the case matrix, reading as little as possible"""
+    extension = os.path.splitext(matrix_path)[1]
+    if extension in (".parquet", ".parq"):
+        # pyarrow is already required by pandas to read parquet
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel,import-error
+
+        return pq.ParquetFile(matrix_path).metadata.num_rows
+    return sum(
+        len(chunk)
+        for chunk in iter_matrix_chunks(matrix_path, chunk_size=100_000, columns=[0])
+    )
+
+
+def _iter_parquet_chunks(
+    matrix_path: str | os.PathLike[str],
+    chunk_size: int,
+    columns: list[str] | None,
+    row_start: int,
+    row_stop: int | None,
+) -> Iterator[pd.DataFrame]:
+    """Read the rows [row_start, row_stop) of a parquet file by record batches
+
+    Only the row groups overlapping the range are read
+    """
+    # pyarrow is already required by pandas to read parquet
+    import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel,import-error
+
+    parquet_file = pq.ParquetFile(matrix_path)
+    if row_stop is None:
+        row_stop = parquet_file.metadata.num_rows
+
+    row_groups, curr_row = _overlapping_row_groups(
+        parquet_file.metadata, row_start, row_stop
+    )
+    if not row_groups:
+        return
+
+    for batch in parquet_file.iter_batches(
+        batch_size=chunk_size, row_groups=row_groups, columns=columns
+    ):
+        batch_start, batch_stop = curr_row, curr_row + batch.num_rows
+        curr_row = batch_stop
+        if batch_stop <= row_start:
+            continue
+        if batch_start >= row_stop:
+            break
+        batch = batch.slice(
+            max(row_start - batch_start, 0), min(row_stop, batch_stop) - batch_start
         )
+        yield batch.to_pandas()
+
+
+def _overlapping_row_groups(
+    metadata: Any, row_start: int, row_stop: int
+) -> tuple[list[int], int]:
+    """Return the row groups overlapping [row_start, row_stop) and the first row
+    of the first of those row groups
+    """
+    row_groups: list[int] = []
+    first_row = 0
+    group_start = 0
+    for group in range(metadata.num_row_groups):
+        group_stop = group_start + metadata.row_group(group).num_rows
+        if group_start < row_stop and group_stop > row_start:
+            if not row_groups:
+                first_row = group_start
+            row_groups.append(group)
+        group_start = group_stop
+    return row_groups, first_row
+
+
+def _has_mutable_stage(pipeline_config: PipelineConfig) -> bool:
+    """Return True if any stage of the pipeline may change the variables"""
+    return any(isinstance(stage, MutableJobConfig) for stage in pipeline_config.stages)
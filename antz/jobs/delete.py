@@ -2,18 +2,30 @@
 
 params = {
     "path" (str): the path to delete
+    "max_workers" (int): threads deleting a directory; 1 uses shutil.rmtree
+    "background" (bool): rename the directory and delete it in a detached process
 }
+
+With max_workers > 1, directories are scanned and their entries unlinked by a pool
+    of threads, which is much faster for large trees on parallel filesystems
+
+With background, the directory is first renamed next to itself so the pipeline can
+    continue at once, even reusing the same path, while a detached process deletes
+    the renamed tree. The job succeeds once the directory is renamed; a failure of
+    the process is logged by the worker and written to <renamed path>.failed
+    (see antz.infrastructure.core.deletion)
 """
 
 import logging
 import os
 import shutil
 
-from pydantic import BaseModel, BeforeValidator
+from pydantic import BaseModel, BeforeValidator, PositiveInt
 from typing_extensions import Annotated
 
 from antz.infrastructure.config.base import ParametersType
 from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.deletion import delete_in_background, parallel_rmtree
 from antz.infrastructure.core.status import Status
 
 
@@ -21,6 +33,8 @@ class Parameters(BaseModel, frozen=True):
     """The parameters required for the copy command"""
 
     path: Annotated[str, BeforeValidator(lambda x: x if os.path.exists(x) else None)]
+    max_workers: PositiveInt = 1
+    background: bool = False
 
 
 @simple_job
@@ -31,6 +45,8 @@ def delete(parameters: ParametersType, logger: logging.Logger) -> Status:
         parameters (ParametersType): params of form
             {
                 path (str): path/to/delete
+                max_workers (int): threads deleting a directory
+                background (bool): if True, delete a directory in the background
             }
 
     Returns:
@@ -38,13 +54,18 @@ def delete(parameters: ParametersType, logger: logging.Logger) -> Status:
     """
 
     del_params = Parameters.model_validate(parameters)
-    if os.path.isdir(del_params.path):
+    if os.path.isdir(del_params.path) and not os.path.islink(del_params.path):
         try:
-            shutil.rmtree(del_params.path)
+            if del_params.background:
+                delete_in_background(del_params.path, del_params.max_workers, logger)
+            elif del_params.max_workers > 1:
+                parallel_rmtree(del_params.path, del_params.max_workers)
+            else:
+                shutil.rmtree(del_params.path)
         except (PermissionError, FileNotFoundError, IOError) as exc:
             logger.error("Unable to delete dir", exc_info=exc)
             return Status.ERROR
-    elif os.path.isfile(del_params.path):
+    elif os.path.isfile(del_params.path) or os.path.islink(del_params.path):
         try:
             os.remove(del_params.path)
         except (PermissionError, FileNotFoundError, IOError) as exc:
@@ -0,0 +1,193 @@
+"""Edit a CSV file: filter its rows and replace values in its columns
+
+The file is streamed one row at a time into a temporary file which is renamed over
+    the destination once complete, so files of any size can be edited and a failed
+    edit never leaves a partial file
+
+Rows are first filtered (a row is kept only if it matches every filter) and then
+    each replacement is applied, in order, to the kept rows
+
+params = {
+    "path" (str): path/to/file.csv to edit
+    "filters" (list): rows to keep, eg., [{"column": "x", "comparator": ">", "value": 1}]
+    "replacements" (list): values to replace,
+        eg., [{"column": "mode", "old": "fast", "new": "slow"}]
+    ...see Parameters
+}
+"""
+
+import csv
+import logging
+import os
+import shutil
+from typing import Callable, Final, Iterator, Literal
+
+from pydantic import BaseModel
+
+from antz.infrastructure.config.base import ParametersType, PrimitiveType
+from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.status import Status
+from antz.jobs.compare import comparators
+
+# buffer of the source and temporary files; rows are small, so read ahead a lot
+_BUFFER_SIZE: Final[int] = 2**20
+
+
+class RowFilter(BaseModel, frozen=True):
+    """Keep the rows where `column comparator value` is true"""
+
+    column: str
+    comparator: Literal["<", ">", "<=", ">=", "==", "!="]
+    value: PrimitiveType
+
+
+class Replacement(BaseModel, frozen=True):
+    """Set column to new where it is old, or in every row if old is None"""
+
+    column: str
+    new: PrimitiveType
+    old: PrimitiveType | None = None
+
+
+class Parameters(BaseModel, frozen=True):
+    """Parameters of the edit_csv job"""
+
+    path: str
+    destination: str | None = None
+    filters: list[RowFilter] = []
+    replacements: list[Replacement] = []
+    delimiter: str | None = None
+
+
+@simple_job
+def edit_csv(parameters: ParametersType, logger: logging.Logger) -> Status:
+    """Filter the rows of a csv and replace values in its columns
+
+    Numbers in filters are compared numerically, so a row whose cell is not a
+        number never matches them; anything else is compared as text. The header
+        row is always kept
+
+    Parameters {
+        path (str): path/to/file.csv to edit
+        destination (str | None): path/to/file.csv to write; path itself if None
+        filters (list[dict]): rows to keep, each of form
+            {
+                column (str): name of the column to compare
+                comparator (str): one of <, >, <=, >=, ==, !=
+                value (str | int | float | bool): right hand side of the comparison
+            }
+        replacements (list[dict]): values to replace, each of form
+            {
+                column (str): name of the column to edit
+                new (str | int | float | bool): value to set
+                old (str | int | float | bool | None): only replace this value; if
+                    None, set the column in every row
+            }
+        delimiter (str | None): tab for .tsv and comma otherwise if None
+    }
+
+    Args:
+        parameters (ParametersType): see above
+        logger (logging.Logger): logger to assist with debugging
+
+    Returns:
+        Status: SUCCESS if the file was edited; ERROR otherwise
+    """
+    params = Parameters.model_validate(parameters)
+    destination = params.destination or params.path
+    delimiter = params.delimiter or ("\t" if params.path.endswith(".tsv") else ",")
+
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    try:
+        with (
+            open(
+                params.path, "r", newline="", encoding="utf-8", buffering=_BUFFER_SIZE
+            ) as src,
+            open(
+                tmp_path, "w", newline="", encoding="utf-8", buffering=_BUFFER_SIZE
+            ) as dst,
+        ):
+            reader = csv.reader(src, delimiter=delimiter)
+            writer = csv.writer(dst, delimiter=delimiter)
+            header = next(reader, None)
+            if header is None:
+                raise RuntimeError(f"{params.path} has no header")
+            writer.writerow(header)
+            writer.writerows(edit_rows(reader, header, params))
+        shutil.copymode(
+            destination if os.path.exists(destination) else params.path, tmp_path
+        )
+        os.replace(tmp_path, destination)
+    except (OSError, RuntimeError, csv.Error, UnicodeDecodeError) as exc:
+        logger.error("Unable to edit %s", params.path, exc_info=exc)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return Status.ERROR
+
+    return Status.SUCCESS
+
+
+def edit_rows(
+    rows: Iterator[list[str]], header: list[str], params: Parameters
+) -> Iterator[list[str]]:
+    """Filter and edit a stream of csv rows
+
+    Args:
+        rows (Iterator[list[str]]): rows of the csv, after the header
+        header (list[str]): names of the columns
+        params (Parameters): the filters and replacements to apply
+
+    Raises:
+        RuntimeError: if a filter or replacement names a column not in header
+
+    Yields:
+        list[str]: the kept rows, edited
+    """
+    columns = {name: index for index, name in enumerate(header)}
+    for name in [item.column for item in [*params.filters, *params.replacements]]:
+        if name not in columns:
+            raise RuntimeError(f"Column {name} is not in the csv")
+
+    tests = [
+        (columns[row_filter.column], _get_test(row_filter))
+        for row_filter in params.filters
+    ]
+    replacements = [
+        (
+            columns[replacement.column],
+            None if replacement.old is None else str(replacement.old),
+            str(replacement.new),
+        )
+        for replacement in params.replacements
+    ]
+
+    used = [index for index, _ in tests] + [index for index, _, _ in replacements]
+    min_length = 1 + max(used, default=-1)
+    for row in rows:
+        if len(row) < min_length:
+            if not row:
+                continue  # a blank line
+            raise RuntimeError(f"Row {row} has too few columns")
+        if not all(test(row[index]) for index, test in tests):
+            continue
+        for index, old, new in replacements:
+            if old is None or row[index] == old:
+                row[index] = new
+        yield row
+
+
+def _get_test(row_filter: RowFilter) -> Callable[[str], bool]:
+    """Return a function of a cell which is true if it passes the filter"""
+    compare_fn = comparators[row_filter.comparator]
+    value = row_filter.value
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        text = str(value)
+        return lambda cell: compare_fn(cell, text)
+
+    def test(cell: str) -> bool:
+        try:
+            return compare_fn(float(cell), value)
+        except ValueError:
+            return False
+
+    return test
@@ -0,0 +1,230 @@
+"""Edit a JSON or YAML file: set and delete keys
+
+All the edits of a job are applied to one parse of the file, which is then written
+    once, so setting many keys of a large input deck costs a single read and write.
+    The file is written next to the destination and renamed into place, so a
+    failed edit never leaves a partial file
+
+Keys are paths into the document separated by separator (default "."), where
+    parts which index a list are integers, eg., "solver.stages.0.dt"
+
+YAML is read and written with the libyaml bindings of PyYAML where available.
+    Comments and formatting of the original file are not kept
+
+params = {
+    "path" (str): path/to/file.json, .yaml or .yml to edit
+    "set_values" (dict): {key: value} to set, eg., {"solver.dt": 0.01}
+    "delete_keys" (list[str]): keys to remove
+    ...see Parameters
+}
+"""
+
+# pylint: disable=duplicate-code
+
+import json
+import logging
+import os
+import shutil
+from typing import Any, Final, Literal
+
+from pydantic import BaseModel
+
+from antz.infrastructure.config.base import ParametersType
+from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.status import Status
+
+_FORMATS_BY_EXTENSION: Final[dict[str, str]] = {
+    ".json": "json",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+}
+
+
+class Parameters(BaseModel, frozen=True):
+    """Parameters of the edit_document job"""
+
+    path: str
+    destination: str | None = None
+    set_values: dict[str, Any] = {}
+    delete_keys: list[str] = []
+    separator: str = "."
+    file_format: Literal["json", "yaml"] | None = None
+    indent: int | None = 2
+
+
+@simple_job
+def edit_document(parameters: ParametersType, logger: logging.Logger) -> Status:
+    """Set and delete keys of a json or yaml file
+
+    Keys are set in order and then deleted. Setting a key creates any missing
+        mappings on its path, and setting the index one past the end of a list
+        appends to it. Deleting a key which does not exist does nothing
+
+    Parameters {
+        path (str): path/to/file to edit
+        destination (str | None): path/to/file to write; path itself if None
+        set_values (dict[str, Any]): values to set by key
+        delete_keys (list[str]): keys to remove
+        separator (str): separator of the parts of a key
+        file_format (str | None): json or yaml; inferred from the extension of
+            path if None
+        indent (int | None): spaces to indent nested json; on one line if None
+    }
+
+    Args:
+        parameters (ParametersType): see above
+        logger (logging.Logger): logger to assist with debugging
+
+    Returns:
+        Status: SUCCESS if the file was edited; ERROR otherwise
+    """
+    params = Parameters.model_validate(parameters)
+    destination = params.destination or params.path
+
+    file_format = params.file_format or _FORMATS_BY_EXTENSION.get(
+        os.path.splitext(params.path)[1].lower()
+    )
+    if file_format is None:
+        logger.error("Unable to infer the format of %s", params.path)
+        return Status.ERROR
+
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    try:
+        with open(params.path, "r", encoding="utf-8") as fh:
+            document = _load(fh, file_format)
+
+        document = {} if document is None else document
+        for key, value in params.set_values.items():
+            set_key(document, key.split(params.separator), value)
+        for key in params.delete_keys:
+            delete_key(document, key.split(params.separator))
+
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            _dump(document, fh, file_format, params.indent)
+        shutil.copymode(
+            destination if os.path.exists(destination) else params.path, tmp_path
+        )
+        os.replace(tmp_path, destination)
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        # json, yaml and the edits each raise their own errors
+        logger.error("Unable to edit %s", params.path, exc_info=exc)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return Status.ERROR
+
+    return Status.SUCCESS
+
+
+def set_key(document: Any, parts: list[str], value: Any) -> None:
+    """Set the value at the path parts of document, creating missing mappings
+
+    Raises:
+        RuntimeError: if the path goes through a value which is not a mapping or
+            list, or indexes a list with other than an integer in range
+    """
+    container = document
+    for part in parts[:-1]:
+        if isinstance(container, dict) and _get_dict_key(container, part) is None:
+            container[part] = {}
+        container = container[_get_key(container, parts, part)]
+
+    last = parts[-1]
+    if isinstance(container, dict):
+        key = _get_dict_key(container, last)
+        container[last if key is None else key] = value
+    elif isinstance(container, list) and _get_list_index(parts, last) == len(container):
+        container.append(value)
+    else:
+        container[_get_key(container, parts, last)] = value
+
+
+def delete_key(document: Any, parts: list[str]) -> None:
+    """Remove the value at the path parts of document, if there is one"""
+    container = document
+    for depth, part in enumerate(parts):
+        if isinstance(container, dict):
+            key = _get_dict_key(container, part)
+            if key is None:
+                return
+        elif isinstance(container, list):
+            key = _get_list_index(parts, part)
+            if not -len(container) <= key < len(container):
+                return
+        else:
+            return
+        if depth == len(parts) - 1:
+            del container[key]
+        else:
+            container = container[key]
+
+
+def _get_key(container: Any, parts: list[str], part: str) -> Any:
+    """Return the key of container for part of a path, which must exist"""
+    if isinstance(container, dict):
+        key = _get_dict_key(container, part)
+        if key is None:
+            raise RuntimeError(f"{part} of {parts} is not a key")
+        return key
+    if isinstance(container, list):
+        index = _get_list_index(parts, part)
+        if not -len(container) <= index < len(container):
+            raise RuntimeError(f"{part} of {parts} is out of range")
+        return index
+    raise RuntimeError(f"{part} of {parts} is inside a {type(container).__name__}")
+
+
+def _get_dict_key(container: dict, part: str) -> Any:
+    """Return the key of container matching part, or None if there is none
+
+    YAML mappings may have integer keys, so part also matches its integer value
+    """
+    if part in container:
+        return part
+    try:
+        key = int(part)
+    except ValueError:
+        return None
+    return key if key in container else None
+
+
+def _get_list_index(parts: list[str], part: str) -> int:
+    """Return part as an index of a list"""
+    try:
+        return int(part)
+    except ValueError as exc:
+        raise RuntimeError(f"{part} of {parts} must be an integer") from exc
+
+
+def _load(fh: Any, file_format: str) -> Any:
+    """Parse the document in the open file"""
+    if file_format == "json":
+        return json.load(fh)
+    yaml = _import_yaml()
+    return yaml.load(fh, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+
+def _dump(document: Any, fh: Any, file_format: str, indent: int | None) -> None:
+    """Write the document to the open file"""
+    if file_format == "json":
+        json.dump(document, fh, indent=indent, ensure_ascii=False)
+        fh.write("\n")
+        return
+    yaml = _import_yaml()
+    yaml.dump(
+        document,
+        fh,
+        Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper),
+        sort_keys=False,
+        default_flow_style=False,
+        allow_unicode=True,
+    )
+
+
+def _import_yaml() -> Any:
+    """Return the yaml module, which is optional"""
+    try:
+        # pylint: disable-next=import-outside-toplevel,import-error
+        import yaml
+    except ImportError as exc:
+        raise RuntimeError("Editing yaml requires PyYAML to be installed") from exc
+    return yaml
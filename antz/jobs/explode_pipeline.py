@@ -1,13 +1,17 @@
 """Given a template pipeline, create N new pipelines from that template
 with a new variables PIPELINE_ID set to a counter
 
-
+For large N, set num_shards to split the fan-out into shard tasks which are run by
+    other workers (see antz.infrastructure.core.sharding). Each shard covers a range
+    of PIPELINE_IDs; with recursive_shards, shards larger than min_shard_size shard again
 """
 
+# pylint: disable=duplicate-code
+
 import logging
 from typing import Mapping
 
-from pydantic import BaseModel, PositiveInt
+from pydantic import PositiveInt
 
 from antz.infrastructure.config.base import (
     Config,
@@ -17,14 +21,17 @@ from antz.infrastructure.config.base import (
     SubmitFunctionType,
 )
 from antz.infrastructure.config.job_decorators import submitter_job
+from antz.infrastructure.core.scope import VariableScope
+from antz.infrastructure.core.sharding import ShardParameters, shard_or_get_range
 from antz.infrastructure.core.status import Status
 
 
-class Parameters(BaseModel, frozen=True):
+class Parameters(ShardParameters, frozen=True):
     """See explode pipeline docs"""
 
     num_pipelines: PositiveInt
     pipeline_config_template: PipelineConfig
+    min_shard_size: PositiveInt = 1000
 
 
 @submitter_job
@@ -32,11 +39,21 @@ def explode_pipeline(
     parameters: ParametersType,
     submit_fn: SubmitFunctionType,
     variables: Mapping[str, PrimitiveType],
-    _pipeline_config: PipelineConfig,
+    pipeline_config: PipelineConfig,
     logger: logging.Logger,
 ) -> Status:
     """Create a series of parallel pipelines based on user input
 
+    Parameters {
+        num_pipelines (int): number of pipelines to create
+        pipeline_config_template (PipelineConfig): pipeline to create num_pipelines of
+        num_shards (int): split the fan-out into up to this many shard tasks
+        min_shard_size (int): never make shards of fewer pipelines than this
+        recursive_shards (bool): if True, shards shard again while they are large
+        row_start (int): first PIPELINE_ID to create; set by sharding
+        row_stop (int | None): one past the last PIPELINE_ID to create; set by sharding
+    }
+
     Args:
         parameters (ParametersType): mapping of string names of pipelines to pipeline configurations
         submit_fn (SubmitFunctionType): function to submit the pipeline to for execution
@@ -49,13 +66,31 @@ def explode_pipeline(
 
     params_parsed = Parameters.model_validate(parameters)
 
-    logger.debug("Exploding pipelines into %d pipelines", params_parsed.num_pipelines)
-
-    for i in range(params_parsed.num_pipelines):
+    row_range = shard_or_get_range(
+        parameters,
+        lambda: params_parsed.num_pipelines,
+        submit_fn,
+        variables,
+        pipeline_config,
+    )
+    if row_range is None:
+        logger.debug("Sharded %d pipelines", params_parsed.num_pipelines)
+        return Status.FINAL
+    row_start, row_stop = row_range
+    row_stop = (
+        params_parsed.num_pipelines
+        if row_stop is None
+        else min(row_stop, params_parsed.num_pipelines)
+    )
+
+    logger.debug("Exploding pipelines into %d pipelines", row_stop - row_start)
+
+    outer_scope = VariableScope.from_mapping(variables)
+    for i in range(row_start, row_stop):
         submit_fn(
             Config.model_validate(
                 {
-                    "variables": {**variables, "PIPELINE_ID": i},
+                    "variables": outer_scope.set("PIPELINE_ID", i),
                     "config": params_parsed.pipeline_config_template,
                 }
             )
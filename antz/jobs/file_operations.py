@@ -0,0 +1,354 @@
+"""Run many filesystem operations (mkdir, rename, copy, delete) as one job
+
+Setting up thousands of case directories as one job per operation costs a round
+    trip through the queue per operation. This job takes the whole list and runs it
+    on a pool of threads instead
+
+Operations run in parallel unless they conflict: an operation waits for every
+    earlier operation changing the same path, a path inside it or a directory
+    containing it (or reading any of those, if it changes the path itself). So the
+    result is as if the list were run in order, eg., a copy into a directory made by
+    an earlier mkdir waits for the mkdir, while copies of one template into many
+    case directories run at the same time. If an operation fails, the operations
+    waiting for it are skipped
+
+Directories known to exist are cached and shared by all the operations, so making
+    10k directories under one parent checks the parent once, not 10k times
+
+params = {
+    "operations" (list[dict]): operations, eg.,
+        [
+            {"type": "mkdir", "path": "cases/1"},
+            {"type": "copy", "source": "deck.yaml", "destination": "cases/1/deck.yaml"},
+            {"type": "rename", "source": "old", "destination": "new"},
+            {"type": "delete", "path": "scratch"},
+        ]
+    "max_workers" (int): number of threads
+    "report" (str | None): path/to/report.json of the result of every operation
+}
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Literal, Union
+
+from pydantic import BaseModel, Field, PositiveInt
+from typing_extensions import Annotated
+
+from antz.infrastructure.config.base import ParametersType
+from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.file_copy import copy_file_contents, copy_tree
+from antz.infrastructure.core.status import Status
+
+
+class MakeDirOperation(BaseModel, frozen=True):
+    """Make a directory and its missing parents"""
+
+    type: Literal["mkdir"]
+    path: str
+    exist_ok: bool = True
+
+    def paths(self) -> tuple[list[str], list[str]]:
+        """Paths the operation reads, and paths it changes"""
+        return [], [self.path]
+
+
+class RenameOperation(BaseModel, frozen=True):
+    """Rename (move) a file or directory, making the parent of destination"""
+
+    type: Literal["rename"]
+    source: str
+    destination: str
+    overwrite: bool = False
+
+    def paths(self) -> tuple[list[str], list[str]]:
+        """Paths the operation reads, and paths it changes"""
+        return [], [self.source, self.destination]
+
+
+class CopyOperation(BaseModel, frozen=True):
+    """Copy a file or directory with its metadata, making the parent of destination"""
+
+    type: Literal["copy"]
+    source: str
+    destination: str
+
+    def paths(self) -> tuple[list[str], list[str]]:
+        """Paths the operation reads, and paths it changes"""
+        return [self.source], [self.destination]
+
+
+class DeleteOperation(BaseModel, frozen=True):
+    """Delete a file or directory"""
+
+    type: Literal["delete"]
+    path: str
+    missing_ok: bool = False
+
+    def paths(self) -> tuple[list[str], list[str]]:
+        """Paths the operation reads, and paths it changes"""
+        return [], [self.path]
+
+
+OperationType = Annotated[
+    Union[MakeDirOperation, RenameOperation, CopyOperation, DeleteOperation],
+    Field(discriminator="type"),
+]
+
+
+class Parameters(BaseModel, frozen=True):
+    """Parameters of the file_operations job"""
+
+    operations: list[OperationType]
+    max_workers: PositiveInt = 8
+    report: str | None = None
+
+
+@simple_job
+def file_operations(parameters: ParametersType, logger: logging.Logger) -> Status:
+    """Run a list of filesystem operations on a pool of threads
+
+    Parameters {
+        operations (list[dict]): operations to run, each one of
+            {type: mkdir, path (str), exist_ok (bool) = True}
+            {type: rename, source (str), destination (str), overwrite (bool) = False}
+            {type: copy, source (str), destination (str)}
+            {type: delete, path (str), missing_ok (bool) = False}
+        max_workers (int): number of threads running operations (and copying the
+            files of a directory)
+        report (str | None): path/to/report.json to write a list of the result of
+            each operation to, as {index, type, status, error}, where status is
+            success, error or skipped
+    }
+
+    Args:
+        parameters (ParametersType): see above
+        logger (logging.Logger): logger to assist with debugging
+
+    Returns:
+        Status: SUCCESS if every operation succeeded; ERROR otherwise
+    """
+    params = Parameters.model_validate(parameters)
+
+    runner = _OperationRunner(params.operations, params.max_workers)
+    results = runner.run()
+
+    failed = [result for result in results if result["status"] != "success"]
+    for result in failed[:10]:
+        logger.error("Operation %d: %s", result["index"], result["error"])
+    logger.debug(
+        "Ran %d filesystem operations, %d failed or skipped", len(results), len(failed)
+    )
+
+    if params.report is not None:
+        try:
+            with open(params.report, "w", encoding="utf-8") as fh:
+                json.dump(results, fh)
+        except OSError as exc:
+            logger.error("Unable to write the report", exc_info=exc)
+            return Status.ERROR
+
+    return Status.ERROR if failed else Status.SUCCESS
+
+
+def get_dependencies(operations: list[Any]) -> list[set[int]]:
+    """Return, for each operation, the earlier operations it must wait for
+
+    Two operations conflict if one changes a path which the other reads or changes,
+        or a path inside or containing it; operations only reading never conflict.
+        Conflicting operations which are waited for through another dependency may
+        be left out
+
+    Args:
+        operations (list): operations with a paths() method
+
+    Returns:
+        list[set[int]]: indices of the operations each operation depends on
+    """
+    # path -> last operation changing exactly that path
+    last_write: dict[str, int] = {}
+    # path -> operations reading exactly that path since it was last changed
+    reads: dict[str, list[int]] = {}
+    # path -> operations changing or reading a path inside it since it was changed
+    writes_inside: dict[str, list[int]] = {}
+    reads_inside: dict[str, list[int]] = {}
+
+    dependencies: list[set[int]] = []
+    for index, operation in enumerate(operations):
+        read_paths, write_paths = operation.paths()
+        read_paths = [os.path.abspath(path) for path in read_paths]
+        write_paths = [os.path.abspath(path) for path in write_paths]
+
+        depends_on: set[int] = set()
+        for path in read_paths:
+            for parent in [path, *_get_parents(path)]:
+                if parent in last_write:
+                    depends_on.add(last_write[parent])
+            depends_on.update(writes_inside.get(path, ()))
+        for path in write_paths:
+            for parent in [path, *_get_parents(path)]:
+                if parent in last_write:
+                    depends_on.add(last_write[parent])
+                depends_on.update(reads.get(parent, ()))
+            depends_on.update(writes_inside.get(path, ()))
+            depends_on.update(reads_inside.get(path, ()))
+
+        for path in read_paths:
+            reads.setdefault(path, []).append(index)
+            for parent in _get_parents(path):
+                reads_inside.setdefault(parent, []).append(index)
+        for path in write_paths:
+            # later operations on or inside path wait for this one, and so for these
+            last_write[path] = index
+            for cleared in (reads, writes_inside, reads_inside):
+                cleared.pop(path, None)
+            for parent in _get_parents(path):
+                writes_inside.setdefault(parent, []).append(index)
+
+        depends_on.discard(index)
+        dependencies.append(depends_on)
+    return dependencies
+
+
+def _get_parents(path: str) -> list[str]:
+    """Return the directories containing the absolute path, nearest first"""
+    parents = []
+    parent = os.path.dirname(path)
+    while parent != path:
+        parents.append(parent)
+        path, parent = parent, os.path.dirname(parent)
+    return parents
+
+
+class _OperationRunner:  # pylint: disable=too-few-public-methods
+    """State of one run of a list of operations"""
+
+    def __init__(self, operations: list[Any], max_workers: int) -> None:
+        self._operations = operations
+        self._max_workers = max_workers
+        # directories known to exist; cleared whenever a directory is removed
+        self._known_dirs: set[str] = set()
+        self._lock = threading.Lock()
+
+    def run(self) -> list[dict[str, Any]]:
+        """Run every operation, respecting conflicts; return their results"""
+        dependencies = get_dependencies(self._operations)
+        dependents: list[list[int]] = [[] for _ in self._operations]
+        for index, depends_on in enumerate(dependencies):
+            for dependency in depends_on:
+                dependents[dependency].append(index)
+        num_waiting = [len(depends_on) for depends_on in dependencies]
+        results: list[dict[str, Any]] = [{} for _ in self._operations]
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            running: dict[Future, int] = {
+                executor.submit(self._run_operation, index): index
+                for index, count in enumerate(num_waiting)
+                if count == 0
+            }
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                finished = []
+                for future in done:
+                    index = running.pop(future)
+                    results[index] = future.result()
+                    finished.append(index)
+
+                while finished:
+                    index = finished.pop()
+                    for dependent in dependents[index]:
+                        if results[index]["status"] != "success":
+                            # skipped, as are those waiting for it in turn
+                            if not results[dependent]:
+                                results[dependent] = self._result(
+                                    dependent, "skipped", f"operation {index} failed"
+                                )
+                                finished.append(dependent)
+                            continue
+                        num_waiting[dependent] -= 1
+                        if num_waiting[dependent] == 0 and not results[dependent]:
+                            future = executor.submit(self._run_operation, dependent)
+                            running[future] = dependent
+        return results
+
+    def _result(self, index: int, status: str, error: str | None) -> dict[str, Any]:
+        return {
+            "index": index,
+            "type": self._operations[index].type,
+            "status": status,
+            "error": error,
+        }
+
+    def _run_operation(self, index: int) -> dict[str, Any]:
+        operation = self._operations[index]
+        try:
+            if operation.type == "mkdir":
+                self._make_dir(operation.path, operation.exist_ok)
+            elif operation.type == "rename":
+                self._rename(operation)
+            elif operation.type == "copy":
+                self._copy(operation)
+            else:
+                self._delete(operation)
+        except (OSError, RuntimeError) as exc:
+            return self._result(index, "error", repr(exc))
+        return self._result(index, "success", None)
+
+    def _make_dir(self, path: str, exist_ok: bool = True) -> None:
+        path = os.path.abspath(path)
+        with self._lock:
+            parent_known = os.path.dirname(path) in self._known_dirs
+            if exist_ok and path in self._known_dirs:
+                return
+        try:
+            if parent_known:
+                try:
+                    os.mkdir(path)
+                except FileNotFoundError:
+                    os.makedirs(path)  # the parent was deleted since
+            else:
+                os.makedirs(path)
+        except FileExistsError:
+            if not exist_ok or not os.path.isdir(path):
+                raise
+        with self._lock:
+            self._known_dirs.update([path, *_get_parents(path)])
+
+    def _forget_dirs(self) -> None:
+        """Forget the known directories, as some may have been removed"""
+        with self._lock:
+            self._known_dirs.clear()
+
+    def _rename(self, operation: RenameOperation) -> None:
+        if not operation.overwrite and os.path.lexists(operation.destination):
+            raise RuntimeError(f"{operation.destination} already exists")
+        self._make_dir(os.path.dirname(os.path.abspath(operation.destination)))
+        os.replace(operation.source, operation.destination)
+        if os.path.isdir(operation.destination):
+            self._forget_dirs()
+
+    def _copy(self, operation: CopyOperation) -> None:
+        if os.path.isdir(operation.destination):
+            raise RuntimeError(f"{operation.destination} is a directory")
+        self._make_dir(os.path.dirname(os.path.abspath(operation.destination)))
+        if os.path.isdir(operation.source):
+            copy_tree(
+                operation.source, operation.destination, max_workers=self._max_workers
+            )
+        else:
+            copy_file_contents(operation.source, operation.destination)
+            shutil.copystat(operation.source, operation.destination)
+
+    def _delete(self, operation: DeleteOperation) -> None:
+        path = operation.path
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+            self._forget_dirs()
+        elif os.path.lexists(path):
+            os.remove(path)
+        elif not operation.missing_ok:
+            raise FileNotFoundError(path)
@@ -2,12 +2,14 @@
 
 If that function returns True, then take path 1
 If that function returns False, then take path 2
+
+The result of the function can be memoized, see antz.infrastructure.core.memo
 """
 
 import logging
 from typing import Callable, Mapping
 
-from pydantic import BaseModel, BeforeValidator
+from pydantic import BeforeValidator
 from typing_extensions import Annotated
 
 from antz.infrastructure.config.base import (
@@ -19,10 +21,11 @@ from antz.infrastructure.config.base import (
     get_function_by_name,
 )
 from antz.infrastructure.config.job_decorators import submitter_job
+from antz.infrastructure.core.memo import MemoParameters, call_memoized
 from antz.infrastructure.core.status import Status
 
 
-class Parameters(BaseModel, frozen=True):
+class Parameters(MemoParameters, frozen=True):
     """See if then docstring"""
 
     function: Annotated[Callable[..., bool], BeforeValidator(get_function_by_name)]
@@ -48,6 +51,11 @@ def if_then(
         args: list of args that will be * expanded into the function
         if_true: pipeline to execute if the function returns True
         if_false: pipeline to execute if the function returns False
+        memoize (bool): if True, reuse the result of an earlier call with the same args
+        memo_ttl (float | None): seconds a result is reused for; forever if None
+        memo_max_size (int): results kept in memory by each worker
+        memo_directory (str | None): path/to/directory to share results between workers
+        memo_max_files (int): results kept in memo_directory
     }
 
     Args:
@@ -61,9 +69,7 @@ def if_then(
     """
 
     params_parsed = Parameters.model_validate(parameters)
-    if params_parsed.function(
-        *(params_parsed.args if params_parsed.args is not None else [])
-    ):
+    if call_memoized(params_parsed.function, params_parsed.args, params_parsed):
         logger.debug("Function evaluated to true")
         submit_fn(
             Config.model_validate(
@@ -0,0 +1,388 @@
+"""Sweep over combinations of variables without a case matrix file
+
+A sweep is described by a list of specs. Each spec generates rows of variables and
+    the rows of all the specs are combined as a cartesian product (the last spec
+    varies fastest). One pipeline is created per combined row, with the row's
+    variables set on top of the outer scope
+
+Specs are
+    product: every combination of the values of its variables
+    zip: the i-th value of every variable together; all must be the same length
+    latin_hypercube: num_samples latin hypercube samples of [low, high] per variable
+        (needs numpy, which pandas installs)
+    sobol: num_samples scrambled Sobol samples of [low, high] per variable (needs scipy)
+
+Values of product and zip specs are lists, or ranges of {"start", "stop", "step"}
+
+Rows are generated lazily by their index and the random specs are seeded from seed,
+    so any range of rows can be regenerated independently on any worker. This is
+    what allows sweeps to be sharded (see antz.infrastructure.core.sharding)
+
+For example, the parameters
+    {
+        "sweep": [
+            {"type": "product", "variables": {"mesh": ["coarse", "fine"]}},
+            {"type": "latin_hypercube", "num_samples": 10,
+                "variables": {"temperature": [250, 350]}}
+        ],
+        ...
+    }
+    create 20 pipelines: 10 temperatures for each mesh
+"""
+
+# pylint: disable=duplicate-code
+
+import logging
+import math
+from functools import cached_property
+from typing import Any, Callable, Iterator, Literal, Mapping, Union
+
+from pydantic import BaseModel, Field, NonNegativeInt, PositiveInt, model_validator
+from typing_extensions import Annotated
+
+from antz.infrastructure.config.base import (
+    Config,
+    ParametersType,
+    PipelineConfig,
+    PrimitiveType,
+    SubmitFunctionType,
+)
+from antz.infrastructure.config.job_decorators import submitter_job
+from antz.infrastructure.core.scope import VariableScope
+from antz.infrastructure.core.sharding import ShardParameters, shard_or_get_range
+from antz.infrastructure.core.status import Status
+
+# random specs are generated in blocks of this many samples
+SAMPLE_BLOCK_SIZE: int = 1024
+# rounds of the feistel network permuting the latin hypercube strata
+_NUM_FEISTEL_ROUNDS: int = 4
+
+
+class RangeSpec(BaseModel, frozen=True):
+    """Values start, start + step, ... up to but excluding stop"""
+
+    start: int | float
+    stop: int | float
+    step: int | float = 1
+
+    @model_validator(mode="after")
+    def check_step(self) -> "RangeSpec":
+        """Only allow steps which go from start towards stop"""
+        if self.step == 0:
+            raise ValueError("The step of a range cannot be 0")
+        if (self.stop - self.start) * self.step < 0:
+            raise ValueError(
+                f"A step of {self.step} never reaches {self.stop} from {self.start}"
+            )
+        return self
+
+    def __len__(self) -> int:
+        return max(math.ceil((self.stop - self.start) / self.step), 0)
+
+    def __getitem__(self, index: int) -> int | float:
+        return self.start + index * self.step
+
+
+ValuesType = list[PrimitiveType] | RangeSpec
+
+
+class ProductSpec(BaseModel, frozen=True):
+    """Every combination of the values of the variables"""
+
+    type: Literal["product"]
+    variables: dict[str, ValuesType]
+
+    def size(self) -> int:
+        """Number of rows of this spec"""
+        return math.prod(len(values) for values in self.variables.values())
+
+    def row_getter(self, _seed: list[int]) -> Callable[[int], dict[str, Any]]:
+        """Return a function to get the variables of a row by its index"""
+
+        def get_row(index: int) -> dict[str, Any]:
+            value_indices = []
+            for values in reversed(self.variables.values()):
+                index, value_index = divmod(index, len(values))
+                value_indices.append(value_index)
+            return {
+                name: values[value_index]
+                for (name, values), value_index in zip(
+                    self.variables.items(), reversed(value_indices)
+                )
+            }
+
+        return get_row
+
+
+class ZipSpec(BaseModel, frozen=True):
+    """The i-th value of every variable together"""
+
+    type: Literal["zip"]
+    variables: dict[str, ValuesType]
+
+    def size(self) -> int:
+        """Number of rows of this spec"""
+        lengths = {len(values) for values in self.variables.values()}
+        if len(lengths) > 1:
+            raise RuntimeError("All variables of a zip sweep must be the same length")
+        return lengths.pop() if lengths else 0
+
+    def row_getter(self, _seed: list[int]) -> Callable[[int], dict[str, Any]]:
+        """Return a function to get the variables of a row by its index"""
+        return lambda index: {
+            name: values[index] for name, values in self.variables.items()
+        }
+
+
+class LatinHypercubeSpec(BaseModel, frozen=True):
+    """Latin hypercube samples, each variable sampled between [low, high]"""
+
+    type: Literal["latin_hypercube"]
+    variables: dict[str, tuple[float, float]]
+    num_samples: PositiveInt
+
+    def size(self) -> int:
+        """Number of rows of this spec"""
+        return self.num_samples
+
+    def row_getter(self, seed: list[int]) -> Callable[[int], dict[str, Any]]:
+        """Return a function to get the variables of a row by its index
+
+        Every variable has num_samples strata; a seeded permutation assigns one stratum
+            to each sample and the position inside the stratum is drawn per block.
+            The permutation is computed per sample index (see _permute_indices), so
+            only the blocks of the rows generated are ever held in memory
+        """
+        # pylint: disable-next=import-outside-toplevel
+        import numpy as np
+
+        dims = len(self.variables)
+        keys = np.random.default_rng([*seed, 0]).integers(
+            2**64, size=(dims, _NUM_FEISTEL_ROUNDS), dtype=np.uint64
+        )
+
+        def get_block(block: int) -> Any:
+            start = block * SAMPLE_BLOCK_SIZE
+            stop = min(start + SAMPLE_BLOCK_SIZE, self.num_samples)
+            indices = np.arange(start, stop, dtype=np.uint64)
+            strata = np.stack(
+                [_permute_indices(indices, self.num_samples, key) for key in keys]
+            )
+            rng = np.random.default_rng([*seed, 1, block])
+            jitter = rng.random((dims, stop - start))
+            return (strata + jitter) / self.num_samples
+
+        return _block_row_getter(self.variables, get_block)
+
+
+class SobolSpec(BaseModel, frozen=True):
+    """Scrambled Sobol samples, each variable sampled between [low, high]
+
+    Requires scipy. num_samples should be a power of 2 for the best balance
+    """
+
+    type: Literal["sobol"]
+    variables: dict[str, tuple[float, float]]
+    num_samples: PositiveInt
+
+    def size(self) -> int:
+        """Number of rows of this spec"""
+        return self.num_samples
+
+    def row_getter(self, seed: list[int]) -> Callable[[int], dict[str, Any]]:
+        """Return a function to get the variables of a row by its index"""
+        try:
+            from scipy.stats import (  # pylint: disable=import-outside-toplevel,import-error
+                qmc,
+            )
+        except ImportError as exc:
+            raise RuntimeError("Sobol sweeps require scipy to be installed") from exc
+        # pylint: disable-next=import-outside-toplevel
+        import numpy as np
+
+        def get_block(block: int) -> Any:
+            start = block * SAMPLE_BLOCK_SIZE
+            stop = min(start + SAMPLE_BLOCK_SIZE, self.num_samples)
+            # same seed on every worker, so the sequence is the same everywhere
+            sampler = qmc.Sobol(
+                len(self.variables), scramble=True, seed=np.random.default_rng(seed)
+            )
+            sampler.fast_forward(start)
+            return sampler.random(stop - start).T
+
+        return _block_row_getter(self.variables, get_block)
+
+
+SweepSpec = Annotated[
+    Union[ProductSpec, ZipSpec, LatinHypercubeSpec, SobolSpec],
+    Field(discriminator="type"),
+]
+
+
+class Parameters(ShardParameters, frozen=True):
+    """See parameter_sweep docstring"""
+
+    sweep: list[SweepSpec]
+    pipeline_config_template: PipelineConfig
+    seed: NonNegativeInt = 0
+
+    @cached_property
+    def num_rows(self) -> int:
+        """Number of rows of the whole sweep"""
+        return math.prod(spec.size() for spec in self.sweep)
+
+
+@submitter_job
+def parameter_sweep(
+    parameters: ParametersType,
+    submit_fn: SubmitFunctionType,
+    variables: Mapping[str, PrimitiveType],
+    pipeline_config: PipelineConfig,
+    logger: logging.Logger,
+) -> Status:
+    """Create one pipeline per combination of variables of the sweep
+
+    Parameters {
+        sweep (list[SweepSpec]): specs to combine, see module docstring
+        pipeline_config_template (PipelineConfig): pipeline to create for each row
+        seed (int): seed of the random specs
+        num_shards (int): split the fan-out into up to this many shard tasks
+        min_shard_size (int): never make shards of fewer rows than this
+        recursive_shards (bool): if True, shards shard again while they are large
+        row_start (int): first row to create; set by sharding
+        row_stop (int | None): one past the last row to create; set by sharding
+    }
+
+    Args:
+        parameters (ParametersType): see above
+        submit_fn (SubmitFunctionType): function to submit the pipeline to for execution
+        variables (Mapping[str, PrimitiveType]): variables from the outer context
+        pipeline_config (PipelineConfig): the pipeline running this job
+        logger (logging.Logger): logger to assist with debugging
+
+    Returns:
+        Status: FINAL if jobs successfully submitted; ERROR otherwise
+    """
+    params_parsed = Parameters.model_validate(parameters)
+
+    row_range = shard_or_get_range(
+        parameters,
+        lambda: params_parsed.num_rows,
+        submit_fn,
+        variables,
+        pipeline_config,
+    )
+    if row_range is None:
+        logger.debug("Sharded %d rows of the sweep", params_parsed.num_rows)
+        return Status.FINAL
+    row_start, row_stop = row_range
+    row_stop = (
+        params_parsed.num_rows
+        if row_stop is None
+        else min(row_stop, params_parsed.num_rows)
+    )
+
+    logger.debug("Sweeping rows %d to %d", row_start, row_stop)
+    template = params_parsed.pipeline_config_template
+    outer_scope = VariableScope.from_mapping(variables)
+    for row_num, row in enumerate(
+        generate_rows(params_parsed, row_start, row_stop),
+        start=row_start,
+    ):
+        submit_fn(
+            Config(
+                config=template.model_copy(update={"name": f"sweep_{row_num}"}),
+                variables=outer_scope.update(row),
+            )
+        )
+
+    return Status.FINAL
+
+
+def generate_rows(
+    params: Parameters, row_start: int, row_stop: int
+) -> Iterator[dict[str, PrimitiveType]]:
+    """Lazily generate the variables of the rows [row_start, row_stop) of the sweep
+
+    Args:
+        params (Parameters): parameters of the sweep
+        row_start (int): first row to generate
+        row_stop (int): one past the last row to generate
+
+    Yields:
+        Iterator[dict[str, PrimitiveType]]: the variables of each row, in order
+    """
+    # every spec has its own seed so adding a spec doesn't change the others
+    getters = [
+        (spec.size(), spec.row_getter([params.seed, spec_num]))
+        for spec_num, spec in enumerate(params.sweep)
+    ]
+
+    for row_num in range(row_start, row_stop):
+        row: dict[str, PrimitiveType] = {}
+        index = row_num
+        for size, get_row in reversed(getters):
+            index, spec_index = divmod(index, size)
+            row.update(get_row(spec_index))
+        yield row
+
+
+def _permute_indices(indices: Any, size: int, keys: Any) -> Any:
+    """Map indices of range(size) through a seeded permutation of range(size)
+
+    The permutation is a feistel network over the smallest even number of bits which
+        holds size; values which land outside range(size) go through it again (cycle
+        walking) until they are inside, which keeps it a permutation of range(size)
+
+    Args:
+        indices (numpy.ndarray): uint64 indices to permute, each less than size
+        size (int): number of values permuted
+        keys (numpy.ndarray): uint64 key of each round of the network
+
+    Returns:
+        numpy.ndarray: the permuted indices
+    """
+    half_bits = max(((size - 1).bit_length() + 1) // 2, 1)
+    values = _feistel(indices, half_bits, keys)
+    outside = values >= size
+    while outside.any():  # the network's domain is less than 4 * size
+        values[outside] = _feistel(values[outside], half_bits, keys)
+        outside = values >= size
+    return values
+
+
+def _feistel(values: Any, half_bits: int, keys: Any) -> Any:
+    """Permute uint64 values of 2 * half_bits bits with one round per key"""
+    mask = (1 << half_bits) - 1
+    left, right = values >> half_bits, values & mask
+    for key in keys:
+        # splitmix64 finalizer of the right half as the round function
+        mixed = right ^ key
+        mixed = (mixed ^ (mixed >> 30)) * 0xBF58476D1CE4E5B9
+        mixed = (mixed ^ (mixed >> 27)) * 0x94D049BB133111EB
+        left, right = right, left ^ ((mixed ^ (mixed >> 31)) & mask)
+    return (left << half_bits) | right
+
+
+def _block_row_getter(
+    variables: Mapping[str, tuple[float, float]],
+    get_block: Callable[[int], Any],
+) -> Callable[[int], dict[str, Any]]:
+    """Get rows from blocks of unit samples (one row per variable), scaled to [low, high]
+
+    The last block generated is kept, as rows are usually read in order
+    """
+    cache: dict[int, Any] = {}
+
+    def get_row(index: int) -> dict[str, Any]:
+        block, offset = divmod(index, SAMPLE_BLOCK_SIZE)
+        if block not in cache:
+            cache.clear()
+            cache[block] = get_block(block)
+        samples = cache[block][:, offset]
+        return {
+            name: float(low + sample * (high - low))
+            for (name, (low, high)), sample in zip(variables.items(), samples)
+        }
+
+    return get_row
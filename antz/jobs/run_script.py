@@ -1,16 +1,73 @@
-"""Specify a script to run and run it"""
+"""Specify a script to run and run it
+
+The output of the script is streamed as it is written, never held in memory
+    - to stdout_save_file/stderr_save_file if set (directly by the script when
+        nothing else needs to read it)
+    - else only the last tail_kb of each stream is kept, for the error report
+
+If log_lines_per_second is set, output lines are also forwarded to the logger, up to
+    that many lines per second; the number of lines dropped is logged instead
+
+With warm_python, .py scripts run in a warm python interpreter of this worker
+    (see antz.infrastructure.core.python_pool) instead of a new process, which
+    removes the startup and import time of short scripts. Only scripts run with
+    python (no script_prepend, or just the python executable running antz) are run
+    warm, and their output is not forwarded to the logger
+
+The script can be limited with rlimits (eg., {"as": 8e9, "cpu": 3600}), nice, ionice
+    and cpu_affinity, which are set in the child before the script starts. Limited
+    scripts never run warm, as the limits would apply to the shared interpreter
+
+The resources used by each script (wall, user and system time and max RSS) are
+    logged, and attached to the log record as the antz_metrics attribute. The max
+    RSS of a subprocess includes this worker's memory at the fork, so small scripts
+    report about the size of the worker
+"""
 
 import logging
 import os
+import resource
+import shutil
 import subprocess  # nosec
+import sys
+import tempfile
+import threading
+import time
+from typing import IO, Any, Callable, Final, Literal
 
-from pydantic import BaseModel, BeforeValidator
+from pydantic import (
+    BaseModel,
+    BeforeValidator,
+    Field,
+    NonNegativeFloat,
+    NonNegativeInt,
+    PositiveInt,
+    field_validator,
+)
 from typing_extensions import Annotated
 
 from antz.infrastructure.config.base import ParametersType
 from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.python_pool import get_pool
 from antz.infrastructure.core.status import Status
 
+# bytes read from the script's output at once
+_READ_SIZE: Final[int] = 2**16
+# partial lines longer than this are forwarded to the logger anyway
+_MAX_LINE_LENGTH: Final[int] = 2**14
+# classes of ionice -c
+_IONICE_CLASSES: Final[dict[str, str]] = {
+    "realtime": "1",
+    "best_effort": "2",
+    "idle": "3",
+}
+
+# a limit is an int for both the soft and hard limits, or (soft, hard); -1 is unlimited
+RlimitType = (
+    Annotated[int, Field(ge=-1)]
+    | tuple[Annotated[int, Field(ge=-1)], Annotated[int, Field(ge=-1)]]
+)
+
 
 class Parameters(BaseModel, frozen=True):
     """Parameters for running a script"""
@@ -23,22 +80,74 @@ class Parameters(BaseModel, frozen=True):
     stdout_save_file: str | None = None
     stderr_save_file: str | None = None
     current_working_dir: str | None = None
+    tail_kb: NonNegativeInt = 64
+    log_lines_per_second: NonNegativeFloat = 0
+    warm_python: bool = False
+    warm_preload: list[str] = []
+    warm_max_runs: PositiveInt = 100
+    rlimits: dict[str, RlimitType] | None = None
+    nice: int | None = None
+    ionice: Literal["realtime", "best_effort", "idle"] | None = None
+    ionice_level: Annotated[int, Field(ge=0, le=7)] = 4
+    cpu_affinity: list[NonNegativeInt] | None = None
+
+    @field_validator("rlimits")
+    @classmethod
+    def check_rlimit_names(
+        cls, rlimits: dict[str, RlimitType] | None
+    ) -> dict[str, RlimitType] | None:
+        """Check that every rlimit has a RLIMIT_ constant"""
+        for name in rlimits or {}:
+            if not hasattr(resource, f"RLIMIT_{name.upper()}"):
+                raise ValueError(f"Unknown rlimit {name}")
+        return rlimits
+
+    def is_limited(self) -> bool:
+        """Return if any limit is set on the script"""
+        return bool(self.rlimits) or any(
+            limit is not None for limit in (self.nice, self.ionice, self.cpu_affinity)
+        )
 
 
 @simple_job
 def run_script(parameters: ParametersType, logger: logging.Logger) -> Status:
     """Run the script provided by parameters
 
+    Parameters {
+        script_path (str): path/to/script to run
+        script_args (list[str] | None): arguments to the script
+        script_prepend (list[str] | None): command before the script, eg., ["python"]
+        stdout_save_file (str | None): path/to/file to stream stdout to
+        stderr_save_file (str | None): path/to/file to stream stderr to
+        current_working_dir (str | None): directory to run the script in
+        tail_kb (int): KB of the end of each stream to log if the script fails
+        log_lines_per_second (float): forward up to this many lines of output per
+            second to the logger; 0 to not forward
+        warm_python (bool): if True, run .py scripts in a warm python interpreter
+        warm_preload (list[str]): modules the warm interpreters import at startup
+        warm_max_runs (int): scripts a warm interpreter runs before it is replaced
+        rlimits (dict[str, int | tuple[int, int]] | None): resource limits, by the
+            name of the RLIMIT_ constant without the prefix, eg., "as", "cpu", "nofile"
+        nice (int | None): niceness to add to the script
+        ionice (str | None): io scheduling class, one of realtime, best_effort, idle
+        ionice_level (int): io priority within the class, 0 (highest) to 7
+        cpu_affinity (list[int] | None): cpus the script may run on
+    }
+
     Args:
-        parameters (ParametersType): _description_
+        parameters (ParametersType): see above
+        logger (logging.Logger): logger to assist with debugging
 
     Returns:
-        Status: _description_
+        Status: SUCCESS if the script exits with 0; ERROR otherwise
     """
 
     run_parameters = Parameters.model_validate(parameters)
 
-    cmd = []
+    if _can_run_warm(run_parameters):
+        return _run_warm(run_parameters, logger)
+
+    cmd = _ionice_prefix(run_parameters, logger)
     if run_parameters.script_prepend is not None:
         cmd.extend(run_parameters.script_prepend)
     if not os.path.exists(run_parameters.script_path):
@@ -47,24 +156,335 @@ def run_script(parameters: ParametersType, logger: logging.Logger) -> Status:
     if run_parameters.script_args is not None:
         cmd.extend(run_parameters.script_args)
 
-    try:
-        ret = subprocess.run(
-            cmd,
-            capture_output=True,
-            cwd=run_parameters.current_working_dir,
-            shell=False,
-            check=True,
-        )  # nosec
-
-        if run_parameters.stdout_save_file is not None:
-            with open(run_parameters.stdout_save_file, "wb") as fh:
-                fh.write(ret.stdout)
-        if run_parameters.stderr_save_file is not None:
-            with open(run_parameters.stderr_save_file, "wb") as fh:
-                fh.write(ret.stderr)
-    except subprocess.CalledProcessError as exc:
-        logger.error("Unknown error in run_script", exc_info=exc)
-        # catch all errors because we don't know what will happen
-        return Status.ERROR
+    forwarder = None
+    if run_parameters.log_lines_per_second > 0:
+        forwarder = LineForwarder(logger, run_parameters.log_lines_per_second)
+    tail_bytes = run_parameters.tail_kb * 1024
+
+    with (
+        OutputStream(
+            "stdout", run_parameters.stdout_save_file, tail_bytes, forwarder
+        ) as stdout,
+        OutputStream(
+            "stderr", run_parameters.stderr_save_file, tail_bytes, forwarder
+        ) as stderr,
+    ):
+        start = time.monotonic()
+        try:
+            # the limiter only makes system calls, so is safe with threads
+            # pylint: disable-next=subprocess-popen-preexec-fn
+            with subprocess.Popen(
+                cmd,
+                stdout=stdout.target,
+                stderr=stderr.target,
+                cwd=run_parameters.current_working_dir,
+                shell=False,
+                preexec_fn=_get_child_limiter(run_parameters),
+            ) as proc:  # nosec
+                stdout.start(proc.stdout)
+                stderr.start(proc.stderr)
+                return_code, usage = _wait_with_usage(proc, start)
+                stdout.finish()
+                stderr.finish()
+        except OSError as exc:
+            logger.error("Unable to run script", exc_info=exc)
+            return Status.ERROR
+
+        if forwarder is not None:
+            forwarder.flush()
+        _log_usage(run_parameters.script_path, usage, logger)
+        return _check_return_code(return_code, stdout, stderr, run_parameters, logger)
+
+
+def _can_run_warm(run_parameters: Parameters) -> bool:
+    """Return if the script is a python script which may run warm"""
+    prepend = run_parameters.script_prepend
+    return (
+        run_parameters.warm_python
+        and not run_parameters.is_limited()
+        and run_parameters.script_path.endswith(".py")
+        and (prepend is None or (len(prepend) == 1 and _is_own_python(prepend[0])))
+    )
+
+
+def _is_own_python(executable: str) -> bool:
+    """Return if executable is the interpreter of this process, which warm runs use"""
+    path = shutil.which(executable)
+    return path is not None and os.path.realpath(path) == os.path.realpath(
+        sys.executable
+    )
+
+
+def _run_warm(run_parameters: Parameters, logger: logging.Logger) -> Status:
+    """Run a python script in a warm interpreter of this worker"""
+    if run_parameters.log_lines_per_second > 0:
+        logger.warning("Output of warm python scripts is not forwarded to the logger")
+
+    pool = get_pool(run_parameters.warm_preload, run_parameters.warm_max_runs)
+    tail_bytes = run_parameters.tail_kb * 1024
+    with (
+        OutputStream(
+            "stdout", run_parameters.stdout_save_file, tail_bytes, None, spool=True
+        ) as stdout,
+        OutputStream(
+            "stderr", run_parameters.stderr_save_file, tail_bytes, None, spool=True
+        ) as stderr,
+    ):
+        try:
+            return_code, usage = pool.run(
+                run_parameters.script_path,
+                run_parameters.script_args or [],
+                run_parameters.current_working_dir,
+                stdout.path,
+                stderr.path,
+            )
+        except RuntimeError as exc:
+            logger.error("Unable to run script", exc_info=exc)
+            return Status.ERROR
+        _log_usage(run_parameters.script_path, usage, logger)
+        return _check_return_code(return_code, stdout, stderr, run_parameters, logger)
+
+
+def _ionice_prefix(run_parameters: Parameters, logger: logging.Logger) -> list[str]:
+    """Return the ionice command to run the script under, if ionice is set"""
+    if run_parameters.ionice is None:
+        return []
+    ionice = shutil.which("ionice")
+    if ionice is None:
+        logger.warning("ionice is not installed; running the script without it")
+        return []
+    cmd = [ionice, "-c", _IONICE_CLASSES[run_parameters.ionice]]
+    if run_parameters.ionice != "idle":
+        cmd.extend(["-n", str(run_parameters.ionice_level)])
+    return cmd
+
+
+def _get_child_limiter(run_parameters: Parameters) -> Callable[[], None] | None:
+    """Return a function setting the limits in the child before the script starts
+
+    It runs between fork and exec, so it only makes system calls
+    """
+    rlimits = []
+    for name, limit in (run_parameters.rlimits or {}).items():
+        soft, hard = limit if isinstance(limit, tuple) else (limit, limit)
+        rlimits.append(
+            (
+                getattr(resource, f"RLIMIT_{name.upper()}"),
+                (
+                    resource.RLIM_INFINITY if soft == -1 else soft,
+                    resource.RLIM_INFINITY if hard == -1 else hard,
+                ),
+            )
+        )
+    nice = run_parameters.nice
+    cpu_affinity = run_parameters.cpu_affinity
+    if not rlimits and nice is None and cpu_affinity is None:
+        return None
+
+    def limit_child() -> None:
+        for rlimit, soft_hard in rlimits:
+            resource.setrlimit(rlimit, soft_hard)
+        if nice is not None:
+            os.nice(nice)
+        if cpu_affinity is not None:
+            os.sched_setaffinity(0, cpu_affinity)
+
+    return limit_child
+
+
+def _wait_with_usage(
+    proc: subprocess.Popen, start: float
+) -> tuple[int, dict[str, Any]]:
+    """Wait for the script to exit; return its exit code and the resources it used
 
+    Args:
+        proc (subprocess.Popen): the running script
+        start (float): time.monotonic() when the script was started
+
+    Returns:
+        tuple[int, dict[str, Any]]: exit code, and the resources the script (and any
+            children it waited for) used
+    """
+    _, wait_status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(wait_status)
+    return proc.returncode, {
+        "wall_time": time.monotonic() - start,
+        "user_time": rusage.ru_utime,
+        "system_time": rusage.ru_stime,
+        "max_rss_kb": rusage.ru_maxrss,
+    }
+
+
+def _log_usage(script_path: str, usage: dict[str, Any], logger: logging.Logger) -> None:
+    """Log the resources used by a script, with the numbers as antz_metrics"""
+    logger.info(
+        "Script %s used %.3fs wall, %.3fs user, %.3fs system, %d KB max RSS",
+        script_path,
+        usage["wall_time"],
+        usage["user_time"],
+        usage["system_time"],
+        usage["max_rss_kb"],
+        extra={"antz_metrics": {"script_path": script_path, **usage}},
+    )
+
+
+def _check_return_code(
+    return_code: int,
+    stdout: "OutputStream",
+    stderr: "OutputStream",
+    run_parameters: Parameters,
+    logger: logging.Logger,
+) -> Status:
+    """Return the status of a script, logging the tails of its output if it failed"""
+    if return_code != 0:
+        logger.error(
+            "Script %s exited with %d\nstdout tail:\n%s\nstderr tail:\n%s",
+            run_parameters.script_path,
+            return_code,
+            stdout.tail(),
+            stderr.tail(),
+        )
+        return Status.ERROR
     return Status.SUCCESS
+
+
+class LineForwarder:
+    """Logs lines of output, dropping lines beyond a rate (a token bucket)
+
+    Shared by the streams of a script, so may be called from several threads
+    """
+
+    def __init__(self, logger: logging.Logger, lines_per_second: float) -> None:
+        self.logger = logger
+        self.lines_per_second = lines_per_second
+        self._tokens = max(lines_per_second, 1.0)  # allow a burst of one second
+        self._last_refill = time.monotonic()
+        self._num_dropped = 0
+        self._lock = threading.Lock()
+
+    def forward(self, name: str, line: str) -> None:
+        """Log line from stream name, unless over the rate"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._tokens + (now - self._last_refill) * self.lines_per_second,
+                max(self.lines_per_second, 1.0),
+            )
+            self._last_refill = now
+            if self._tokens < 1:
+                self._num_dropped += 1
+                return
+            self._tokens -= 1
+            num_dropped, self._num_dropped = self._num_dropped, 0
+        if num_dropped:
+            self.logger.info("Dropped %d lines of script output", num_dropped)
+        self.logger.info("%s: %s", name, line)
+
+    def flush(self) -> None:
+        """Log the number of lines dropped since the last logged line"""
+        with self._lock:
+            num_dropped, self._num_dropped = self._num_dropped, 0
+        if num_dropped:
+            self.logger.info("Dropped %d lines of script output", num_dropped)
+
+
+class OutputStream:
+    """Streams one output of a script to a file and/or a tail and the logger
+
+    If only a file is needed, the script writes to the file itself and the tail is
+        read back from the end of the file. Otherwise the output is piped and a
+        thread copies it where it needs to go as it arrives
+
+    With spool, the script must write to a file (see path); if there is no file to
+        save to, a temporary file is used to keep the tail
+    """
+
+    def __init__(
+        self,
+        name: str,
+        save_file: str | None,
+        tail_bytes: int,
+        forwarder: LineForwarder | None,
+        spool: bool = False,
+    ) -> None:
+        self.name = name
+        self.tail_bytes = tail_bytes
+        self.forwarder = forwarder
+        self._fh: IO[bytes] | None = None
+        if save_file is not None:
+            self._fh = open(save_file, "w+b")  # pylint: disable=consider-using-with
+        elif spool and tail_bytes:
+            # pylint: disable-next=consider-using-with
+            self._fh = tempfile.NamedTemporaryFile()
+        self._tail = bytearray()
+        self._partial_line = b""
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self) -> "OutputStream":
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        if self._fh is not None:
+            self._fh.close()
+
+    @property
+    def target(self) -> IO[bytes] | int:
+        """What to pass to Popen for this stream"""
+        if self.forwarder is None and self._fh is not None:
+            return self._fh
+        if self.forwarder is None and not self.tail_bytes:
+            return subprocess.DEVNULL
+        return subprocess.PIPE
+
+    @property
+    def path(self) -> str:
+        """Path of the file for the script to write to itself"""
+        if self._fh is None:
+            return os.devnull
+        return self._fh.name
+
+    def start(self, pipe: IO[bytes] | None) -> None:
+        """Start copying from the pipe of the script, if it was given one"""
+        if pipe is not None:
+            self._thread = threading.Thread(target=self._pump, args=(pipe,))
+            self._thread.start()
+
+    def finish(self) -> None:
+        """Wait until all the output is copied"""
+        if self._thread is not None:
+            self._thread.join()
+        if self._partial_line and self.forwarder is not None:
+            self.forwarder.forward(
+                self.name, self._partial_line.decode(errors="replace")
+            )
+            self._partial_line = b""
+
+    def tail(self) -> str:
+        """Return the last tail_bytes of the output"""
+        if self._thread is None and self._fh is not None:
+            self._fh.seek(max(self._fh.seek(0, os.SEEK_END) - self.tail_bytes, 0))
+            return self._fh.read(self.tail_bytes).decode(errors="replace")
+        return bytes(self._tail).decode(errors="replace")
+
+    def _pump(self, pipe: IO[bytes]) -> None:
+        """Copy from the pipe until the script closes it"""
+        fd = pipe.fileno()
+        while chunk := os.read(fd, _READ_SIZE):
+            if self._fh is not None:
+                self._fh.write(chunk)
+            if self.tail_bytes:
+                self._tail += chunk
+                if len(self._tail) > self.tail_bytes:
+                    del self._tail[: len(self._tail) - self.tail_bytes]
+            if self.forwarder is not None:
+                self._forward_lines(chunk, self.forwarder)
+
+    def _forward_lines(self, chunk: bytes, forwarder: LineForwarder) -> None:
+        """Forward every complete line; keep the rest for the next chunk"""
+        lines = (self._partial_line + chunk).split(b"\n")
+        self._partial_line = lines.pop()
+        if len(self._partial_line) > _MAX_LINE_LENGTH:
+            lines.append(self._partial_line)
+            self._partial_line = b""
+        for line in lines:
+            forwarder.forward(self.name, line.decode(errors="replace"))
@@ -1,9 +1,12 @@
-"""Call a user provided function and set the value of a variable to the return"""
+"""Call a user provided function and set the value of a variable to the return
+
+The result of the function can be memoized, see antz.infrastructure.core.memo
+"""
 
 import logging
 from typing import Callable, Mapping
 
-from pydantic import BaseModel, BeforeValidator
+from pydantic import BeforeValidator
 from typing_extensions import Annotated
 
 from antz.infrastructure.config.base import (
@@ -13,10 +16,12 @@ from antz.infrastructure.config.base import (
     get_function_by_name,
 )
 from antz.infrastructure.config.job_decorators import mutable_job
+from antz.infrastructure.core.memo import MemoParameters, call_memoized
+from antz.infrastructure.core.scope import VariableScope
 from antz.infrastructure.core.status import Status
 
 
-class Parameters(BaseModel, frozen=True):
+class Parameters(MemoParameters, frozen=True):
     """See change variable docs"""
 
     left_hand_side: str
@@ -42,7 +47,11 @@ def set_variable_from_function(
             for example, if you'd call `from cool.fun.module import my_func` then you'd write
             "function": "cool.fun.module.my_func"
         args: list of args that will be * expanded into the function
-
+        memoize (bool): if True, reuse the result of an earlier call with the same args
+        memo_ttl (float | None): seconds a result is reused for; forever if None
+        memo_max_size (int): results kept in memory by each worker
+        memo_directory (str | None): path/to/directory to share results between workers
+        memo_max_files (int): results kept in memo_directory
         pipeline_config_template (PipelineConfig): pipeline to spawn from this one
     }
 
@@ -59,10 +68,12 @@ def set_variable_from_function(
 
     params_parsed = Parameters.model_validate(parameters)
 
-    result = params_parsed.right_hand_side(
-        *(params_parsed.args if params_parsed.args is not None else [])
+    result = call_memoized(
+        params_parsed.right_hand_side, params_parsed.args, params_parsed
     )
     logger.debug("Changing variable %s to %s", params_parsed.left_hand_side, result)
 
-    new_vars = {**variables, params_parsed.left_hand_side: result}
+    new_vars = VariableScope.from_mapping(variables).set(
+        params_parsed.left_hand_side, result
+    )
     return Status.SUCCESS, new_vars
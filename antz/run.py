@@ -5,10 +5,12 @@ This file takes the initial config and sets up everything
 
 import argparse
 import json
+import sys
 import warnings
 from typing import Any, Mapping
 
 from antz.infrastructure.config.base import InitialConfig
+from antz.infrastructure.log.merge import find_shards, merge_shards
 from antz.infrastructure.submitters.local import run_local_submitter
 
 
@@ -27,16 +29,40 @@ def run(config: Mapping[str, Any]) -> None:
         raise RuntimeError("Unknown submitter type")
 
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None) -> None:
+    """Run a configuration, or a command such as `antz logs merge`"""
     parser = argparse.ArgumentParser(prog="antz")
     parser.add_argument(
         "--config",
-        "c",
+        "-c",
         help="Path to the configuration of the entire analysis pipeline",
-        required=True,
     )
+    commands = parser.add_subparsers(dest="command")
+    logs_parser = commands.add_parser("logs", help="Work with the logs of a run")
+    logs_commands = logs_parser.add_subparsers(dest="logs_command", required=True)
+    merge_parser = logs_commands.add_parser(
+        "merge", help="Merge the log shards of the workers in order of time"
+    )
+    merge_parser.add_argument(
+        "paths", nargs="+", help="Log shards, or directories of them"
+    )
+    merge_parser.add_argument(
+        "--output", "-o", help="File to write the merged logs to; stdout if not set"
+    )
+    merge_parser.add_argument(
+        "--pipeline-id", help="Only keep the records of this pipeline"
+    )
+
+    args = parser.parse_args(argv)
 
-    args = parser.parse_args()
+    if args.command == "logs":
+        try:
+            _merge_logs(args.paths, args.output, args.pipeline_id)
+        except (OSError, ValueError) as exc:
+            merge_parser.error(str(exc))
+        return
+    if args.config is None:
+        parser.error("the following arguments are required: --config/-c")
 
     try:
         with open(args.config, "r", encoding="utf-8") as fh:
@@ -50,3 +76,20 @@ if __name__ == "__main__":
         raise exc
     else:
         run(_loaded_config)
+
+
+def _merge_logs(paths: list[str], output: str | None, pipeline_id: str | None) -> None:
+    """Merge the log shards at paths into output, or stdout
+
+    The paths are checked before output is opened, so a bad path leaves it as it was
+    """
+    find_shards(paths)
+    if output is None:
+        merge_shards(paths, sys.stdout, pipeline_id=pipeline_id)
+        return
+    with open(output, "w", encoding="utf-8") as fh:
+        merge_shards(paths, fh, pipeline_id=pipeline_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Micro-benchmarks for variable resolution
+
+Run with `python -m benchmarks.bench_variables` from the root of the repository
+"""
+
+import timeit
+
+from antz.infrastructure.core.variables import resolve_variables
+
+NUMBER: int = 100_000
+
+VARIABLES = {
+    "an_int": 1,
+    "a_float": 0.123456789,
+    "a_str": "hello",
+    "a_bool": True,
+    **{f"var_{i}": i for i in range(100)},
+}
+
+CASES = {
+    "whole value int": {"value": "%{an_int}"},
+    "whole value float": {"value": "%{a_float}"},
+    "whole value str": {"value": "%{a_str}"},
+    "whole value expression": {"value": "%{an_int * a_float}"},
+    "interpolated str": {"value": "path/to/%{a_str}/%{an_int}"},
+    "static block": {f"static_{i}": i for i in range(100)} | {"value": "%{an_int}"},
+}
+
+
+def main() -> None:
+    """Time resolving each case and print the time per resolution"""
+    for name, parameters in CASES.items():
+        seconds = timeit.timeit(
+            lambda parameters=parameters, name=name: resolve_variables(
+                parameters, VARIABLES, cache_key=name
+            ),
+            number=NUMBER,
+        )
+        print(f"{name:<25} {seconds / NUMBER * 1e6:8.3f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Test deduplication of identical submissions"""
+
+from antz.infrastructure.config.base import Config
+from antz.infrastructure.core.dedup import SubmissionDeduplicator, fingerprint
+
+
+def _config(name: str = "pipeline", **variables) -> Config:
+    return Config.model_validate(
+        {
+            "variables": variables,
+            "config": {
+                "type": "pipeline",
+                "name": name,
+                "stages": [
+                    {
+                        "type": "job",
+                        "name": name,
+                        "function": "antz.jobs.nop.nop",
+                        "parameters": {"value": "%{a}", "name": "kept"},
+                    }
+                ],
+            },
+        }
+    )
+
+
+def test_fingerprint_ignores_names_and_ids() -> None:
+    """Generated ids and names do not change the work done"""
+    assert fingerprint(_config("one", a=1)) == fingerprint(_config("two", a=1))
+    assert fingerprint(_config(a=1)) != fingerprint(_config(a=2))
+    assert fingerprint(_config(a=1)) != fingerprint(_config(a="1"))
+
+
+def test_duplicates_dropped() -> None:
+    """Only the first of identical submissions is submitted"""
+    submitted: list[Config] = []
+    deduplicator = SubmissionDeduplicator(max_size=10)
+    submit_fn = deduplicator.wrap(submitted.append)
+
+    for a in [1, 2, 1, 1, 3, 2]:
+        submit_fn(_config(a=a))
+
+    assert [config.variables["a"] for config in submitted] == [1, 2, 3]
+    assert deduplicator.num_submitted == 6
+    assert deduplicator.num_duplicates == 3
+
+
+def test_index_is_bounded() -> None:
+    """Fingerprints beyond max_size are forgotten, least recent first"""
+    submitted: list[Config] = []
+    submit_fn = SubmissionDeduplicator(max_size=2).wrap(submitted.append)
+
+    for a in [1, 2, 1, 3, 2, 1]:
+        submit_fn(_config(a=a))
+
+    # 1 is refreshed by its duplicate, so 2 is forgotten when 3 is added
+    assert [config.variables["a"] for config in submitted] == [1, 2, 3, 2, 1]
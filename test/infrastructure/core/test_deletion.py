@@ -0,0 +1,36 @@
+"""Test that background deletions are reaped and their failures reported"""
+
+import logging
+import os
+import time
+
+from antz.infrastructure.core.deletion import FAILED_SUFFIX, delete_in_background, main
+
+
+def test_failure_is_written_next_to_the_tree(tmpdir) -> None:
+    missing = os.fspath(tmpdir.join("missing"))
+    assert main([missing, "--max-workers", "2"]) == 1
+    with open(missing + FAILED_SUFFIX, "r", encoding="utf-8") as fh:
+        assert "FileNotFoundError" in fh.read()
+
+    os.mkdir(tmpdir.join("tree"))
+    assert main([os.fspath(tmpdir.join("tree"))]) == 0
+    assert os.listdir(tmpdir) == ["missing" + FAILED_SUFFIX]
+
+
+def test_background_outcome_is_logged(tmpdir, caplog) -> None:
+    logger = logging.getLogger("test_deletion")
+    logger.setLevel(logging.INFO)
+    os.makedirs(tmpdir.join("tree", "sub"))
+
+    with caplog.at_level(logging.INFO, logger="test_deletion"):
+        trash_path = delete_in_background(os.fspath(tmpdir.join("tree")), 2, logger)
+        for _ in range(100):
+            if len(caplog.records) == 2:
+                break
+            time.sleep(0.1)
+
+    started, finished = [record.getMessage() for record in caplog.records]
+    assert trash_path in started and "process" in started
+    assert finished == f"Deleted {trash_path} in the background"
+    assert os.listdir(tmpdir) == []
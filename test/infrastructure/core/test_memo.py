@@ -0,0 +1,128 @@
+"""Test memoization of user functions"""
+
+import logging
+import os
+import time
+
+from antz.infrastructure.config.base import PipelineConfig
+from antz.infrastructure.core import memo
+from antz.infrastructure.core.memo import MemoCache, MemoParameters, call_memoized
+from antz.infrastructure.core.status import Status
+from antz.jobs.if_then import if_then
+
+logger = logging.getLogger("test")
+logger.setLevel(100000)  # don't log in tests
+
+calls: list[tuple] = []
+
+
+def expensive(*args) -> int:
+    """Count the calls and return the sum of the arguments"""
+    calls.append(args)
+    return sum(args)
+
+
+def is_positive(value: int) -> bool:
+    """Count the calls and return if value is positive"""
+    calls.append((value,))
+    return value > 0
+
+
+def setup_function() -> None:
+    calls.clear()
+    memo._caches.clear()  # pylint: disable=protected-access
+
+
+def test_not_memoized_by_default() -> None:
+    params = MemoParameters()
+    assert call_memoized(expensive, [1, 2], params) == 3
+    assert call_memoized(expensive, [1, 2], params) == 3
+    assert len(calls) == 2
+
+
+def test_memoized_by_args() -> None:
+    params = MemoParameters(memoize=True)
+    assert call_memoized(expensive, [1, 2], params) == 3
+    assert call_memoized(expensive, [1, 2], params) == 3
+    assert call_memoized(expensive, [2, 2], params) == 4
+    assert call_memoized(expensive, None, params) == 0
+    assert calls == [(1, 2), (2, 2), ()]
+
+
+def test_max_size_and_ttl() -> None:
+    cache = MemoCache(max_size=2, ttl=None, directory=None)
+    for key in "abc":
+        cache.put(key, key)
+    assert cache.get("a") == (False, None)
+    assert cache.get("c") == (True, "c")
+
+    cache = MemoCache(max_size=2, ttl=0.05, directory=None)
+    cache.put("a", 1)
+    assert cache.get("a") == (True, 1)
+    time.sleep(0.1)
+    assert cache.get("a") == (False, None)
+
+
+def test_shared_directory(tmpdir: str | os.PathLike[str]) -> None:
+    params = MemoParameters(memoize=True, memo_directory=os.fspath(tmpdir))
+    assert call_memoized(expensive, [5], params) == 5
+    assert len(os.listdir(tmpdir)) == 1
+
+    # another worker has an empty cache in memory, but shares the directory
+    memo._caches.clear()  # pylint: disable=protected-access
+    assert call_memoized(expensive, [5], params) == 5
+    assert calls == [(5,)]
+
+    # expired on disk too
+    memo._caches.clear()  # pylint: disable=protected-access
+    time.sleep(0.1)
+    params = params.model_copy(update={"memo_ttl": 0.05})
+    assert call_memoized(expensive, [5], params) == 5
+    assert calls == [(5,), (5,)]
+
+
+def test_directory_is_pruned(tmpdir: str | os.PathLike[str]) -> None:
+    directory = os.fspath(tmpdir)
+    cache = MemoCache(max_size=8, ttl=None, directory=directory, max_files=2)
+    for key in "abcd":
+        cache.put(key, key)
+        time.sleep(0.01)  # distinct mtimes
+    assert len(os.listdir(directory)) == 2
+    memo._caches.clear()  # pylint: disable=protected-access
+    cache = MemoCache(max_size=8, ttl=None, directory=directory, max_files=2)
+    assert cache.get("a") == (False, None)
+    assert cache.get("d") == (True, "d")
+    assert (cache.num_hits, cache.num_misses) == (1, 1)
+
+    # expired files are removed even below max_files
+    cache = MemoCache(max_size=8, ttl=0.05, directory=directory, max_files=8)
+    time.sleep(0.1)
+    cache.put("e", "e")
+    assert len(os.listdir(directory)) == 1
+
+
+def test_if_then_memoized() -> None:
+    submitted = []
+    pipeline = {
+        "type": "pipeline",
+        "name": "leaf",
+        "stages": [{"type": "job", "function": "antz.jobs.nop.nop", "parameters": {}}],
+    }
+    parameters = {
+        "function": f"{__name__}.is_positive",
+        "args": [3],
+        "if_true": pipeline,
+        "if_false": pipeline,
+        "memoize": True,
+    }
+    for _ in range(3):
+        status = if_then(
+            parameters,
+            submitted.append,
+            {},
+            PipelineConfig.model_validate(pipeline),
+            logger,
+        )
+        assert status == Status.FINAL
+    assert len(submitted) == 3
+    assert calls == [(3,)]
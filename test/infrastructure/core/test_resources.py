@@ -0,0 +1,131 @@
+"""Test that worker resources are created once, injected by name and torn down"""
+
+import contextlib
+import logging
+
+import pytest
+
+from antz.infrastructure.config.base import JobConfig, ResourceConfig
+from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.job import run_job
+from antz.infrastructure.core.resources import (
+    close_resources,
+    configure_resources,
+    get_resources,
+)
+from antz.infrastructure.core.status import Status
+
+logger = logging.getLogger("test")
+logger.setLevel(100000)
+
+events: list[str] = []
+
+
+def make_table(size: int) -> dict[int, int]:
+    """A plain resource"""
+    events.append("make_table")
+    return {i: i * i for i in range(size)}
+
+
+def make_connection(name: str):
+    """A resource torn down by resuming the generator"""
+    events.append(f"open {name}")
+    yield {"name": name}
+    events.append(f"close {name}")
+
+
+@contextlib.contextmanager
+def make_model():
+    """A resource torn down by exiting the context"""
+    events.append("load model")
+    yield "model"
+    events.append("unload model")
+
+
+@simple_job
+def square(parameters, logger, resources) -> Status:
+    """Check the table squares the value"""
+    del logger
+    table = resources["table"]
+    return Status.SUCCESS if table[parameters["value"]] == 9 else Status.ERROR
+
+
+@pytest.fixture(autouse=True)
+def declare_resources():
+    """Declare the test resources for each test"""
+    events.clear()
+    configure_resources(
+        {
+            "table": ResourceConfig.model_validate(
+                {
+                    "function": "test.infrastructure.core.test_resources.make_table",
+                    "parameters": {"size": 10},
+                }
+            ),
+            "connection": ResourceConfig.model_validate(
+                {
+                    "function": "test.infrastructure.core.test_resources.make_connection",
+                    "parameters": {"name": "db"},
+                }
+            ),
+            "model": ResourceConfig.model_validate(
+                {"function": "test.infrastructure.core.test_resources.make_model"}
+            ),
+        }
+    )
+    yield
+    close_resources(logger)
+
+
+def test_created_lazily_once() -> None:
+    assert not events
+    first = get_resources(["table"])
+    second = get_resources(["table"])
+    assert first["table"] is second["table"]
+    assert events == ["make_table"]
+
+
+def test_torn_down_in_reverse_order() -> None:
+    resources = get_resources(["connection", "model", "table"])
+    assert resources["connection"] == {"name": "db"}
+    assert resources["model"] == "model"
+
+    close_resources(logger)
+    assert events == [
+        "open db",
+        "load model",
+        "make_table",
+        "unload model",
+        "close db",
+    ]
+
+
+def test_unknown_resource() -> None:
+    with pytest.raises(KeyError):
+        get_resources(["nothing"])
+
+
+def test_injected_into_job() -> None:
+    job_config = JobConfig.model_validate(
+        {
+            "type": "job",
+            "function": "test.infrastructure.core.test_resources.square",
+            "parameters": {"value": 3},
+            "resources": ["table"],
+        }
+    )
+    assert run_job(job_config, variables={}, logger=logger) == Status.SUCCESS
+    assert run_job(job_config, variables={}, logger=logger) == Status.SUCCESS
+    assert events == ["make_table"]
+
+
+def test_job_with_undeclared_resource() -> None:
+    job_config = JobConfig.model_validate(
+        {
+            "type": "job",
+            "function": "test.infrastructure.core.test_resources.square",
+            "parameters": {"value": 3},
+            "resources": ["nothing"],
+        }
+    )
+    assert run_job(job_config, variables={}, logger=logger) == Status.ERROR
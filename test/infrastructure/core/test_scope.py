@@ -0,0 +1,112 @@
+"""Test the layered variable scope"""
+
+import logging
+import pickle
+
+from antz.infrastructure.config.base import Config, MutableJobConfig
+from antz.infrastructure.config.job_decorators import mutable_job
+from antz.infrastructure.core.mutable_job import run_mutable_job
+from antz.infrastructure.core.scope import (
+    MAX_SCOPE_DEPTH,
+    MutableVariables,
+    VariableScope,
+)
+from antz.infrastructure.core.status import Status
+
+logger = logging.getLogger("test")
+logger.setLevel(100000)
+
+
+@mutable_job
+def set_in_place(parameters, variables, logger):
+    """Change the variables in place, as mutable jobs did with a copied dict"""
+    del parameters, logger
+    variables["a"] += 1
+    variables["c"] = "new"
+    del variables["b"]
+    return Status.SUCCESS, variables
+
+
+def test_set_does_not_change_outer_scope() -> None:
+    """Setting a variable returns a new scope and leaves the outer one alone"""
+
+    outer = VariableScope.from_mapping({"a": 1, "b": "hello"})
+    inner = outer.set("a", 2).set("c", True)
+
+    assert dict(outer) == {"a": 1, "b": "hello"}
+    assert dict(inner) == {"a": 2, "b": "hello", "c": True}
+    assert inner["a"] == 2
+    assert "c" in inner and "c" not in outer
+    assert len(inner) == 3
+
+
+def test_deep_scopes_are_squashed() -> None:
+    """Long chains of updates keep lookups bounded"""
+
+    scope = VariableScope.from_mapping({"counter": 0})
+    for i in range(MAX_SCOPE_DEPTH * 3):
+        scope = scope.set("counter", i)
+
+    assert scope["counter"] == MAX_SCOPE_DEPTH * 3 - 1
+    assert len(scope) == 1
+
+
+def test_serialization_is_flat() -> None:
+    """Pickling or dumping a scope only keeps the visible variables"""
+
+    scope = VariableScope.from_mapping({"a": 1}).update({"a": 2, "b": 3})
+
+    unpickled = pickle.loads(pickle.dumps(scope))
+    assert unpickled == {"a": 2, "b": 3}
+    assert isinstance(unpickled, VariableScope)
+
+    config = Config.model_validate(
+        {"variables": scope, "config": {"type": "pipeline", "stages": []}}
+    )
+    assert config.variables is scope  # no copy when validating a scope
+    assert config.model_dump()["variables"] == {"a": 2, "b": 3}
+
+
+def test_config_wraps_plain_mappings() -> None:
+    """Plain dicts are validated into scopes"""
+
+    config = Config.model_validate(
+        {"variables": {"a": 1, "b": "x"}, "config": {"type": "pipeline", "stages": []}}
+    )
+    assert isinstance(config.variables, VariableScope)
+    assert config.variables == {"a": 1, "b": "x"}
+
+
+def test_mutable_variables_record_changes() -> None:
+    """Changes are layered on the scope, which is left as it was"""
+    outer = VariableScope.from_mapping({"a": 1, "b": 2})
+    variables = MutableVariables(outer)
+    assert variables.to_scope() is outer
+
+    variables["a"] = 3
+    variables["c"] = 4
+    assert dict(variables) == {"a": 3, "b": 2, "c": 4}
+    assert dict(variables.to_scope()) == {"a": 3, "b": 2, "c": 4}
+
+    del variables["b"]
+    assert "b" not in variables and len(variables) == 2
+    assert dict(VariableScope.from_mapping(variables)) == {"a": 3, "c": 4}
+    assert dict(outer) == {"a": 1, "b": 2}
+
+
+def test_mutable_job_changes_variables_in_place() -> None:
+    """A mutable job may still set and delete variables in place"""
+    config = MutableJobConfig.model_validate(
+        {
+            "type": "mutable_job",
+            "function": "test.infrastructure.core.test_scope.set_in_place",
+            "parameters": {},
+        }
+    )
+    outer = VariableScope.from_mapping({"a": 1, "b": 2})
+    status, new_vars = run_mutable_job(config, outer, logger)
+
+    assert status == Status.SUCCESS
+    assert isinstance(new_vars, VariableScope)
+    assert dict(new_vars) == {"a": 2, "c": "new"}
+    assert dict(outer) == {"a": 1, "b": 2}
@@ -0,0 +1,132 @@
+"""Test sharding of large fan-outs"""
+
+import logging
+import queue
+
+import pytest
+
+from antz.infrastructure.config.base import Config
+from antz.infrastructure.core.manager import run_manager
+from antz.infrastructure.core.sharding import shard_ranges
+
+logger = logging.getLogger("test")
+logger.setLevel(100000)  # don't log in tests
+
+
+@pytest.mark.parametrize(
+    "start,stop,num_shards,min_shard_size,expected",
+    [
+        (0, 10, 2, 1, [(0, 5), (5, 10)]),
+        (0, 10, 3, 1, [(0, 4), (4, 7), (7, 10)]),
+        (0, 10, 4, 5, [(0, 5), (5, 10)]),
+        (0, 3, 4, 5, [(0, 3)]),
+        (5, 5, 4, 1, [(5, 5)]),
+    ],
+)
+def test_shard_ranges(start, stop, num_shards, min_shard_size, expected) -> None:
+    """Test that ranges are split evenly and never below the minimum size"""
+    assert shard_ranges(start, stop, num_shards, min_shard_size) == expected
+
+
+def test_recursive_sharded_explode() -> None:
+    """Shards are run like any other pipeline and together cover every pipeline"""
+    test_queue: queue.Queue = queue.Queue()
+
+    def submit_fn(config: Config) -> None:
+        test_queue.put(config)
+
+    config = Config.model_validate(
+        {
+            "variables": {"a": 1},
+            "config": {
+                "type": "pipeline",
+                "stages": [
+                    {
+                        "type": "submitter_job",
+                        "function": "antz.jobs.explode_pipeline.explode_pipeline",
+                        "parameters": {
+                            "num_pipelines": 100,
+                            "num_shards": 3,
+                            "min_shard_size": 10,
+                            "recursive_shards": True,
+                            "pipeline_config_template": {
+                                "type": "pipeline",
+                                "name": "leaf",
+                                "stages": [
+                                    {
+                                        "type": "job",
+                                        "function": "antz.jobs.nop.nop",
+                                        "parameters": {},
+                                    }
+                                ],
+                            },
+                        },
+                    }
+                ],
+            },
+        }
+    )
+
+    run_manager(config, submit_fn, logger)
+
+    num_shards_run = 0
+    pipeline_ids = []
+    while not test_queue.empty():
+        next_config = test_queue.get()
+        if next_config.config.name == "leaf":
+            assert next_config.variables["a"] == 1
+            pipeline_ids.append(next_config.variables["PIPELINE_ID"])
+        else:
+            num_shards_run += 1
+            run_manager(next_config, submit_fn, logger)
+
+    assert sorted(pipeline_ids) == list(range(100))
+    assert num_shards_run > 3  # shards were sharded again
+
+
+def test_sharded_template_is_not_resolved() -> None:
+    """The variables of the children's stages are left for the children to resolve"""
+    test_queue: queue.Queue = queue.Queue()
+
+    config = Config.model_validate(
+        {
+            "variables": {},
+            "config": {
+                "type": "pipeline",
+                "stages": [
+                    {
+                        "type": "submitter_job",
+                        "function": "antz.jobs.explode_pipeline.explode_pipeline",
+                        "parameters": {
+                            "num_pipelines": 4,
+                            "num_shards": 2,
+                            "min_shard_size": 1,
+                            "pipeline_config_template": {
+                                "type": "pipeline",
+                                "name": "leaf",
+                                "stages": [
+                                    {
+                                        "type": "job",
+                                        "function": "antz.jobs.nop.nop",
+                                        "parameters": {"x": "%{PIPELINE_ID}"},
+                                    }
+                                ],
+                            },
+                        },
+                    }
+                ],
+            },
+        }
+    )
+
+    run_manager(config, test_queue.put, logger)
+
+    leaf_parameters = []
+    while not test_queue.empty():
+        next_config = test_queue.get()
+        if next_config.config.name == "leaf":
+            leaf_parameters.append(next_config.config.stages[0].parameters)
+        else:
+            run_manager(next_config, test_queue.put, logger)
+
+    assert leaf_parameters == [{"x": "%{PIPELINE_ID}"}] * 4
@@ -0,0 +1,144 @@
+"""Test that inputs are staged once, evicted by size and rewritten into parameters"""
+
+import logging
+import os
+
+import pytest
+
+from antz.infrastructure.config.base import JobConfig
+from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.job import run_job
+from antz.infrastructure.core.staging import (
+    StagingCache,
+    close_staging,
+    configure_staging,
+    staged_parameters,
+)
+from antz.infrastructure.core.status import Status
+
+logger = logging.getLogger("test")
+logger.setLevel(100000)
+
+seen_paths: list[str] = []
+
+
+@simple_job
+def read_input(parameters, logger) -> Status:
+    """Record the path it was given and check it has the contents"""
+    del logger
+    seen_paths.append(parameters["path"])
+    with open(parameters["path"], "r", encoding="utf-8") as fh:
+        return Status.SUCCESS if fh.read() == "input" else Status.ERROR
+
+
+def _write(path, text: str) -> str:
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    return os.fspath(path)
+
+
+@pytest.fixture
+def staging_dir(tmpdir):
+    configure_staging(os.path.join(tmpdir, "scratch"), 2**20)
+    yield os.path.join(tmpdir, "scratch")
+    close_staging(logger)
+
+
+def test_staged_once(tmpdir, staging_dir) -> None:
+    source = _write(tmpdir.join("input.txt"), "input")
+    job_config = JobConfig.model_validate(
+        {
+            "type": "job",
+            "function": "test.infrastructure.core.test_staging.read_input",
+            "parameters": {"path": "%{data_dir}/input.txt"},
+            "stage_inputs": ["path"],
+        }
+    )
+    seen_paths.clear()
+    for _ in range(2):
+        status = run_job(job_config, variables={"data_dir": str(tmpdir)}, logger=logger)
+        assert status == Status.SUCCESS
+
+    assert seen_paths[0] == seen_paths[1]
+    assert seen_paths[0] != source
+    assert seen_paths[0].startswith(staging_dir)
+    assert os.path.basename(seen_paths[0]) == "input.txt"
+
+
+def test_changed_source_is_restaged(tmpdir, staging_dir) -> None:
+    del staging_dir
+    source = _write(tmpdir.join("input.txt"), "first")
+    with staged_parameters({"path": source}, ["path"], logger) as staged:
+        first = staged["path"]
+    os.utime(source, ns=(0, 0))
+    _write(source, "second")
+    with staged_parameters({"path": source}, ["path"], logger) as staged:
+        second = staged["path"]
+        with open(second, "r", encoding="utf-8") as fh:
+            assert fh.read() == "second"
+    assert first != second
+
+
+def test_nested_lists_and_directories(tmpdir, staging_dir) -> None:
+    del staging_dir
+    os.makedirs(tmpdir.join("tree", "sub"))
+    _write(tmpdir.join("tree", "sub", "a.txt"), "a")
+    single = _write(tmpdir.join("b.txt"), "b")
+    parameters = {"inputs": {"paths": [os.fspath(tmpdir.join("tree")), single]}}
+
+    with staged_parameters(parameters, ["inputs.paths"], logger) as staged:
+        tree, file = staged["inputs"]["paths"]
+        with open(os.path.join(tree, "sub", "a.txt"), "r", encoding="utf-8") as fh:
+            assert fh.read() == "a"
+        with open(file, "r", encoding="utf-8") as fh:
+            assert fh.read() == "b"
+    assert parameters["inputs"]["paths"][1] == single
+
+
+def test_lru_eviction_skips_pinned(tmpdir) -> None:
+    cache = StagingCache(os.fspath(tmpdir.join("scratch")), 10)
+    first = _write(tmpdir.join("first"), "12345")
+    second = _write(tmpdir.join("second"), "12345")
+    third = _write(tmpdir.join("third"), "12345")
+
+    pinned: list = []
+    staged_first = cache.stage(first, pinned)
+    cache.release(pinned)
+    pinned = []
+    staged_second = cache.stage(second, pinned)
+
+    # first is evicted to make room, second is in use so it is kept
+    staged_third = cache.stage(third, [])
+    assert not os.path.exists(staged_first)
+    assert os.path.exists(staged_second)
+    assert os.path.exists(staged_third)
+
+    # nothing can be evicted, so the source is used
+    assert cache.stage(first, []) == first
+    assert cache.num_misses == 4
+    cache.clear()
+
+
+def test_too_large_is_not_staged(tmpdir) -> None:
+    cache = StagingCache(os.fspath(tmpdir.join("scratch")), 4)
+    source = _write(tmpdir.join("big"), "12345")
+    assert cache.stage(source, []) == source
+
+
+def test_missing_input_fails_job(tmpdir, staging_dir) -> None:
+    del staging_dir
+    job_config = JobConfig.model_validate(
+        {
+            "type": "job",
+            "function": "test.infrastructure.core.test_staging.read_input",
+            "parameters": {"path": os.fspath(tmpdir.join("missing"))},
+            "stage_inputs": ["path"],
+        }
+    )
+    assert run_job(job_config, variables={}, logger=logger) == Status.ERROR
+
+
+def test_disabled_passes_through(tmpdir) -> None:
+    source = _write(tmpdir.join("input.txt"), "input")
+    with staged_parameters({"path": source}, ["path"], logger) as staged:
+        assert staged["path"] == source
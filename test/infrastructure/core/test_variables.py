@@ -2,12 +2,16 @@
 
 from typing import Mapping
 
+import pandas as pd
 import pytest
 
-from antz.infrastructure.config.base import PrimitiveType
+from antz.infrastructure.config.base import JobConfig, PipelineConfig, PrimitiveType
 from antz.infrastructure.core.variables import (VARIABLE_PATTERN,
+                                                _infer_type,
                                                 _resolve_value,
-                                                resolve_variables)
+                                                find_token_paths,
+                                                resolve_variables,
+                                                resolve_variables_batch)
 
 
 def test_regex_pattern() -> None:
@@ -108,3 +112,147 @@ def test_parameter_variable_expressions() -> None:
     }
 
     assert output_parameters == resolve_variables(input_parameters, variables=variables)
+
+
+def test_nested_parameters_replacement() -> None:
+    """Test that variables are resolved at any depth of the parameters"""
+
+    static_block = {"x": [1, 2, 3], "y": {"z": "no tokens here"}}
+    parameters = {
+        "static": static_block,
+        "nested": {"a": "%{a}", "deeper": {"list": ["%{c}", 1, ["%{b}bye"]]}},
+        "top": "%{d}",
+    }
+
+    resolved = resolve_variables(parameters, variables=_variables)
+
+    assert resolved == {
+        "static": static_block,
+        "nested": {"a": 1, "deeper": {"list": ["hello", 1, ["2bye"]]}},
+        "top": 0.123,
+    }
+    # untouched subtrees are shared, not copied
+    assert resolved["static"] is static_block
+    # the original parameters are not modified
+    assert parameters["nested"]["a"] == "%{a}"
+
+
+def test_token_paths() -> None:
+    """Test that only the leaves with tokens are in the token paths"""
+
+    parameters = {
+        "a": "%{x}",
+        "b": 1,
+        "c": {"d": ["e", "%{y}"], "f": "g"},
+        "h": {"i": "j"},
+    }
+
+    assert find_token_paths(parameters) == {"a": None, "c": {"d": {1: None}}}
+
+
+def test_static_parameters_are_returned_as_is() -> None:
+    """Parameters without any tokens do not need to be copied"""
+
+    parameters = {"a": 1, "b": {"c": ["d"]}}
+    assert resolve_variables(parameters, variables=_variables) is parameters
+
+
+def test_nested_configs_are_not_resolved() -> None:
+    """Nested pipelines are their own scope and resolve their own variables"""
+
+    job_config = JobConfig.model_validate(
+        {
+            "type": "job",
+            "function": "antz.jobs.nop.nop",
+            "parameters": {
+                "nested": {"value": "%{a}"},
+                "pipeline": {
+                    "type": "pipeline",
+                    "stages": [
+                        {
+                            "type": "job",
+                            "function": "antz.jobs.nop.nop",
+                            "parameters": {"value": "%{a}"},
+                        }
+                    ],
+                },
+            },
+        }
+    )
+    assert isinstance(job_config.parameters["pipeline"], PipelineConfig)
+
+    resolved = resolve_variables(
+        job_config.parameters, variables=_variables, cache_key=job_config.id
+    )
+
+    assert resolved["nested"] == {"value": 1}
+    assert resolved["pipeline"] is job_config.parameters["pipeline"]
+
+
+def test_reused_cache_key_with_other_parameters() -> None:
+    """Parameters cached under a key are not resolved with the paths of others"""
+    variables = {"a": 1}
+    assert resolve_variables({"p": "%{a}", "q": 1}, variables, cache_key="job1") == {
+        "p": 1,
+        "q": 1,
+    }
+    assert resolve_variables({"q": "%{a}"}, variables, cache_key="job1") == {"q": 1}
+    assert resolve_variables({"p": {"x": "%{a}"}}, variables, cache_key="job1") == {
+        "p": {"x": 1}
+    }
+
+
+def test_batch_resolution_matches_row_resolution() -> None:
+    """Resolving a whole table at once gives the same result as row by row"""
+
+    table = pd.DataFrame(
+        {
+            "a": [1, 2, 3],
+            "c": ["x", "y", "true"],
+            "d": [0.5, 1.5, 2.5],
+        }
+    )
+    parameters = {
+        "whole": "%{a}",
+        "mixed": "run_%{c}_%{a}",
+        "math": "%{a * b - d}",
+        "outer_only": "%{bb}",
+        "inferred": "%{c}",
+        "nested": {"list": ["%{d}", "static"]},
+        "static": 1,
+    }
+
+    resolved = resolve_variables_batch(parameters, table, variables=_variables)
+
+    assert len(resolved) == len(table)
+    for row, row_resolved in zip(table.to_dict(orient="records"), resolved):
+        assert row_resolved == resolve_variables(
+            parameters, variables={**_variables, **row}
+        )
+
+
+def test_batch_resolution_bad_arithmetic() -> None:
+    """Arithmetic on a column of strings is an error, like for a single row"""
+
+    table = pd.DataFrame({"a": ["x", "y"]})
+    with pytest.raises(RuntimeError):
+        resolve_variables_batch({"bad": "%{a * b}"}, table, variables=_variables)
+
+
+def test_whole_expression_keeps_native_type() -> None:
+    """A value that is exactly one expression keeps the type of the variable"""
+
+    variables = {"x": 1 / 3, "big": 2**70, "flag": True, "s": "007", "t": "t"}
+
+    assert _resolve_value("%{x}", variables=variables) == 1 / 3
+    assert _resolve_value("%{big}", variables=variables) == 2**70
+    assert _resolve_value("%{flag}", variables=variables) is True
+    assert _resolve_value("%{s}", variables=variables) == 7  # strings are still inferred
+    assert _resolve_value("%{t}", variables=variables) == "t"
+
+
+@pytest.mark.parametrize("given", ["", "t", "ru", "e", "fals", "als"])
+def test_partial_booleans_are_not_inferred(given) -> None:
+    """Only whole 'true'/'false' strings are booleans"""
+
+    assert _infer_type(given) == given
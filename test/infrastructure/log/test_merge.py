@@ -0,0 +1,130 @@
+"""Test that sharded logs are written per worker and merged in order"""
+
+import json
+import logging
+import os
+
+import pytest
+
+from antz.infrastructure.config.base import LoggingConfig
+from antz.infrastructure.log.merge import find_shards, merge_shards
+from antz.infrastructure.log.multiproc_logging import get_worker_logger, log_context
+from antz.run import main
+
+
+def _write_shard(path, mono_times: list[int], pipeline_id: str = "p") -> None:
+    with open(path, "w", encoding="utf-8") as fh:
+        for mono_ns in mono_times:
+            record = {"mono_ns": mono_ns, "pipeline_id": pipeline_id}
+            fh.write(json.dumps(record) + "\n")
+
+
+def _read_times(path) -> list[int]:
+    with open(path, "r", encoding="utf-8") as fh:
+        return [json.loads(line)["mono_ns"] for line in fh]
+
+
+def test_sharded_records(tmpdir) -> None:
+    config = LoggingConfig(type="sharded", level=logging.INFO, directory=str(tmpdir))
+    logger = get_worker_logger("test_sharded", None, config)
+    logger.info("outside")
+    with log_context(pipeline_id="pipe", job_id=None):
+        with log_context(job_id="job"):
+            logger.info("inside %d", 1)
+    logger.debug("filtered")
+
+    (shard,) = os.listdir(tmpdir)
+    assert shard == f"antz_{os.getpid()}.jsonl"
+    with open(os.path.join(tmpdir, shard), "r", encoding="utf-8") as fh:
+        outside, inside = [json.loads(line) for line in fh]
+    assert outside["message"] == "outside"
+    assert "pipeline_id" not in outside
+    assert inside["message"] == "inside 1"
+    assert inside["pipeline_id"] == "pipe"
+    assert inside["job_id"] == "job"
+    assert inside["mono_ns"] > outside["mono_ns"]
+
+
+def test_shard_moved_with_directory(tmpdir) -> None:
+    """A logger requested with another directory writes its shard there"""
+    config = LoggingConfig(
+        type="sharded", level=logging.INFO, directory=str(tmpdir.join("first"))
+    )
+    logger = get_worker_logger("test_moved", None, config)
+    logger.warning("first")
+    assert get_worker_logger("test_moved", None, config) is logger
+
+    config = LoggingConfig(
+        type="sharded", level=logging.INFO, directory=str(tmpdir.join("second"))
+    )
+    get_worker_logger("test_moved", None, config)
+    logger.warning("second")
+
+    assert len(logger.handlers) == 1
+    for directory, message in (("first", "first"), ("second", "second")):
+        (shard,) = os.listdir(tmpdir.join(directory))
+        with open(tmpdir.join(directory, shard), "r", encoding="utf-8") as fh:
+            assert [json.loads(line)["message"] for line in fh] == [message]
+
+
+def test_merge_in_order_with_backups(tmpdir) -> None:
+    _write_shard(tmpdir.join("antz_1.jsonl.2"), [1, 4])
+    _write_shard(tmpdir.join("antz_1.jsonl.1"), [6])
+    _write_shard(tmpdir.join("antz_1.jsonl"), [9])
+    _write_shard(tmpdir.join("antz_2.jsonl"), [2, 3, 7, 8])
+    with open(tmpdir.join("antz_2.jsonl"), "a", encoding="utf-8") as fh:
+        fh.write('{"mono_ns": 10, "trunc')  # killed while writing
+    _write_shard(tmpdir.join("other.txt"), [5])
+
+    assert find_shards([str(tmpdir)]) == [
+        [
+            os.path.join(tmpdir, "antz_1.jsonl.2"),
+            os.path.join(tmpdir, "antz_1.jsonl.1"),
+            os.path.join(tmpdir, "antz_1.jsonl"),
+        ],
+        [os.path.join(tmpdir, "antz_2.jsonl")],
+    ]
+
+    output = tmpdir.join("merged.jsonl")
+    with open(output, "w", encoding="utf-8") as fh:
+        assert merge_shards([str(tmpdir)], fh) == 8
+    assert _read_times(output) == [1, 2, 3, 4, 6, 7, 8, 9]
+
+
+def test_merge_filters_pipeline(tmpdir) -> None:
+    _write_shard(tmpdir.join("antz_1.jsonl"), [1, 3], pipeline_id="a")
+    _write_shard(tmpdir.join("antz_2.jsonl"), [2], pipeline_id="b")
+
+    output = tmpdir.join("merged.jsonl")
+    main(
+        [
+            "logs",
+            "merge",
+            str(tmpdir.join("antz_1.jsonl")),
+            str(tmpdir.join("antz_2.jsonl")),
+            "--pipeline-id",
+            "a",
+            "-o",
+            str(output),
+        ]
+    )
+    assert _read_times(output) == [1, 3]
+
+
+def test_not_a_shard(tmpdir) -> None:
+    _write_shard(tmpdir.join("other.txt"), [1])
+    with pytest.raises(ValueError):
+        find_shards([str(tmpdir.join("other.txt"))])
+
+
+@pytest.mark.parametrize("name", ["other.txt", "antz_1.jsonl"])
+def test_merge_bad_path_is_usage_error(tmpdir, capsys, name) -> None:
+    """A path which is not a shard, or does not exist, is reported without a trace"""
+    _write_shard(tmpdir.join("other.txt"), [1])
+    output = tmpdir.join("merged.jsonl")
+    output.write("kept")
+    with pytest.raises(SystemExit) as exc_info:
+        main(["logs", "merge", str(tmpdir.join(name)), "-o", str(output)])
+    assert exc_info.value.code == 2
+    assert name in capsys.readouterr().err
+    assert output.read() == "kept"
@@ -0,0 +1,106 @@
+"""Test that records are filtered, batched and written out by the listener"""
+
+import logging
+import os
+import queue
+
+from antz.infrastructure.config.base import LoggingConfig
+from antz.infrastructure.log.multiproc_logging import (
+    flush_logger,
+    get_listener,
+    get_worker_logger,
+)
+
+
+class CountingStr:
+    """Counts how often it is converted to a string"""
+
+    def __init__(self) -> None:
+        self.num_calls = 0
+
+    def __str__(self) -> str:
+        self.num_calls += 1
+        return "counted"
+
+
+def test_off() -> None:
+    config = LoggingConfig(type="off")
+    assert get_listener(config) == (None, None)
+    logger = get_worker_logger("test_off", None, config)
+    assert not logger.isEnabledFor(logging.CRITICAL)
+
+
+def test_level_filtered_before_formatting() -> None:
+    records: queue.Queue = queue.Queue()
+    logger = get_worker_logger(
+        "test_filtered", records, LoggingConfig(level=logging.INFO)
+    )
+    arg = CountingStr()
+    logger.debug("not formatted %s", arg)
+    flush_logger(logger)
+    assert arg.num_calls == 0
+    assert records.empty()
+
+
+def test_batches() -> None:
+    records: queue.Queue = queue.Queue()
+    logger = get_worker_logger(
+        "test_batches",
+        records,
+        LoggingConfig(level=logging.DEBUG, batch_size=2, flush_interval=60),
+    )
+    for num in range(3):
+        logger.info("record %d", num)
+    batch = records.get_nowait()
+    assert [record.getMessage() for record in batch] == ["record 0", "record 1"]
+    assert records.empty()
+
+    # errors are sent at once
+    logger.error("failed")
+    batch = records.get_nowait()
+    assert [record.getMessage() for record in batch] == ["record 2", "failed"]
+
+
+def test_written_to_file(tmpdir) -> None:
+    config = LoggingConfig(type="file", level=logging.INFO, directory=str(tmpdir))
+    log_queue, listener = get_listener(config)
+    assert listener is not None
+    listener.start()
+
+    logger = get_worker_logger("test_file", log_queue, config)
+    logger.info("first")
+    logger.warning("second")
+    flush_logger(logger)
+    listener.stop()
+
+    (file_name,) = os.listdir(tmpdir)
+    with open(os.path.join(tmpdir, file_name), "r", encoding="utf-8") as fh:
+        lines = fh.read().splitlines()
+    assert len(lines) == 2
+    assert lines[0].endswith("antz.test_file: first")
+    assert "WARNING" in lines[1]
+
+
+def test_handler_replaced() -> None:
+    """A logger requested with another queue or batching sends to the new one"""
+    first: queue.Queue = queue.Queue()
+    second: queue.Queue = queue.Queue()
+    config = LoggingConfig(level=logging.INFO, batch_size=1)
+    logger = get_worker_logger("test_replaced", first, config)
+    assert get_worker_logger("test_replaced", first, config) is logger
+    assert len(logger.handlers) == 1
+
+    get_worker_logger("test_replaced", second, config)
+    logger.info("to second")
+    assert first.empty()
+    assert second.get_nowait()[0].getMessage() == "to second"
+
+    (handler,) = logger.handlers
+    get_worker_logger("test_replaced", second, LoggingConfig(batch_size=5))
+    (new_handler,) = logger.handlers
+    assert new_handler is not handler
+    assert new_handler.batch_size == 5  # type: ignore[attr-defined]
+
+    get_worker_logger("test_replaced", None, LoggingConfig(type="off"))
+    get_worker_logger("test_replaced", second, config)
+    assert logger.isEnabledFor(logging.INFO)
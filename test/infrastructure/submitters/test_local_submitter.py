@@ -1,8 +1,11 @@
 """Test that the local submitter runner works"""
 
 import os
+import time
 
 import antz.run
+from antz.infrastructure.config.job_decorators import simple_job
+from antz.infrastructure.core.status import Status
 
 
 def test_local_submitter(tmpdir) -> None:
@@ -41,3 +44,59 @@ def test_local_submitter(tmpdir) -> None:
     with open(dst_file, "r", encoding='utf-8') as fh:
         ret = fh.read()
     assert ret == test_text
+
+
+@simple_job
+def record_pid(parameters, logger) -> Status:
+    """Write the pid of the worker running it, slowly enough for others to start"""
+    del logger
+    time.sleep(0.5)
+    with open(parameters["path"], "w", encoding="utf-8") as fh:
+        fh.write(str(os.getpid()))
+    return Status.SUCCESS
+
+
+def test_local_submitter_runs_pipelines_in_parallel(tmpdir) -> None:
+    """Fanned out pipelines are shared by num_concurrent_jobs workers"""
+    test_config = {
+        "submitter_config": {"type": "local", "num_concurrent_jobs": 3},
+        "analysis_config": {
+            "variables": {"dir": os.fspath(tmpdir)},
+            "config": {
+                "type": "pipeline",
+                "stages": [
+                    {
+                        "type": "submitter_job",
+                        "function": "antz.jobs.parameter_sweep.parameter_sweep",
+                        "parameters": {
+                            "sweep": [
+                                {
+                                    "type": "product",
+                                    "variables": {"i": {"start": 0, "stop": 6}},
+                                }
+                            ],
+                            "pipeline_config_template": {
+                                "type": "pipeline",
+                                "stages": [
+                                    {
+                                        "type": "job",
+                                        "function": "test.infrastructure.submitters"
+                                        ".test_local_submitter.record_pid",
+                                        "parameters": {"path": "%{dir}/%{i}.txt"},
+                                    }
+                                ],
+                            },
+                        },
+                    }
+                ],
+            },
+        },
+    }
+
+    antz.run.run(test_config)
+
+    pids = set()
+    for i in range(6):
+        with open(os.path.join(tmpdir, f"{i}.txt"), "r", encoding="utf-8") as fh:
+            pids.add(fh.read())
+    assert len(pids) > 1
@@ -0,0 +1,93 @@
+"""Test the archive job"""
+
+import filecmp
+import gzip
+import logging
+import os
+import tarfile
+
+import pytest
+
+from antz.infrastructure.core.status import Status
+from antz.jobs.archive import archive
+
+logger = logging.getLogger("test")
+logger.setLevel(100000)  # don't log in tests
+
+
+def _make_tree(root: str) -> None:
+    for num in range(30):
+        path = os.path.join(root, str(num % 4), f"{num}.bin")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            # compressible, and some larger than a block
+            fh.write(os.urandom(64) * (num * 1000 + 1))
+    os.makedirs(os.path.join(root, "empty"))
+    os.symlink("0/0.bin", os.path.join(root, "link"))
+
+
+def _assert_same_tree(left: str, right: str) -> None:
+    comparison = filecmp.dircmp(left, right)
+    assert not comparison.left_only and not comparison.right_only
+    for name in comparison.common_files:
+        assert filecmp.cmp(
+            os.path.join(left, name), os.path.join(right, name), shallow=False
+        )
+    for name in comparison.common_dirs:
+        _assert_same_tree(os.path.join(left, name), os.path.join(right, name))
+
+
+@pytest.mark.parametrize("extension", [".tar.gz", ".tar", ".zip"])
+def test_round_trip(tmpdir: str | os.PathLike[str], extension: str) -> None:
+    source = os.path.join(tmpdir, "output")
+    _make_tree(source)
+    archive_path = os.path.join(tmpdir, f"output{extension}")
+
+    params = {"archive": archive_path, "path": source, "block_size_mb": 1}
+    assert archive(params, logger) == Status.SUCCESS
+    assert not os.path.exists(f"{archive_path}.{os.getpid()}.tmp")
+
+    extracted = os.path.join(tmpdir, "extracted")
+    params = {"archive": archive_path, "path": extracted, "extract": True}
+    assert archive({**params, "block_size_mb": 1}, logger) == Status.SUCCESS
+    _assert_same_tree(source, os.path.join(extracted, "output"))
+
+
+def test_blocks_are_standard_gzip(tmpdir: str | os.PathLike[str]) -> None:
+    """The independently compressed blocks can be read by tarfile and gzip"""
+    source = os.path.join(tmpdir, "output")
+    _make_tree(source)
+    archive_path = os.path.join(tmpdir, "output.tgz")
+
+    params = {"archive": archive_path, "path": source, "block_size_mb": 1}
+    assert archive(params, logger) == Status.SUCCESS
+
+    with gzip.open(archive_path, "rb") as fh:
+        assert fh.read().count(b"ustar") > 30
+    with tarfile.open(archive_path, "r:gz") as tar:
+        names = tar.getnames()
+    assert "output/3/27.bin" in names
+    assert len(names) == 37
+
+
+def test_unsafe_member(tmpdir: str | os.PathLike[str]) -> None:
+    archive_path = os.path.join(tmpdir, "evil.tar")
+    victim = os.path.join(tmpdir, "victim")
+    with open(victim, "wb") as fh:
+        fh.write(b"safe")
+    with tarfile.open(archive_path, "w") as tar:
+        tar.add(victim, arcname="../victim")
+
+    params = {
+        "archive": archive_path,
+        "path": os.path.join(tmpdir, "out"),
+        "extract": True,
+    }
+    assert archive(params, logger) == Status.ERROR
+    with open(victim, "rb") as fh:
+        assert fh.read() == b"safe"
+
+
+def test_unknown_format(tmpdir: str | os.PathLike[str]) -> None:
+    params = {"archive": os.path.join(tmpdir, "a.rar"), "path": os.fspath(tmpdir)}
+    assert archive(params, logger) == Status.ERROR
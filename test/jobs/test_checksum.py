@@ -0,0 +1,105 @@
+"""Test the checksum job"""
+
+import hashlib
+import json
+import logging
+import os
+
+import pytest
+from pydantic import ValidationError
+
+from antz.infrastructure.core.status import Status
+from antz.jobs.checksum import Parameters, checksum, hash_file
+
+logger = logging.getLogger("test")
+logger.setLevel(100000)  # don't log in tests
+
+
+def _write_tree(root: str) -> dict[str, bytes]:
+    contents = {
+        "a.bin": os.urandom(3 * 2**20 + 7),
+        "empty": b"",
+        os.path.join("sub", "b.txt"): b"hello",
+    }
+    for name, data in contents.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(data)
+    return contents
+
+
+def test_hash_file_matches_hashlib(tmpdir: str | os.PathLike[str]) -> None:
+    contents = _write_tree(os.fspath(tmpdir))
+    for name, data in contents.items():
+        path = os.path.join(tmpdir, name)
+        assert hash_file(path, "sha256", 2**20) == (
+            len(data),
+            hashlib.sha256(data).hexdigest(),
+        )
+
+
+def test_write_and_verify(tmpdir: str | os.PathLike[str]) -> None:
+    root = os.path.join(tmpdir, "data")
+    manifest = os.path.join(tmpdir, "manifest.json")
+    contents = _write_tree(root)
+
+    params = {"paths": root, "manifest": manifest, "chunk_size_mb": 1}
+    assert checksum(params, logger) == Status.SUCCESS
+    with open(manifest, "r", encoding="utf-8") as fh:
+        files = json.load(fh)["files"]
+    assert files[os.path.join(root, "sub", "b.txt")] == {
+        "size": 5,
+        "digest": hashlib.blake2b(b"hello").hexdigest(),
+    }
+    assert len(files) == len(contents)
+
+    params = {"manifest": manifest, "verify": True}
+    assert checksum(params, logger) == Status.SUCCESS
+
+    # same size, different contents
+    with open(os.path.join(root, "sub", "b.txt"), "wb") as fh:
+        fh.write(b"world")
+    assert checksum(params, logger) == Status.ERROR
+
+    os.remove(os.path.join(root, "empty"))
+    assert checksum(params, logger) == Status.ERROR
+
+
+def test_glob_and_algorithm(tmpdir: str | os.PathLike[str]) -> None:
+    root = os.fspath(tmpdir)
+    _write_tree(root)
+    manifest = os.path.join(tmpdir, "manifest.json")
+
+    params = {"paths": [os.path.join(root, "*.bin")], "manifest": manifest}
+    assert checksum({**params, "algorithm": "md5"}, logger) == Status.SUCCESS
+    with open(manifest, "r", encoding="utf-8") as fh:
+        saved = json.load(fh)
+    assert saved["algorithm"] == "md5"
+    assert list(saved["files"]) == [os.path.join(root, "a.bin")]
+
+    with pytest.raises(ValidationError):
+        Parameters.model_validate({**params, "algorithm": "nope"})
+
+
+@pytest.mark.parametrize("missing", ["nope.bin", "*.nope"])
+def test_missing_path_fails(tmpdir: str | os.PathLike[str], missing: str) -> None:
+    """A path which does not exist or a glob which matches nothing is an error"""
+    root = os.fspath(tmpdir)
+    _write_tree(root)
+    manifest = os.path.join(tmpdir, "manifest.json")
+
+    params = {"paths": [os.path.join(root, "a.bin"), os.path.join(root, missing)]}
+    assert checksum({**params, "manifest": manifest}, logger) == Status.ERROR
+    assert not os.path.exists(manifest)
+
+
+def test_failed_write_leaves_no_tmp(tmpdir: str | os.PathLike[str]) -> None:
+    root = os.path.join(tmpdir, "data")
+    _write_tree(root)
+    # a directory cannot be replaced by the manifest file
+    manifest = os.path.join(tmpdir, "manifest.json")
+    os.makedirs(os.path.join(manifest, "taken"))
+
+    assert checksum({"paths": root, "manifest": manifest}, logger) == Status.ERROR
+    assert sorted(os.listdir(tmpdir)) == ["data", "manifest.json"]
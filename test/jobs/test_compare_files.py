@@ -0,0 +1,57 @@
+"""Test the compare_files job"""
+
+import logging
+import os
+import shutil
+
+from antz.infrastructure.core.status import Status
+from antz.jobs.compare_files import compare_files, files_equal
+
+logger = logging.getLogger("test")
+logger.setLevel(100000)  # don't log in tests
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(data)
+
+
+def test_files_equal(tmpdir: str | os.PathLike[str]) -> None:
+    data = os.urandom(2**16 + 3)
+    left = os.path.join(tmpdir, "left")
+    right = os.path.join(tmpdir, "right")
+    _write(left, data)
+    _write(right, data)
+    assert files_equal(left, right, 2**10)
+
+    _write(right, data[:-1] + bytes([data[-1] ^ 1]))
+    assert not files_equal(left, right, 2**10)
+    _write(right, data[:-1])
+    assert not files_equal(left, right, 2**10)
+
+    _write(left, b"")
+    _write(right, b"")
+    assert files_equal(left, right, 2**10)
+
+
+def test_compare_directories(tmpdir: str | os.PathLike[str]) -> None:
+    left = os.path.join(tmpdir, "left")
+    right = os.path.join(tmpdir, "right")
+    for num in range(20):
+        _write(os.path.join(left, str(num % 3), f"{num}.bin"), os.urandom(1000))
+    shutil.copytree(left, right)
+
+    params = {"left": left, "right": right, "max_workers": 4}
+    assert compare_files(params, logger) == Status.SUCCESS
+
+    _write(os.path.join(right, "1", "4.bin"), os.urandom(1000))
+    assert compare_files(params, logger) == Status.ERROR
+
+    shutil.rmtree(right)
+    shutil.copytree(left, right)
+    _write(os.path.join(right, "extra"), b"")
+    assert compare_files(params, logger) == Status.ERROR
+
+    params = {"left": left, "right": os.path.join(right, "extra")}
+    assert compare_files(params, logger) == Status.ERROR
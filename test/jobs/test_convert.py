@@ -0,0 +1,199 @@
+"""Test the convert job"""
+
+import logging
+import os
+
+import pandas as pd
+import pytest
+
+from antz.infrastructure.core.status import Status
+from antz.jobs.convert import Parameters, convert, write_parquet
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+logger = logging.Logger("test")
+logger.setLevel(0)
+
+
+def _write_csv(path: str, num_rows: int, delimiter: str = ",") -> pd.DataFrame:
+    frame = pd.DataFrame(
+        {
+            "id": range(num_rows),
+            "value": [i / 2 for i in range(num_rows)],
+            "name": [f"row{i}" for i in range(num_rows)],
+        }
+    )
+    frame.to_csv(path, index=False, sep=delimiter)
+    return frame
+
+
+def test_csv_to_parquet(tmpdir: str | os.PathLike[str]) -> None:
+    src = os.path.join(tmpdir, "table.csv")
+    dst = os.path.join(tmpdir, "out", "table.parquet")
+    frame = _write_csv(src, 1050)
+
+    params = {"source": src, "destination": dst, "row_group_size": 100}
+    assert convert(params, logger) == Status.SUCCESS
+
+    metadata = pq.ParquetFile(dst).metadata
+    assert metadata.num_rows == 1050
+    assert metadata.num_row_groups == 11
+    assert metadata.row_group(0).num_rows == 100
+    assert metadata.row_group(10).num_rows == 50
+    pd.testing.assert_frame_equal(pd.read_parquet(dst), frame, check_dtype=False)
+    assert os.listdir(os.path.dirname(dst)) == ["table.parquet"]
+
+
+def test_small_blocks(tmpdir: str | os.PathLike[str]) -> None:
+    """Many csv blocks are regrouped into row groups"""
+    src = os.path.join(tmpdir, "table.csv")
+    dst = os.path.join(tmpdir, "table.parquet")
+    _write_csv(src, 50_000)
+
+    params = {
+        "source": src,
+        "destination": dst,
+        "block_size_mb": 1,
+        "row_group_size": 30_000,
+        "compression": "zstd",
+    }
+    assert convert(params, logger) == Status.SUCCESS
+
+    metadata = pq.ParquetFile(dst).metadata
+    assert metadata.num_rows == 50_000
+    assert [metadata.row_group(i).num_rows for i in range(2)] == [30_000, 20_000]
+    assert metadata.row_group(0).column(0).compression == "ZSTD"
+
+
+def test_columns_and_types(tmpdir: str | os.PathLike[str]) -> None:
+    src = os.path.join(tmpdir, "table.tsv")
+    dst = os.path.join(tmpdir, "table.parquet")
+    _write_csv(src, 10, delimiter="\t")
+
+    params = {
+        "source": src,
+        "destination": dst,
+        "columns": ["id", "value"],
+        "column_types": {"id": "int32", "value": "float32"},
+    }
+    assert convert(params, logger) == Status.SUCCESS
+
+    schema = pq.read_schema(dst)
+    assert schema.names == ["id", "value"]
+    assert str(schema.field("id").type) == "int32"
+    assert str(schema.field("value").type) == "float"
+
+
+def test_unknown_format(tmpdir: str | os.PathLike[str]) -> None:
+    src = os.path.join(tmpdir, "table.txt")
+    dst = os.path.join(tmpdir, "table.parquet")
+    _write_csv(src, 10)
+
+    params = {"source": src, "destination": dst}
+    assert convert(params, logger) == Status.ERROR
+
+    params = {"source": src, "destination": dst, "source_format": "csv"}
+    assert convert(params, logger) == Status.SUCCESS
+
+
+def test_bad_csv_leaves_no_file(tmpdir: str | os.PathLike[str]) -> None:
+    src = os.path.join(tmpdir, "table.csv")
+    dst = os.path.join(tmpdir, "table.parquet")
+    with open(src, "w", encoding="utf-8") as fh:
+        fh.write("a,b\n1,2\n3\n")
+
+    assert convert({"source": src, "destination": dst}, logger) == Status.ERROR
+    assert os.listdir(tmpdir) == ["table.csv"]
+
+
+def test_csv_type_changed_after_first_block(
+    tmpdir: str | os.PathLike[str], caplog: pytest.LogCaptureFixture
+) -> None:
+    """csv types are fixed by the first block; the error names column_types"""
+    src = os.path.join(tmpdir, "table.csv")
+    dst = os.path.join(tmpdir, "table.parquet")
+    frame = pd.DataFrame({"id": [str(i) for i in range(200_000)] + ["x1"]})
+    frame.to_csv(src, index=False)
+
+    pa = pytest.importorskip("pyarrow")
+    params = {"source": src, "destination": dst, "block_size_mb": 1}
+    logger.addHandler(caplog.handler)
+    try:
+        assert convert(params, logger) == Status.ERROR
+    finally:
+        logger.removeHandler(caplog.handler)
+    assert "column_types" in str(caplog.records[-1].exc_info[1])
+    params["column_types"] = {"id": "string"}
+    assert convert(params, logger) == Status.SUCCESS
+    assert pq.read_table(dst).schema.field("id").type == pa.string()
+    assert pq.read_table(dst).num_rows == len(frame)
+
+
+def test_xlsx_to_parquet(tmpdir: str | os.PathLike[str]) -> None:
+    pytest.importorskip("openpyxl")
+    src = os.path.join(tmpdir, "table.xlsx")
+    dst = os.path.join(tmpdir, "table.parquet")
+    frame = pd.DataFrame({"id": range(25), "name": [f"row{i}" for i in range(25)]})
+    frame.to_excel(src, index=False)
+
+    params = {"source": src, "destination": dst, "chunk_size": 10}
+    assert convert(params, logger) == Status.SUCCESS
+    pd.testing.assert_frame_equal(pd.read_parquet(dst), frame, check_dtype=False)
+
+
+def test_hdf5_to_parquet(tmpdir: str | os.PathLike[str]) -> None:
+    pytest.importorskip("tables")
+    src = os.path.join(tmpdir, "table.h5")
+    dst = os.path.join(tmpdir, "table.parquet")
+    frame = pd.DataFrame({"id": range(25), "value": [i / 2 for i in range(25)]})
+    frame.to_hdf(src, key="data", format="table")
+
+    params = {"source": src, "destination": dst, "chunk_size": 10}
+    assert convert(params, logger) == Status.SUCCESS
+    pd.testing.assert_frame_equal(pd.read_parquet(dst), frame, check_dtype=False)
+
+
+def _frames_to_tables(*frames: pd.DataFrame) -> list:
+    pa = pytest.importorskip("pyarrow")
+    return [pa.Table.from_pandas(frame, preserve_index=False) for frame in frames]
+
+
+def test_types_widened_across_chunks(tmpdir: str | os.PathLike[str]) -> None:
+    """A null column takes the type of later chunks, ints become floats or strings"""
+    dst = os.path.join(tmpdir, "table.parquet")
+    tables = _frames_to_tables(
+        pd.DataFrame({"note": [None, None], "num": [1, 2], "code": [1, 2]}),
+        pd.DataFrame({"note": ["a", "b"], "num": [0.5, 1.5], "code": ["x", "y"]}),
+    )
+    params = Parameters(source="in.xlsx", destination=dst)
+    assert write_parquet(iter(tables), dst, params) == 4
+
+    table = pq.read_table(dst)
+    assert table.column("note").to_pylist() == [None, None, "a", "b"]
+    assert table.column("num").to_pylist() == [1.0, 2.0, 0.5, 1.5]
+    assert table.column("code").to_pylist() == ["1", "2", "x", "y"]
+
+
+def test_types_changed_after_row_group(tmpdir: str | os.PathLike[str]) -> None:
+    """A type which cannot be cast to the written schema names column_types"""
+    dst = os.path.join(tmpdir, "table.parquet")
+    tables = _frames_to_tables(
+        pd.DataFrame({"note": [None, None]}), pd.DataFrame({"note": ["a", "b"]})
+    )
+    params = Parameters(source="in.xlsx", destination=dst, row_group_size=2)
+    with pytest.raises(RuntimeError, match="column_types"):
+        write_parquet(iter(tables), dst, params)
+
+
+def test_xlsx_null_then_string_column(tmpdir: str | os.PathLike[str]) -> None:
+    pytest.importorskip("openpyxl")
+    src = os.path.join(tmpdir, "table.xlsx")
+    dst = os.path.join(tmpdir, "table.parquet")
+    frame = pd.DataFrame(
+        {"id": range(25), "note": [None] * 10 + [f"row{i}" for i in range(15)]}
+    )
+    frame.to_excel(src, index=False)
+
+    params = {"source": src, "destination": dst, "chunk_size": 10}
+    assert convert(params, logger) == Status.SUCCESS
+    assert pq.read_table(dst).column("note").to_pylist() == frame["note"].tolist()
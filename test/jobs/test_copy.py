@@ -149,3 +149,191 @@ def test_copy_file_to_existing_dir(tmpdir: str | os.PathLike[str]) -> None:
 
     assert os.path.exists(dst_dir)
     assert not os.path.exists(dst_file)
+
+
+def _write_tree(root: str, num_dirs: int, num_files: int) -> dict[str, str]:
+    contents = {}
+    for dir_num in range(num_dirs):
+        dir_path = os.path.join(root, *[f"d{i}" for i in range(dir_num + 1)])
+        os.makedirs(dir_path, exist_ok=True)
+        for file_num in range(num_files):
+            rel_path = os.path.relpath(os.path.join(dir_path, f"f{file_num}"), root)
+            contents[rel_path] = "".join(
+                random.choice(string.ascii_uppercase)
+                for _ in range(random.randint(0, FILE_LENGTH_MAX))
+            )
+            with open(os.path.join(root, rel_path), "w") as fh:
+                fh.write(contents[rel_path])
+    return contents
+
+
+def _read_tree(root: str) -> dict[str, str]:
+    contents = {}
+    for dir_path, _, files in os.walk(root):
+        for file in files:
+            with open(os.path.join(dir_path, file)) as fh:
+                contents[os.path.relpath(os.path.join(dir_path, file), root)] = fh.read()
+    return contents
+
+
+def test_copy_nested_dir_parallel(tmpdir: str | os.PathLike[str]) -> None:
+    src_dir = os.path.join(tmpdir, "a")
+    dst_dir = os.path.join(tmpdir, "b", "c")
+    contents = _write_tree(src_dir, num_dirs=4, num_files=30)
+
+    copy_params = {"source": src_dir, "destination": dst_dir, "max_workers": 3}
+    assert copy(copy_params, logger) == Status.SUCCESS
+
+    assert _read_tree(dst_dir) == contents
+    src_file = os.path.join(src_dir, "d0", "f0")
+    dst_file = os.path.join(dst_dir, "d0", "f0")
+    assert os.stat(src_file).st_mtime == os.stat(dst_file).st_mtime
+
+
+def test_copy_glob_and_list_sources(tmpdir: str | os.PathLike[str]) -> None:
+    src_dir = os.path.join(tmpdir, "a")
+    dst_dir = os.path.join(tmpdir, "b")
+    contents = _write_tree(src_dir, num_dirs=2, num_files=3)
+
+    copy_params = {"source": os.path.join(src_dir, "d0", "*"), "destination": dst_dir}
+    assert copy(copy_params, logger) == Status.SUCCESS
+    assert sorted(os.listdir(dst_dir)) == ["d1", "f0", "f1", "f2"]
+    assert _read_tree(os.path.join(dst_dir, "d1")) == {
+        name: contents[os.path.join("d0", "d1", name)] for name in ["f0", "f1", "f2"]
+    }
+
+    list_dst = os.path.join(tmpdir, "c")
+    copy_params = {
+        "source": [os.path.join(src_dir, "d0", "f0"), os.path.join(src_dir, "*", "d1")],
+        "destination": list_dst,
+    }
+    assert copy(copy_params, logger) == Status.SUCCESS
+    assert sorted(os.listdir(list_dst)) == ["d1", "f0"]
+
+    copy_params = {"source": os.path.join(src_dir, "nope*"), "destination": dst_dir}
+    assert copy(copy_params, logger) == Status.ERROR
+
+
+def test_copy_missing_listed_source(tmpdir: str | os.PathLike[str]) -> None:
+    """A listed path which does not exist fails the copy, an empty glob does not"""
+    src_dir = os.path.join(tmpdir, "a")
+    _write_tree(src_dir, num_dirs=1, num_files=2)
+
+    copy_params = {
+        "source": [os.path.join(src_dir, "d0", "f0"), os.path.join(src_dir, "nope")],
+        "destination": os.path.join(tmpdir, "b"),
+    }
+    assert copy(copy_params, logger) == Status.ERROR
+    assert not os.path.exists(os.path.join(tmpdir, "b"))
+
+    copy_params = {
+        "source": [os.path.join(src_dir, "d0", "f0"), os.path.join(src_dir, "nope*")],
+        "destination": os.path.join(tmpdir, "c"),
+    }
+    assert copy(copy_params, logger) == Status.SUCCESS
+    assert os.listdir(os.path.join(tmpdir, "c")) == ["f0"]
+
+
+def test_copy_dir_with_fifo(tmpdir: str | os.PathLike[str]) -> None:
+    """A FIFO in the tree fails the copy instead of blocking on reading it"""
+    src_dir = os.path.join(tmpdir, "a")
+    _write_tree(src_dir, num_dirs=1, num_files=2)
+    os.mkfifo(os.path.join(src_dir, "d0", "pipe"))
+
+    copy_params = {"source": src_dir, "destination": os.path.join(tmpdir, "b")}
+    assert copy(copy_params, logger) == Status.ERROR
+
+
+def test_copy_falls_back_when_unsupported(tmpdir, monkeypatch) -> None:
+    import errno
+    import antz.infrastructure.core.file_copy as file_copy
+
+    def unsupported(*_args):
+        raise OSError(errno.EXDEV, "cross device")
+
+    monkeypatch.setattr(file_copy, "_reflink", unsupported)
+    monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+    monkeypatch.setattr(os, "sendfile", unsupported, raising=False)
+    monkeypatch.setattr(file_copy, "_unsupported", set())
+
+    src_dir = os.path.join(tmpdir, "a")
+    contents = _write_tree(src_dir, num_dirs=1, num_files=5)
+    dst_dir = os.path.join(tmpdir, "b")
+
+    assert copy({"source": src_dir, "destination": dst_dir}, logger) == Status.SUCCESS
+    assert _read_tree(dst_dir) == contents
+
+
+def test_sync_only_copies_changed_files(tmpdir: str | os.PathLike[str]) -> None:
+    src_dir = os.path.join(tmpdir, "a")
+    dst_dir = os.path.join(tmpdir, "b")
+    contents = _write_tree(src_dir, num_dirs=2, num_files=4)
+    os.makedirs(dst_dir)
+
+    copy_params = {"source": src_dir, "destination": dst_dir}
+    assert copy(copy_params, logger) == Status.ERROR  # destination exists
+
+    copy_params["sync"] = True
+    assert copy(copy_params, logger) == Status.SUCCESS
+    assert _read_tree(dst_dir) == contents
+
+    # unchanged files are not rewritten
+    unchanged = os.path.join(dst_dir, "d0", "f0")
+    unchanged_ctime = os.stat(unchanged).st_ctime_ns
+    changed = os.path.join(src_dir, "d0", "d1", "f1")
+    with open(changed, "a") as fh:
+        fh.write("more")
+    contents[os.path.join("d0", "d1", "f1")] += "more"
+
+    assert copy(copy_params, logger) == Status.SUCCESS
+    assert _read_tree(dst_dir) == contents
+    assert os.stat(unchanged).st_ctime_ns == unchanged_ctime
+
+
+def test_sync_checksum(tmpdir: str | os.PathLike[str]) -> None:
+    src_file = os.path.join(tmpdir, "a")
+    dst_file = os.path.join(tmpdir, "b")
+    with open(src_file, "w") as fh:
+        fh.write("aaaa")
+    with open(dst_file, "w") as fh:
+        fh.write("bbbb")
+    src_mtime = os.stat(src_file).st_mtime_ns
+    os.utime(dst_file, ns=(src_mtime, src_mtime))
+
+    copy_params = {"source": src_file, "destination": dst_file, "sync": True}
+    assert copy(copy_params, logger) == Status.SUCCESS
+    with open(dst_file) as fh:
+        assert fh.read() == "bbbb"  # same size and mtime, so not copied
+
+    copy_params["checksum"] = True
+    assert copy(copy_params, logger) == Status.SUCCESS
+    with open(dst_file) as fh:
+        assert fh.read() == "aaaa"
+
+
+def test_sync_manifest(tmpdir: str | os.PathLike[str]) -> None:
+    src_dir = os.path.join(tmpdir, "a")
+    dst_dir = os.path.join(tmpdir, "b")
+    manifest = os.path.join(tmpdir, "manifest.json")
+    contents = _write_tree(src_dir, num_dirs=1, num_files=3)
+    copy_params = {
+        "source": src_dir,
+        "destination": dst_dir,
+        "sync": True,
+        "manifest": manifest,
+    }
+
+    assert copy(copy_params, logger) == Status.SUCCESS
+    assert os.path.exists(manifest)
+
+    # the manifest is trusted, so a changed destination is not looked at
+    with open(os.path.join(dst_dir, "d0", "f0"), "a") as fh:
+        fh.write("changed")
+    changed = os.path.join(src_dir, "d0", "f1")
+    with open(changed, "a") as fh:
+        fh.write("more")
+
+    assert copy(copy_params, logger) == Status.SUCCESS
+    synced = _read_tree(dst_dir)
+    assert synced[os.path.join("d0", "f0")] == contents[os.path.join("d0", "f0")] + "changed"
+    assert synced[os.path.join("d0", "f1")] == contents[os.path.join("d0", "f1")] + "more"
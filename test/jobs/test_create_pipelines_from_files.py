@@ -0,0 +1,110 @@
+"""Test creating pipelines from the files in directories"""
+
+import json
+import logging
+import os
+import time
+
+from antz.infrastructure.config.base import Config, PipelineConfig
+from antz.infrastructure.core.status import Status
+from antz.jobs.create_pipelines_from_files import create_pipelines_from_files
+
+logger = logging.getLogger("test")
+logger.setLevel(100000)  # don't log in tests
+
+TEMPLATE = {
+    "type": "pipeline",
+    "name": "leaf",
+    "stages": [{"type": "job", "function": "antz.jobs.nop.nop", "parameters": {}}],
+}
+PIPELINE = PipelineConfig.model_validate(TEMPLATE)
+
+
+def _write(path: str, text: str = "x") -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(text)
+
+
+def _run(parameters: dict) -> tuple[Status, list[Config]]:
+    configs: list[Config] = []
+    status = create_pipelines_from_files(
+        {"pipeline_config_template": TEMPLATE, **parameters},
+        configs.append,
+        {"outer": 1},
+        PIPELINE,
+        logger,
+    )
+    return status, configs
+
+
+def _age(path: str) -> None:
+    """Make the mtime of path old enough for the index to trust it"""
+    old = time.time() - 60
+    os.utime(path, (old, old))
+
+
+def test_pattern_and_regex(tmpdir: str | os.PathLike[str]) -> None:
+    root = os.fspath(tmpdir)
+    for name in ["a.csv", "b.txt", "sub/c.csv", "sub/deeper/d.csv"]:
+        _write(os.path.join(root, name), name)
+
+    status, configs = _run({"directories": root, "pattern": "*.csv"})
+    assert status == Status.FINAL
+    assert [config.variables["file_path"] for config in configs] == [
+        os.path.join(root, name) for name in ["a.csv", "sub/c.csv", "sub/deeper/d.csv"]
+    ]
+    assert configs[0].variables["file_name"] == "a.csv"
+    assert configs[0].variables["file_size"] == 5
+    assert configs[0].variables["outer"] == 1
+
+    _, configs = _run({"directories": [root], "pattern": "*.csv", "recursive": False})
+    assert len(configs) == 1
+
+    _, configs = _run({"directories": root, "regex": r"^sub/[^/]+\.csv$"})
+    assert [config.variables["file_name"] for config in configs] == ["c.csv"]
+
+
+def test_index_only_changed(tmpdir: str | os.PathLike[str]) -> None:
+    root = os.path.join(tmpdir, "data")
+    index = os.path.join(tmpdir, "index.json")
+    for name in ["a", "b", "sub/c"]:
+        _write(os.path.join(root, name))
+    for dir_path in [os.path.join(root, "sub"), root]:
+        _age(dir_path)
+
+    params = {"directories": root, "index": index, "only_changed": True}
+    _, configs = _run(params)
+    assert len(configs) == 3
+    with open(index, "r", encoding="utf-8") as fh:
+        assert set(json.load(fh)["directories"]) == {root, os.path.join(root, "sub")}
+
+    _, configs = _run(params)
+    assert not configs
+
+    _write(os.path.join(root, "sub", "c"), "changed")
+    _write(os.path.join(root, "d"))
+    _, configs = _run(params)
+    assert sorted(config.variables["file_name"] for config in configs) == ["c", "d"]
+
+
+def test_unchanged_directories_are_not_listed(tmpdir: str | os.PathLike[str]) -> None:
+    root = os.path.join(tmpdir, "data")
+    index = os.path.join(tmpdir, "index.json")
+    _write(os.path.join(root, "a"))
+    _age(root)
+    _run({"directories": root, "index": index})
+
+    # a listing in the index is reused while the mtime of its directory is unchanged
+    with open(index, "r", encoding="utf-8") as fh:
+        saved = json.load(fh)
+    saved["directories"][root]["files"]["ghost"] = [1, 1]
+    with open(index, "w", encoding="utf-8") as fh:
+        json.dump(saved, fh)
+
+    _, configs = _run({"directories": root, "index": index, "trust_index": True})
+    assert [config.variables["file_name"] for config in configs] == ["a", "ghost"]
+
+    # without trust_index files are checked, so the ghost is dropped
+    _, configs = _run({"directories": root, "index": index})
+    assert [config.variables["file_name"] for config in configs] == ["a"]
@@ -7,9 +7,11 @@ import random
 import string
 
 import pandas as pd
+import pytest
 
 from antz.infrastructure.config.base import Config
 from antz.infrastructure.core.manager import run_manager
+from antz.jobs.create_pipelines_from_matrix import Parameters, generate_configs
 
 FILE_LENGTH_MAX: int = 8000
 
@@ -139,3 +141,150 @@ def test_creating_multiple_pipelines_from_job(tmpdir) -> None:
     }
 
     assert ret == Config.model_validate(expected_config)
+
+
+def test_pre_resolved_parameters(tmpdir) -> None:
+    """Test that the parameters of the template can be resolved for all rows at once"""
+
+    matrix_path: str | os.PathLike[str] = os.path.join(tmpdir, "matrix.csv")
+    pd.DataFrame({"var1": [1, 2], "var3": ["b", "c"]}).to_csv(matrix_path, index=False)
+
+    params = Parameters.model_validate(
+        {
+            "matrix_path": matrix_path,
+            "pre_resolve_parameters": True,
+            "pipeline_config_template": {
+                "type": "pipeline",
+                "stages": [
+                    {
+                        "type": "job",
+                        "function": "antz.jobs.copy.copy",
+                        "parameters": {
+                            "source": "%{a}_%{var3}",
+                            "destination": "%{var1 + a}",
+                        },
+                    }
+                ],
+            },
+        }
+    )
+
+    configs = list(generate_configs(params, variables={"a": 1}))
+
+    assert [config.config.stages[0].parameters for config in configs] == [
+        {"source": "1_b", "destination": 2},
+        {"source": "1_c", "destination": 3},
+    ]
+    assert [dict(config.variables) for config in configs] == [
+        {"a": 1, "var1": 1, "var3": "b"},
+        {"a": 1, "var1": 2, "var3": "c"},
+    ]
+
+
+def _template_params(matrix_path, **kwargs) -> Parameters:
+    return Parameters.model_validate(
+        {
+            "matrix_path": matrix_path,
+            "pipeline_config_template": {
+                "type": "pipeline",
+                "stages": [
+                    {
+                        "type": "job",
+                        "function": "antz.jobs.nop.nop",
+                        "parameters": {},
+                    }
+                ],
+            },
+            **kwargs,
+        }
+    )
+
+
+def test_streamed_chunks_csv(tmpdir) -> None:
+    """Test that rows are read in chunks and only the requested columns are used"""
+
+    matrix_path: str | os.PathLike[str] = os.path.join(tmpdir, "matrix.csv")
+    pd.DataFrame(
+        {"var1": list(range(5)), "var2": list("abcde"), "unused": [0.0] * 5}
+    ).to_csv(matrix_path, index=False)
+
+    configs = list(
+        generate_configs(
+            _template_params(matrix_path, chunk_size=2, columns=["var1", "var2"]),
+            variables={"a": 1},
+        )
+    )
+
+    assert [config.config.name for config in configs] == [
+        f"pipeline_{i}" for i in range(5)
+    ]
+    assert [dict(config.variables) for config in configs] == [
+        {"a": 1, "var1": i, "var2": letter} for i, letter in enumerate("abcde")
+    ]
+
+
+def test_streamed_chunks_parquet(tmpdir) -> None:
+    """Test that parquet matrices are read by record batches"""
+    pytest.importorskip("pyarrow")
+
+    matrix_path: str | os.PathLike[str] = os.path.join(tmpdir, "matrix.parquet")
+    pd.DataFrame({"var1": list(range(5)), "var2": list("abcde")}).to_parquet(
+        matrix_path, index=False
+    )
+
+    configs = list(
+        generate_configs(
+            _template_params(matrix_path, chunk_size=2, columns=["var2"]),
+            variables={},
+        )
+    )
+
+    assert [dict(config.variables) for config in configs] == [
+        {"var2": letter} for letter in "abcde"
+    ]
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+def test_row_range(tmpdir, extension) -> None:
+    """Test that only the rows in the range of a shard are read"""
+    if extension == ".parquet":
+        pytest.importorskip("pyarrow")
+
+    matrix_path: str | os.PathLike[str] = os.path.join(tmpdir, "matrix" + extension)
+    matrix = pd.DataFrame({"var1": list(range(10))})
+    if extension == ".csv":
+        matrix.to_csv(matrix_path, index=False)
+    else:
+        matrix.to_parquet(matrix_path, index=False, row_group_size=3)
+
+    configs = list(
+        generate_configs(
+            _template_params(matrix_path, chunk_size=2, row_start=4, row_stop=8),
+            variables={},
+        )
+    )
+
+    assert [config.variables["var1"] for config in configs] == [4, 5, 6, 7]
+    assert [config.config.name for config in configs] == [
+        f"pipeline_{i}" for i in range(4, 8)
+    ]
+
+
+def test_csv_row_range_with_quoted_newlines(tmpdir) -> None:
+    """Rows skipped before the range of a shard may hold quoted newlines"""
+    matrix_path = os.path.join(tmpdir, "matrix.csv")
+    matrix = pd.DataFrame(
+        {"var1": list(range(6)), "var2": [f"line\nbreak {i}" for i in range(6)]}
+    )
+    matrix.to_csv(matrix_path, index=False)
+
+    configs = list(
+        generate_configs(
+            _template_params(matrix_path, chunk_size=2, row_start=3, row_stop=5),
+            variables={},
+        )
+    )
+
+    assert [dict(config.variables) for config in configs] == [
+        {"var1": i, "var2": f"line\nbreak {i}"} for i in (3, 4)
+    ]
@@ -2,6 +2,7 @@
 
 import logging
 import os
+import time
 
 import pytest
 from pydantic import ValidationError
@@ -167,3 +168,62 @@ def test_delete_dir_in_job_non_existing(tmpdir: str | os.PathLike[str]) -> None:
         )
         == Status.ERROR
     )
+
+
+def _make_tree(root: str) -> None:
+    """A tree with nested directories, many files and a symlink out of the tree"""
+    for dir_num in range(5):
+        dir_path = os.path.join(root, *[f"d{i}" for i in range(dir_num + 1)])
+        os.makedirs(dir_path)
+        os.mkdir(os.path.join(dir_path, "empty"))
+        for file_num in range(300):
+            with open(os.path.join(dir_path, f"f{file_num}"), "w") as fh:
+                fh.write("x")
+
+
+def test_delete_directory_parallel(tmpdir: str | os.PathLike[str]) -> None:
+    """Test deleting a tree on many threads, without following symlinks"""
+    dir_path = os.path.join(tmpdir, "tree")
+    _make_tree(dir_path)
+    outside = os.path.join(tmpdir, "outside")
+    os.mkdir(outside)
+    os.symlink(outside, os.path.join(dir_path, "d0", "link"))
+
+    assert delete({"path": dir_path, "max_workers": 4}, logger) == Status.SUCCESS
+
+    assert not os.path.exists(dir_path)
+    assert os.path.exists(outside)
+
+
+def test_delete_directory_parallel_error(tmpdir: str | os.PathLike[str]) -> None:
+    """Errors stop the deletion and fail the job"""
+    dir_path = os.path.join(tmpdir, "tree")
+    _make_tree(dir_path)
+    locked = os.path.join(dir_path, "d0", "d1")
+    os.chmod(locked, 0o500)
+    if os.access(os.path.join(locked, "f0"), os.W_OK) and os.getuid() == 0:
+        os.chmod(locked, 0o700)
+        pytest.skip("root can delete from read-only directories")
+
+    try:
+        assert delete({"path": dir_path, "max_workers": 4}, logger) == Status.ERROR
+    finally:
+        os.chmod(locked, 0o700)
+
+
+def test_delete_directory_background(tmpdir: str | os.PathLike[str]) -> None:
+    """The path is free at once and the tree is deleted by another process"""
+    dir_path = os.path.join(tmpdir, "tree")
+    _make_tree(dir_path)
+
+    assert (
+        delete({"path": dir_path, "background": True, "max_workers": 2}, logger)
+        == Status.SUCCESS
+    )
+    assert not os.path.exists(dir_path)
+
+    for _ in range(100):
+        if os.listdir(tmpdir) == []:
+            break
+        time.sleep(0.1)
+    assert os.listdir(tmpdir) == []
@@ -0,0 +1,75 @@
+"""Test the edit_csv job"""
+
+import csv
+import logging
+import os
+
+from antz.infrastructure.core.status import Status
+from antz.jobs.edit_csv import edit_csv
+
+logger = logging.Logger("test")
+logger.setLevel(0)
+
+
+def _write(path: str, rows: list[list[str]], delimiter: str = ",") -> None:
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        csv.writer(fh, delimiter=delimiter).writerows(rows)
+
+
+def _read(path: str, delimiter: str = ",") -> list[list[str]]:
+    with open(path, "r", newline="", encoding="utf-8") as fh:
+        return list(csv.reader(fh, delimiter=delimiter))
+
+
+ROWS = [
+    ["name", "size", "mode"],
+    ["a", "1", "fast"],
+    ["b", "10", "slow"],
+    ["c", "2.5", "fast"],
+    ["d", "", "fast"],
+]
+
+
+def test_filter_and_replace(tmpdir: str | os.PathLike[str]) -> None:
+    path = os.path.join(tmpdir, "table.csv")
+    _write(path, ROWS)
+
+    params = {
+        "path": path,
+        "filters": [
+            {"column": "size", "comparator": "<", "value": 5},
+            {"column": "name", "comparator": "!=", "value": "a"},
+        ],
+        "replacements": [
+            {"column": "mode", "old": "fast", "new": "slow"},
+            {"column": "name", "new": 0},
+        ],
+    }
+    assert edit_csv(params, logger) == Status.SUCCESS
+    assert _read(path) == [ROWS[0], ["0", "2.5", "slow"]]
+    assert os.listdir(tmpdir) == ["table.csv"]
+
+
+def test_destination_and_tsv(tmpdir: str | os.PathLike[str]) -> None:
+    path = os.path.join(tmpdir, "table.tsv")
+    destination = os.path.join(tmpdir, "edited.tsv")
+    _write(path, ROWS, delimiter="\t")
+
+    params = {
+        "path": path,
+        "destination": destination,
+        "filters": [{"column": "mode", "comparator": "==", "value": "fast"}],
+    }
+    assert edit_csv(params, logger) == Status.SUCCESS
+    assert _read(path, delimiter="\t") == ROWS
+    assert _read(destination, delimiter="\t") == [ROWS[0], ROWS[1], ROWS[3], ROWS[4]]
+
+
+def test_missing_column(tmpdir: str | os.PathLike[str]) -> None:
+    path = os.path.join(tmpdir, "table.csv")
+    _write(path, ROWS)
+
+    params = {"path": path, "replacements": [{"column": "other", "new": "x"}]}
+    assert edit_csv(params, logger) == Status.ERROR
+    assert _read(path) == ROWS
+    assert os.listdir(tmpdir) == ["table.csv"]
@@ -0,0 +1,88 @@
+"""Test the edit_document job"""
+
+import json
+import logging
+import os
+
+import pytest
+
+from antz.infrastructure.core.status import Status
+from antz.jobs.edit_document import edit_document
+
+logger = logging.Logger("test")
+logger.setLevel(0)
+
+DOCUMENT = {
+    "name": "deck",
+    "solver": {"dt": 0.1, "stages": [{"steps": 1}, {"steps": 2}]},
+    "output": {"path": "out", "format": "csv"},
+}
+
+
+def test_edit_json(tmpdir: str | os.PathLike[str]) -> None:
+    path = os.path.join(tmpdir, "deck.json")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(DOCUMENT, fh)
+
+    params = {
+        "path": path,
+        "set_values": {
+            "solver.dt": 0.01,
+            "solver.stages.1.steps": 20,
+            "solver.stages.2": {"steps": 3},
+            "mesh.size": [1, 2],
+        },
+        "delete_keys": ["output.format", "missing.key"],
+    }
+    assert edit_document(params, logger) == Status.SUCCESS
+
+    with open(path, "r", encoding="utf-8") as fh:
+        assert json.load(fh) == {
+            "name": "deck",
+            "solver": {
+                "dt": 0.01,
+                "stages": [{"steps": 1}, {"steps": 20}, {"steps": 3}],
+            },
+            "output": {"path": "out"},
+            "mesh": {"size": [1, 2]},
+        }
+    assert os.listdir(tmpdir) == ["deck.json"]
+
+
+def test_edit_yaml(tmpdir: str | os.PathLike[str]) -> None:
+    yaml = pytest.importorskip("yaml")
+    path = os.path.join(tmpdir, "deck.yaml")
+    destination = os.path.join(tmpdir, "edited.yml")
+    with open(path, "w", encoding="utf-8") as fh:
+        yaml.safe_dump({**DOCUMENT, 1: "one"}, fh)
+
+    params = {
+        "path": path,
+        "destination": destination,
+        "set_values": {"solver/dt": 0.5, "1": "uno"},
+        "delete_keys": ["solver/stages/0"],
+        "separator": "/",
+    }
+    assert edit_document(params, logger) == Status.SUCCESS
+
+    with open(destination, "r", encoding="utf-8") as fh:
+        assert yaml.safe_load(fh) == {
+            "name": "deck",
+            "solver": {"dt": 0.5, "stages": [{"steps": 2}]},
+            "output": {"path": "out", "format": "csv"},
+            1: "uno",
+        }
+
+
+def test_bad_path(tmpdir: str | os.PathLike[str]) -> None:
+    path = os.path.join(tmpdir, "deck.json")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(DOCUMENT, fh)
+
+    for key in ["name.first", "solver.stages.x", "solver.stages.5.steps"]:
+        params = {"path": path, "set_values": {key: 1}}
+        assert edit_document(params, logger) == Status.ERROR
+
+    with open(path, "r", encoding="utf-8") as fh:
+        assert json.load(fh) == DOCUMENT
+    assert os.listdir(tmpdir) == ["deck.json"]
@@ -0,0 +1,100 @@
+"""Test the file_operations job"""
+
+import json
+import logging
+import os
+
+from antz.infrastructure.core.status import Status
+from antz.jobs.file_operations import Parameters, file_operations, get_dependencies
+
+logger = logging.Logger("test")
+logger.setLevel(0)
+
+
+def test_set_up_cases(tmpdir: str | os.PathLike[str]) -> None:
+    template = os.path.join(tmpdir, "deck.yaml")
+    with open(template, "w", encoding="utf-8") as fh:
+        fh.write("dt: 0.1\n")
+
+    operations: list[dict] = []
+    for case in range(50):
+        case_dir = os.path.join(tmpdir, "cases", str(case))
+        operations.append({"type": "mkdir", "path": os.path.join(case_dir, "out")})
+        operations.append(
+            {
+                "type": "copy",
+                "source": template,
+                "destination": os.path.join(case_dir, "deck.yaml"),
+            }
+        )
+    operations.append(
+        {
+            "type": "rename",
+            "source": os.path.join(tmpdir, "cases", "0"),
+            "destination": os.path.join(tmpdir, "baseline", "0"),
+        }
+    )
+    operations.append(
+        {"type": "delete", "path": os.path.join(tmpdir, "cases", "1", "out")}
+    )
+
+    assert file_operations({"operations": operations}, logger) == Status.SUCCESS
+    assert len(os.listdir(os.path.join(tmpdir, "cases"))) == 49
+    assert os.listdir(os.path.join(tmpdir, "cases", "1")) == ["deck.yaml"]
+    assert sorted(os.listdir(os.path.join(tmpdir, "cases", "2"))) == [
+        "deck.yaml",
+        "out",
+    ]
+    with open(
+        os.path.join(tmpdir, "baseline", "0", "deck.yaml"), "r", encoding="utf-8"
+    ) as fh:
+        assert fh.read() == "dt: 0.1\n"
+
+
+def test_failure_skips_dependents(tmpdir: str | os.PathLike[str]) -> None:
+    report = os.path.join(tmpdir, "report.json")
+    missing = os.path.join(tmpdir, "missing")
+    operations = [
+        {"type": "rename", "source": missing, "destination": os.path.join(tmpdir, "a")},
+        {"type": "mkdir", "path": os.path.join(tmpdir, "a", "b")},
+        {"type": "mkdir", "path": os.path.join(tmpdir, "c")},
+        {"type": "delete", "path": missing, "missing_ok": True},
+    ]
+    params = {"operations": operations, "report": report}
+    assert file_operations(params, logger) == Status.ERROR
+
+    with open(report, "r", encoding="utf-8") as fh:
+        results = json.load(fh)
+    assert [result["status"] for result in results] == [
+        "error",
+        "skipped",
+        "success",
+        "skipped",
+    ]
+    assert os.path.isdir(os.path.join(tmpdir, "c"))
+    assert not os.path.exists(os.path.join(tmpdir, "a"))
+
+
+def test_dependencies() -> None:
+    params = Parameters.model_validate(
+        {
+            "operations": [
+                {"type": "mkdir", "path": "/x/a"},
+                {"type": "copy", "source": "/t", "destination": "/x/a/t"},
+                {"type": "copy", "source": "/t", "destination": "/x/b/t"},
+                {"type": "mkdir", "path": "/y"},
+                {"type": "delete", "path": "/x"},
+                {"type": "delete", "path": "/t"},
+                {"type": "mkdir", "path": "/x/c"},
+            ]
+        }
+    )
+    assert get_dependencies(params.operations) == [
+        set(),
+        {0},
+        set(),
+        set(),
+        {0, 1, 2},
+        {1, 2},
+        {4},
+    ]
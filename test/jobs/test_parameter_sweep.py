@@ -0,0 +1,178 @@
+"""Test the parameter sweep job"""
+
+import logging
+import queue
+
+import pytest
+
+from antz.infrastructure.config.base import Config
+from antz.infrastructure.core.manager import run_manager
+from antz.jobs.parameter_sweep import Parameters, generate_rows
+
+logger = logging.getLogger("test")
+logger.setLevel(100000)  # don't log in tests
+
+TEMPLATE = {
+    "type": "pipeline",
+    "name": "leaf",
+    "stages": [{"type": "job", "function": "antz.jobs.nop.nop", "parameters": {}}],
+}
+
+
+def _params(sweep, **kwargs) -> Parameters:
+    return Parameters.model_validate(
+        {"sweep": sweep, "pipeline_config_template": TEMPLATE, **kwargs}
+    )
+
+
+def test_product_and_zip() -> None:
+    """Test that specs are combined as a cartesian product, last varying fastest"""
+    params = _params(
+        [
+            {"type": "product", "variables": {"a": [1, 2], "b": ["x", "y"]}},
+            {
+                "type": "zip",
+                "variables": {"c": {"start": 0, "stop": 1, "step": 0.5}, "d": [3, 4]},
+            },
+        ]
+    )
+
+    rows = list(generate_rows(params, 0, params.num_rows))
+
+    assert params.num_rows == 8
+    assert rows[:3] == [
+        {"a": 1, "b": "x", "c": 0.0, "d": 3},
+        {"a": 1, "b": "x", "c": 0.5, "d": 4},
+        {"a": 1, "b": "y", "c": 0.0, "d": 3},
+    ]
+    assert rows[-1] == {"a": 2, "b": "y", "c": 0.5, "d": 4}
+
+
+@pytest.mark.parametrize(
+    "values",
+    [{"start": 0, "stop": 3, "step": 0}, {"start": 0, "stop": 3, "step": -1}],
+)
+def test_bad_range_step(values) -> None:
+    """A range whose step never reaches stop is rejected"""
+    with pytest.raises(ValueError, match="step"):
+        _params([{"type": "product", "variables": {"a": values}}])
+
+
+def test_descending_range() -> None:
+    params = _params(
+        [{"type": "product", "variables": {"a": {"start": 3, "stop": 0, "step": -1}}}]
+    )
+    assert list(generate_rows(params, 0, params.num_rows)) == [
+        {"a": 3},
+        {"a": 2},
+        {"a": 1},
+    ]
+
+
+@pytest.mark.parametrize("num_samples", [1, 50, 3000])
+def test_latin_hypercube(num_samples) -> None:
+    """Each variable has exactly one sample in each of its strata"""
+    params = _params(
+        [
+            {
+                "type": "latin_hypercube",
+                "num_samples": num_samples,
+                "variables": {"x": [0, 1], "y": [10, 20]},
+            }
+        ],
+        seed=3,
+    )
+
+    rows = list(generate_rows(params, 0, num_samples))
+
+    assert sorted(int(row["x"] * num_samples) for row in rows) == list(
+        range(num_samples)
+    )
+    assert sorted(int((row["y"] - 10) / 10 * num_samples) for row in rows) == list(
+        range(num_samples)
+    )
+
+
+@pytest.mark.parametrize("spec_type", ["latin_hypercube", "sobol"])
+def test_ranges_are_regenerated_identically(spec_type) -> None:
+    """Any range of rows is the same as that range of the whole sweep"""
+    if spec_type == "sobol":
+        pytest.importorskip("scipy")
+    params = _params(
+        [
+            {"type": "product", "variables": {"a": [1, 2, 3]}},
+            {"type": spec_type, "num_samples": 2048, "variables": {"x": [0, 1]}},
+        ],
+        seed=7,
+    )
+
+    full = list(generate_rows(params, 0, params.num_rows))
+
+    assert list(generate_rows(params, 1000, 5000)) == full[1000:5000]
+    assert full != list(
+        generate_rows(_params(params.sweep, seed=8), 0, params.num_rows)
+    )
+
+
+def test_latin_hypercube_of_many_samples() -> None:
+    """The last rows of a huge sweep are generated without the rows before them"""
+    num_samples = 10**12
+    params = _params(
+        [
+            {
+                "type": "latin_hypercube",
+                "num_samples": num_samples,
+                "variables": {"x": [0, 1]},
+            }
+        ]
+    )
+
+    rows = list(generate_rows(params, num_samples - 3, num_samples))
+
+    assert len({int(row["x"] * 10**6) for row in rows}) == 3
+
+
+def test_sharded_sweep() -> None:
+    """A sharded sweep submits every row once"""
+    test_queue: queue.Queue = queue.Queue()
+
+    config = Config.model_validate(
+        {
+            "variables": {"outer": True},
+            "config": {
+                "type": "pipeline",
+                "stages": [
+                    {
+                        "type": "submitter_job",
+                        "function": "antz.jobs.parameter_sweep.parameter_sweep",
+                        "parameters": {
+                            "sweep": [
+                                {
+                                    "type": "product",
+                                    "variables": {"i": {"start": 0, "stop": 30}},
+                                }
+                            ],
+                            "num_shards": 4,
+                            "min_shard_size": 5,
+                            "pipeline_config_template": TEMPLATE,
+                        },
+                    }
+                ],
+            },
+        }
+    )
+
+    run_manager(config, test_queue.put, logger)
+
+    values = []
+    while not test_queue.empty():
+        next_config = test_queue.get()
+        if next_config.config.name == "leaf" or next_config.config.name.startswith(
+            "sweep_"
+        ):
+            assert next_config.variables["outer"] is True
+            values.append(next_config.variables["i"])
+        else:
+            run_manager(next_config, test_queue.put, logger)
+
+    assert sorted(values) == list(range(30))
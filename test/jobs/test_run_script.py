@@ -1,15 +1,19 @@
 """Test running a script"""
 
 import os
-import logging 
+import logging
+import sys
+
+import pytest
+from pydantic import ValidationError
 
 from antz.infrastructure.core.status import Status
 from antz.jobs.run_script import run_script
 
-
 logger = logging.getLogger("test")
 logger.setLevel(0)
 
+
 def test_run_script_fn(tmpdir) -> None:
     """Test running a script with the run_script fn"""
 
@@ -31,7 +35,8 @@ def test_run_script_fn(tmpdir) -> None:
                 "script_path": script_path,
                 "script_args": ["what?"],
                 "stdout_save_file": stdout_file,
-            }, logger
+            },
+            logger,
         )
         == Status.SUCCESS
     )
@@ -40,3 +45,195 @@ def test_run_script_fn(tmpdir) -> None:
     with open(stdout_file, "r", encoding="utf-8") as fh:
         results: str = fh.read()
     assert results == "hello\nwhat?\n"
+
+
+def _write_script(tmpdir, content: str) -> str:
+    script_path: str = os.path.join(tmpdir, "script.sh")
+    with open(script_path, "w", encoding="utf-8") as fh:
+        fh.write(content)
+    os.chmod(script_path, 0o777)
+    return script_path
+
+
+def test_run_script_streams_and_forwards(tmpdir, caplog) -> None:
+    """Output is written to the files and forwarded to the logger, rate limited"""
+    script_path = _write_script(
+        tmpdir,
+        """#!/bin/bash
+        for i in $(seq 1 1000); do echo "line $i"; done
+        echo "oops" >&2
+        """,
+    )
+    stdout_file = os.path.join(tmpdir, "stdout.txt")
+    stderr_file = os.path.join(tmpdir, "stderr.txt")
+
+    with caplog.at_level(logging.INFO, logger="test"):
+        assert (
+            run_script(
+                {
+                    "script_path": script_path,
+                    "stdout_save_file": stdout_file,
+                    "stderr_save_file": stderr_file,
+                    "log_lines_per_second": 10,
+                },
+                logger,
+            )
+            == Status.SUCCESS
+        )
+
+    with open(stdout_file, "r", encoding="utf-8") as fh:
+        assert fh.read() == "".join(f"line {i}\n" for i in range(1, 1001))
+    with open(stderr_file, "r", encoding="utf-8") as fh:
+        assert fh.read() == "oops\n"
+
+    forwarded = [r.getMessage() for r in caplog.records if r.name == "test"]
+    assert forwarded[0] == "stdout: line 1"
+    assert 10 <= sum(m.startswith("std") for m in forwarded) < 100
+    assert any(m.startswith("Dropped") for m in forwarded)
+
+
+def test_run_script_error_reports_tail(tmpdir, caplog) -> None:
+    """A failing script logs the end of its output and nothing else is kept"""
+    script_path = _write_script(
+        tmpdir,
+        """#!/bin/bash
+        head -c 100000 /dev/zero | tr '\\0' 'a'
+        echo "the end"
+        echo "bad things" >&2
+        exit 3
+        """,
+    )
+
+    with caplog.at_level(logging.ERROR, logger="test"):
+        assert run_script({"script_path": script_path, "tail_kb": 1}, logger) == (
+            Status.ERROR
+        )
+
+    (message,) = [r.getMessage() for r in caplog.records if r.name == "test"]
+    assert "exited with 3" in message
+    assert "the end\n" in message
+    assert "bad things" in message
+    assert len(message) < 3000
+
+
+def test_run_script_warm_python(tmpdir) -> None:
+    """Python scripts run in a reused interpreter, each with its own argv, cwd and output"""
+    helper_path = os.path.join(tmpdir, "helper.py")
+    with open(helper_path, "w", encoding="utf-8") as fh:
+        fh.write("VALUE = 'first'\n")
+    script_path = os.path.join(tmpdir, "script.py")
+    with open(script_path, "w", encoding="utf-8") as fh:
+        fh.write(
+            "import os, sys\n"
+            "import helper\n"
+            "print(helper.VALUE, sys.argv[1:], os.getcwd(), os.getpid())\n"
+            "if sys.argv[1] == 'fail':\n"
+            "    raise ValueError('bad value')\n"
+        )
+    os.mkdir(os.path.join(tmpdir, "cwd"))
+
+    def run(arg: str, stdout_file: str) -> Status:
+        return run_script(
+            {
+                "script_path": script_path,
+                "script_args": [arg],
+                "current_working_dir": os.path.join(tmpdir, "cwd"),
+                "stdout_save_file": os.path.join(tmpdir, stdout_file),
+                "warm_python": True,
+                "warm_max_runs": 2,
+            },
+            logger,
+        )
+
+    def read(stdout_file: str) -> list[str]:
+        with open(os.path.join(tmpdir, stdout_file), "r", encoding="utf-8") as fh:
+            return fh.read().split()
+
+    assert run("a", "1.txt") == Status.SUCCESS
+    with open(helper_path, "w", encoding="utf-8") as fh:
+        fh.write("VALUE = 'second'\n")
+    assert run("b", "2.txt") == Status.SUCCESS
+    assert run("fail", "3.txt") == Status.ERROR
+
+    first, second, third = read("1.txt"), read("2.txt"), read("3.txt")
+    assert first[:3] == ["first", "['a']", os.path.join(tmpdir, "cwd")]
+    assert second[:2] == ["second", "['b']"]  # helper modules are reloaded
+    assert first[3] == second[3] != third[3]  # replaced after warm_max_runs
+    assert os.getcwd() != os.path.join(tmpdir, "cwd")
+
+
+def test_run_script_warm_only_own_python(tmpdir) -> None:
+    """A prepended python other than the one running antz runs the script cold"""
+    script_path = os.path.join(tmpdir, "script.py")
+    with open(script_path, "w", encoding="utf-8") as fh:
+        fh.write(
+            "import os, sys\nprint(os.getpid(), os.path.realpath(sys.executable))\n"
+        )
+    other_python = os.path.join(tmpdir, "python3-other")
+    with open(other_python, "w", encoding="utf-8") as fh:
+        fh.write(f'#!/bin/sh\nexec "{sys.executable}" -I "$@"\n')
+    os.chmod(other_python, 0o755)
+
+    def run(prepend: str, stdout_file: str) -> list[str]:
+        status = run_script(
+            {
+                "script_path": script_path,
+                "script_prepend": [prepend],
+                "stdout_save_file": os.path.join(tmpdir, stdout_file),
+                "warm_python": True,
+            },
+            logger,
+        )
+        assert status == Status.SUCCESS
+        with open(os.path.join(tmpdir, stdout_file), "r", encoding="utf-8") as fh:
+            return fh.read().split()
+
+    warm = [run(sys.executable, f"warm{i}.txt")[0] for i in range(2)]
+    assert warm[0] == warm[1]
+    cold = [run(other_python, f"cold{i}.txt")[0] for i in range(2)]
+    assert cold[0] != cold[1]
+    assert warm[0] not in cold
+
+
+def test_run_script_limits_and_usage(tmpdir, caplog) -> None:
+    """Limits apply to the script and the resources it used are logged"""
+    script_path = _write_script(
+        tmpdir,
+        """#!/bin/bash
+        ulimit -n
+        ulimit -t
+        cat /proc/self/status | grep Cpus_allowed_list | cut -f2
+        nice
+        """,
+    )
+    stdout_file = os.path.join(tmpdir, "stdout.txt")
+
+    with caplog.at_level(logging.INFO, logger="test"):
+        assert (
+            run_script(
+                {
+                    "script_path": script_path,
+                    "stdout_save_file": stdout_file,
+                    "rlimits": {"nofile": 123, "cpu": [100, -1]},
+                    "nice": 5,
+                    "cpu_affinity": [0],
+                },
+                logger,
+            )
+            == Status.SUCCESS
+        )
+
+    with open(stdout_file, "r", encoding="utf-8") as fh:
+        nofile, cpu, cpus, niceness = fh.read().split()
+    assert (nofile, cpu, cpus) == ("123", "100", "0")
+    assert int(niceness) == os.nice(0) + 5
+
+    (record,) = [r for r in caplog.records if hasattr(r, "antz_metrics")]
+    assert record.antz_metrics["wall_time"] > 0
+    assert record.antz_metrics["max_rss_kb"] > 0
+
+
+def test_run_script_unknown_rlimit(tmpdir) -> None:
+    script_path = _write_script(tmpdir, "#!/bin/bash\n")
+    with pytest.raises(ValidationError):
+        run_script({"script_path": script_path, "rlimits": {"nope": 1}}, logger)